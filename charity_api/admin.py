@@ -1,30 +1,150 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import PAGE_VAR
+from django.utils.translation import gettext_lazy as _
+from .archive import soft_delete, soft_delete_queryset
+from .bulk import logged_update
+from .counts import EstimatedCountPaginator
+from .lifecycle import change_status
 from .models import Organization, Campaign, Beneficiary, Charity
 
 
+class RawIdListFilter(admin.FieldListFilter):
+    """
+    Filter on a foreign key by typing the related id, instead of listing
+    every related row in the sidebar. Shows only the selected row.
+    """
+    template = 'admin/raw_id_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__id__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        self.related_model = field.remote_field.model
+        self.other_params = [
+            (name, value) for name, value in request.GET.items() if name not in (self.lookup_kwarg, PAGE_VAR)
+        ]
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+        }
+        if self.lookup_val is not None:
+            selected = self.related_model._base_manager.filter(pk=self.lookup_val).first()
+            yield {
+                'selected': True,
+                'query_string': changelist.get_query_string({self.lookup_kwarg: self.lookup_val}),
+                'display': str(selected) if selected else f'#{self.lookup_val}',
+            }
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables with millions of rows: estimated counts,
+    no second COUNT(*) for the unfiltered total, and soft deletes (in bulk
+    from the changelist, or one row from its delete page) instead of
+    collecting every related object for the confirmation page.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['soft_delete_selected']
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Delete selected %(verbose_name_plural)s', permissions=['delete'])
+    def soft_delete_selected(self, request, queryset):
+        hidden = soft_delete_queryset(queryset)
+        name = queryset.model._meta.verbose_name_plural.lower()
+        self.message_user(request, f'Deleted {hidden} {name}; the rows are removed in the background.', messages.SUCCESS)
+
+    def get_deleted_objects(self, objs, request):
+        # Only the rows themselves: their dependents are hidden with them
+        objs = list(objs)
+        return [str(obj) for obj in objs], {self.model._meta.verbose_name_plural: len(objs)}, set(), []
+
+    def delete_model(self, request, obj):
+        soft_delete(obj)
+
+    def delete_queryset(self, request, queryset):
+        soft_delete_queryset(queryset)
+
+
 @admin.register(Organization)
-class OrganizationAdmin(admin.ModelAdmin):
+class OrganizationAdmin(LargeTableAdmin):
     list_display = ('name', 'email', 'phone', 'is_active', 'created_at')
     list_filter = ('is_active', 'created_at')
     search_fields = ('name', 'email', 'registration_number')
     ordering = ('-created_at',)
+    actions = ['soft_delete_selected', 'activate', 'deactivate']
+
+    @admin.action(description='Mark selected organizations as active', permissions=['change'])
+    def activate(self, request, queryset):
+        updated = logged_update(queryset.filter(is_active=False), is_active=True)
+        self.message_user(request, f'{updated} organizations activated.', messages.SUCCESS)
+
+    @admin.action(description='Mark selected organizations as inactive', permissions=['change'])
+    def deactivate(self, request, queryset):
+        updated = logged_update(queryset.filter(is_active=True), is_active=False)
+        self.message_user(request, f'{updated} organizations deactivated.', messages.SUCCESS)
 
 
 @admin.register(Campaign)
-class CampaignAdmin(admin.ModelAdmin):
+class CampaignAdmin(LargeTableAdmin):
     list_display = ('title', 'organization', 'status', 'goal_amount', 'raised_amount', 'start_date', 'end_date')
-    list_filter = ('status', 'start_date', 'organization')
+    list_filter = ('status', 'start_date', ('organization', RawIdListFilter))
+    list_select_related = ('organization',)
     search_fields = ('title', 'description', 'organization__name')
+    autocomplete_fields = ('organization',)
     ordering = ('-created_at',)
-    date_hierarchy = 'start_date'
+    actions = ['soft_delete_selected', 'mark_active', 'mark_completed', 'mark_cancelled']
+
+    def _mark(self, request, queryset, status):
+        changed = change_status(queryset, status)
+        self.message_user(request, f'{changed} campaigns marked {status}.', messages.SUCCESS)
+
+    @admin.action(description='Mark selected campaigns as active', permissions=['change'])
+    def mark_active(self, request, queryset):
+        self._mark(request, queryset, 'active')
+
+    @admin.action(description='Mark selected campaigns as completed', permissions=['change'])
+    def mark_completed(self, request, queryset):
+        self._mark(request, queryset, 'completed')
+
+    @admin.action(description='Mark selected campaigns as cancelled', permissions=['change'])
+    def mark_cancelled(self, request, queryset):
+        self._mark(request, queryset, 'cancelled')
 
 
 @admin.register(Beneficiary)
-class BeneficiaryAdmin(admin.ModelAdmin):
+class BeneficiaryAdmin(LargeTableAdmin):
     list_display = ('full_name', 'campaign', 'amount_received', 'is_active', 'created_at')
-    list_filter = ('is_active', 'created_at', 'campaign')
+    list_filter = ('is_active', 'created_at', ('campaign', RawIdListFilter))
+    # Campaign.__str__ reads the organization name
+    list_select_related = ('campaign__organization',)
     search_fields = ('first_name', 'last_name', 'email', 'campaign__title')
+    autocomplete_fields = ('campaign',)
     ordering = ('-created_at',)
+    actions = ['soft_delete_selected', 'activate', 'deactivate']
+
+    @admin.action(description='Mark selected beneficiaries as active', permissions=['change'])
+    def activate(self, request, queryset):
+        updated = logged_update(queryset.filter(is_active=False), is_active=True)
+        self.message_user(request, f'{updated} beneficiaries activated.', messages.SUCCESS)
+
+    @admin.action(description='Mark selected beneficiaries as inactive', permissions=['change'])
+    def deactivate(self, request, queryset):
+        updated = logged_update(queryset.filter(is_active=True), is_active=False)
+        self.message_user(request, f'{updated} beneficiaries deactivated.', messages.SUCCESS)
 
 
 @admin.register(Charity)
@@ -0,0 +1,217 @@
+"""
+Bucketed time series for ``/api/analytics/``.
+
+Each metric is a DB-side aggregate over a timestamped table (and its
+archive table, whose rows keep their timestamps), truncated to
+day/week/month with ``Trunc``. Complete days are precomputed into
+``DailyRollup`` by ``manage.py build_rollups``, which records the last day
+it processed per metric in ``RollupWatermark``; a query reads rollups up to
+that day and aggregates raw rows only after it, then merges both per bucket.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import (
+    ArchivedBeneficiary, Beneficiary, CampaignStatusChange, DailyRollup, RaisedAmountChange, RollupWatermark,
+)
+from .tenancy import tenant_databases
+
+INTERVALS = ('day', 'week', 'month')
+
+
+class Metric:
+    """A time series over one model: where its timestamp, owner and value live"""
+
+    def __init__(self, model, time_field, organization_field, campaign_field, aggregate, split_field=None,
+                 archive_model=None):
+        self.model = model
+        self.time_field = time_field
+        self.organization_field = organization_field
+        self.campaign_field = campaign_field
+        self.aggregate = aggregate
+        # Optional column producing one series per value (e.g. target status)
+        self.split_field = split_field
+        # Table the rows move to when archived, with the same fields
+        self.archive_model = archive_model
+
+    @property
+    def models(self):
+        return [self.model] + ([self.archive_model] if self.archive_model else [])
+
+
+METRICS = {
+    'raised': Metric(
+        RaisedAmountChange, 'created_at', 'organization', 'campaign', Sum('amount'),
+    ),
+    'new_beneficiaries': Metric(
+        Beneficiary, 'created_at', 'organization', 'campaign', Count('pk'),
+        archive_model=ArchivedBeneficiary,
+    ),
+    'status_transitions': Metric(
+        CampaignStatusChange, 'changed_at', 'organization', 'campaign', Count('pk'), split_field='to_status',
+    ),
+}
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _rollup_metric(name, split=None):
+    return f'{name}:{split}' if split else name
+
+
+def _raw_rows(metric, start_day, end_day, interval, organization=None, campaign=None):
+    """
+    Aggregate raw rows for [start_day, end_day] into (bucket, organization,
+    split, value), from the live and archive tables of every database holding
+    them (see ``tenancy.py``); a key may come once per table and database
+    """
+    for model in metric.models:
+        for alias in tenant_databases(model, organization):
+            yield from _raw_database_rows(metric, model, alias, start_day, end_day, interval, organization, campaign)
+
+
+def _raw_database_rows(metric, model, alias, start_day, end_day, interval, organization, campaign):
+    queryset = model._base_manager.using(alias).filter(**{
+        f'{metric.time_field}__gte': _day_start(start_day),
+        f'{metric.time_field}__lt': _day_start(end_day + timedelta(days=1)),
+    })
+    if organization is not None:
+        queryset = queryset.filter(**{metric.organization_field: organization})
+    if campaign is not None:
+        queryset = queryset.filter(**{metric.campaign_field: campaign})
+
+    group_by = ['bucket', metric.organization_field] + ([metric.split_field] if metric.split_field else [])
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=Trunc(metric.time_field, interval, output_field=DateField()))
+        .values(*group_by)
+        .annotate(value=metric.aggregate)
+    )
+    for row in rows:
+        yield (
+            row['bucket'],
+            row[metric.organization_field],
+            row[metric.split_field] if metric.split_field else None,
+            row['value'] or 0,
+        )
+
+
+def rollup_watermark(name):
+    """Last day rolled up for a metric (None if never rolled up)"""
+    return RollupWatermark.objects.filter(metric=name).values_list('processed_through', flat=True).first()
+
+
+def _oldest_day(metric):
+    """Day of a metric's oldest row in any table or database, or None"""
+    oldest = [
+        model._base_manager.using(alias).aggregate(oldest=Min(metric.time_field))['oldest']
+        for model in metric.models for alias in tenant_databases(model)
+    ]
+    oldest = [value for value in oldest if value is not None]
+    return timezone.localtime(min(oldest)).date() if oldest else None
+
+
+def _rollup_rows(name, metric, start_day, end_day, interval, organization=None):
+    queryset = DailyRollup.objects.filter(metric__startswith=name, day__gte=start_day, day__lte=end_day)
+    if organization is not None:
+        queryset = queryset.filter(organization=organization)
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=Trunc('day', interval, output_field=DateField()))
+        .values('bucket', 'organization', 'metric')
+        .annotate(value=Sum('value'))
+    )
+    for row in rows:
+        split = row['metric'].partition(':')[2] or None
+        if split is None and metric.split_field:
+            continue
+        yield row['bucket'], row['organization'], split, row['value']
+
+
+def time_series(name, interval='day', start_day=None, end_day=None,
+                organization=None, campaign=None, group_by_organization=False):
+    """
+    Return [{'bucket', 'value'[, 'organization'][, split field]}] for a metric.
+
+    Campaign filters are not rolled up, so they always read raw rows.
+    """
+    metric = METRICS[name]
+    end_day = end_day or timezone.localdate()
+    start_day = start_day or end_day - timedelta(days=365)
+
+    raw_start = start_day
+    parts = []
+    watermark = rollup_watermark(name) if campaign is None else None
+    if watermark is not None and watermark >= start_day:
+        rolled_end = min(watermark, end_day)
+        parts.append(_rollup_rows(name, metric, start_day, rolled_end, interval, organization))
+        raw_start = rolled_end + timedelta(days=1)
+    if raw_start <= end_day:
+        parts.append(_raw_rows(metric, raw_start, end_day, interval, organization, campaign))
+
+    totals = defaultdict(Decimal)
+    for rows in parts:
+        for bucket, organization_id, split, value in rows:
+            key = (bucket, organization_id if group_by_organization else None, split)
+            totals[key] += Decimal(value)
+
+    series = []
+    for (bucket, organization_id, split), value in sorted(
+        totals.items(), key=lambda item: (item[0][0], item[0][1] or 0, item[0][2] or '')
+    ):
+        point = {'bucket': bucket, 'value': value if name == 'raised' else int(value)}
+        if group_by_organization:
+            point['organization'] = organization_id
+        if metric.split_field:
+            point[metric.split_field] = split
+        series.append(point)
+    return series
+
+
+def build_daily_rollups(start_day=None, end_day=None):
+    """
+    (Re)compute rollups for complete days in [start_day, end_day].
+
+    Defaults to the days after each metric's watermark up to yesterday.
+    Returns the number of rollup rows written.
+    """
+    end_day = end_day or timezone.localdate() - timedelta(days=1)
+    written = 0
+    for name, metric in METRICS.items():
+        watermark = rollup_watermark(name)
+        oldest = _oldest_day(metric) if watermark is None else None
+        first_day = start_day
+        if first_day is None:
+            first_day = watermark + timedelta(days=1) if watermark is not None else oldest
+            if first_day is None:
+                continue
+        if first_day > end_day:
+            continue
+
+        totals = defaultdict(Decimal)
+        for bucket, organization_id, split, value in _raw_rows(metric, first_day, end_day, 'day'):
+            totals[bucket, organization_id, split] += Decimal(value)
+        rollups = [
+            DailyRollup(metric=_rollup_metric(name, split), day=bucket, organization_id=organization_id, value=value)
+            for (bucket, organization_id, split), value in totals.items()
+        ]
+        # Days before first_day must be rolled up already for the watermark to move
+        contiguous = (
+            first_day <= watermark + timedelta(days=1) if watermark is not None
+            else oldest is None or first_day <= oldest
+        )
+        with transaction.atomic():
+            DailyRollup.objects.filter(metric__startswith=name, day__gte=first_day, day__lte=end_day).delete()
+            DailyRollup.objects.bulk_create(rollups, batch_size=1000)
+            if contiguous and (watermark is None or end_day > watermark):
+                RollupWatermark.objects.update_or_create(metric=name, defaults={'processed_through': end_day})
+        written += len(rollups)
+    return written
@@ -20,6 +20,12 @@ def api_root(request, format=None):
         'organizations': reverse('organization-list', request=request, format=format),
         'campaigns': reverse('campaign-list', request=request, format=format),
         'beneficiaries': reverse('beneficiary-list', request=request, format=format),
+        'duplicates': reverse('duplicate-list', request=request, format=format),
+        'changes': reverse('change-feed', request=request, format=format),
+        'analytics': reverse('analytics', request=request, format=format),
+        'batch': reverse('batch', request=request, format=format),
+        'query': reverse('query', request=request, format=format),
+        'token': reverse('token', request=request, format=format),
         'admin': '/admin/',
         'documentation': {
             'description': 'API provides full CRUD operations with search, filtering, and pagination',
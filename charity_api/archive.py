@@ -0,0 +1,274 @@
+"""
+Soft delete and the archive tier.
+
+- API deletes only hide rows (``deleted_at``), together with the live rows
+  that cascade from them, in a few set-based UPDATEs. ``purge_deleted``
+  (run by the scheduler) removes hidden rows later in chunks, and with an
+  isolated organization the rows in its own database.
+- ``archive_campaigns`` moves old completed campaigns and their
+  beneficiaries, and long-inactive beneficiaries, into the archive tables in
+  chunked batches, keeping the hot tables small. The moved rows get delete
+  tombstones in the change log, in the same transaction.
+- ``?include_archived=1`` serves archived rows again on list and retrieve.
+"""
+from datetime import datetime, time, timedelta
+
+from django.apps import apps
+from django.db import models, router, transaction
+from django.db.models import Count, DateTimeField, F, Q, Value
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from .bulk import delete_rows, insert_from_select, log_changes, logged_atomic
+from .cache import bump_table_version
+from .models import ArchivedBeneficiary, ArchivedCampaign, Beneficiary, Campaign, Organization, SoftDeletable
+from .tenancy import TENANT_MODELS, tenant_database, tenant_scopes, use_tenant
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Columns copied as-is from the hot tables
+CAMPAIGN_COLUMNS = [
+    'id', 'organization', 'title', 'description', 'goal_amount', 'raised_amount', 'status',
+    'start_date', 'end_date', 'location', 'latitude', 'longitude', 'geo_cell', 'created_at', 'updated_at',
+]
+BENEFICIARY_COLUMNS = [
+    'id', 'campaign', 'organization', 'first_name', 'last_name', 'email', 'phone', 'address', 'date_of_birth',
+    'needs_description', 'amount_received', 'is_active', 'created_at', 'updated_at',
+]
+
+
+def _hide_children(model, parents, now):
+    """Soft-delete the live rows cascading from the parents queryset"""
+    for relation in model._meta.related_objects:
+        child = relation.related_model
+        if relation.on_delete is not models.CASCADE or not issubclass(child, SoftDeletable):
+            continue
+        children = child.objects.filter(**{f'{relation.field.name}__in': parents.values('pk')})
+        # Grandchildren first, while the children still match
+        _hide_children(child, children, now)
+        if log_changes(children, 'delete', now):
+            children.update(deleted_at=now, updated_at=now)
+            bump_table_version(child)
+
+
+def soft_delete(instance):
+    """Hide a row and everything that would cascade from it"""
+    now = timezone.now()
+    with logged_atomic(instance._state.db or router.db_for_write(type(instance))):
+        _hide_children(type(instance), type(instance)._base_manager.filter(pk=instance.pk), now)
+        instance.deleted_at = now
+        instance.save(update_fields=['deleted_at', 'updated_at'])
+
+
+def soft_delete_queryset(queryset):
+    """Set-based ``soft_delete`` for every row of queryset; returns the rows hidden"""
+    model = queryset.model
+    now = timezone.now()
+    with logged_atomic(queryset.db):
+        _hide_children(model, queryset, now)
+        rows = model.objects.filter(pk__in=queryset.values('pk'))
+        hidden = log_changes(rows, 'delete', now)
+        if hidden:
+            rows.update(deleted_at=now, updated_at=now)
+    if hidden:
+        bump_table_version(model)
+    return hidden
+
+
+def purge_deleted(batch_size=DEFAULT_BATCH_SIZE):
+    """Physically remove soft-deleted rows, one transaction per batch; returns {model name: rows}"""
+    purged = {}
+    for model in (Beneficiary, Campaign, Organization):
+        purged[model._meta.model_name] = 0
+        while True:
+            pks = list(
+                model.all_objects.filter(deleted_at__isnull=False).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            if model is Organization:
+                _purge_tenant_databases(pks)
+            with transaction.atomic(using=router.db_for_write(model)):
+                delete_rows(model, pks, batch_size)
+            purged[model._meta.model_name] += len(pks)
+    return purged
+
+
+def _purge_tenant_databases(organizations):
+    """
+    Remove every row isolated organizations keep in their own database
+    (``delete_rows`` cascades in the default one only)
+    """
+    now = timezone.now()
+    for organization in set(organizations).intersection(tenant_scopes()):
+        alias = tenant_database(organization)
+        with use_tenant(organization), logged_atomic(alias):
+            # Rows hidden before were logged then
+            for model in (Campaign, Beneficiary):
+                log_changes(model.objects.using(alias).filter(organization_id=organization), 'delete', now)
+            # Dependents first; signals and cascades are not needed, every tenant row goes
+            for label in reversed(TENANT_MODELS):
+                model = apps.get_model(label)
+                model._base_manager.using(alias).filter(organization_id=organization)._raw_delete(alias)
+            Organization._base_manager.using(alias).filter(pk=organization)._raw_delete(alias)
+        for label in TENANT_MODELS:
+            bump_table_version(apps.get_model(label))
+
+
+def _copy_beneficiaries(beneficiaries, now):
+    return insert_from_select(
+        ArchivedBeneficiary,
+        BENEFICIARY_COLUMNS + ['campaign_title', 'archived_at'],
+        beneficiaries.order_by().annotate(
+            archive_campaign_title=F('campaign__title'),
+            archive_time=Value(now, output_field=DateTimeField()),
+        ).values_list(*BENEFICIARY_COLUMNS, 'archive_campaign_title', 'archive_time'),
+    )
+
+
+def _batches(queryset, batch_size):
+    """Yield lists of primary keys until queryset matches nothing (rows are removed in between)"""
+    while True:
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+
+
+def archive_campaigns(days=365, beneficiary_days=None, batch_size=DEFAULT_BATCH_SIZE, today=None):
+    """
+    Move completed campaigns that ended more than ``days`` ago, with their
+    beneficiaries, and beneficiaries inactive for ``beneficiary_days``
+    (default: ``days``) into the archive tables.
+
+    Returns (campaigns archived, beneficiaries archived).
+    """
+    today = today or timezone.localdate()
+    beneficiary_days = days if beneficiary_days is None else beneficiary_days
+    campaigns_archived = beneficiaries_archived = 0
+
+    due_campaigns = Campaign.objects.filter(status='completed', end_date__lt=today - timedelta(days=days))
+    for pks in _batches(due_campaigns, batch_size):
+        now = timezone.now()
+        with logged_atomic(router.db_for_write(Campaign)):
+            campaigns_archived += insert_from_select(
+                ArchivedCampaign,
+                CAMPAIGN_COLUMNS + ['beneficiary_count', 'archived_at'],
+                Campaign.objects.filter(pk__in=pks).order_by().annotate(
+                    archive_beneficiaries=Count('beneficiaries', filter=Q(beneficiaries__deleted_at__isnull=True)),
+                    archive_time=Value(now, output_field=DateTimeField()),
+                ).values_list(*CAMPAIGN_COLUMNS, 'archive_beneficiaries', 'archive_time'),
+            )
+            beneficiaries_archived += _copy_beneficiaries(Beneficiary.objects.filter(campaign__in=pks), now)
+            # Soft-deleted beneficiaries already have theirs
+            log_changes(Campaign.objects.filter(pk__in=pks), 'delete', now)
+            log_changes(Beneficiary.objects.filter(campaign__in=pks), 'delete', now)
+            # Also removes the campaigns' beneficiaries (soft-deleted ones included)
+            delete_rows(Campaign, pks, batch_size)
+
+    cutoff = timezone.make_aware(datetime.combine(today - timedelta(days=beneficiary_days), time.min))
+    inactive = Beneficiary.objects.filter(is_active=False, updated_at__lt=cutoff)
+    for pks in _batches(inactive, batch_size):
+        now = timezone.now()
+        with logged_atomic(router.db_for_write(Beneficiary)):
+            beneficiaries_archived += _copy_beneficiaries(Beneficiary.objects.filter(pk__in=pks), now)
+            log_changes(Beneficiary.objects.filter(pk__in=pks), 'delete', now)
+            delete_rows(Beneficiary, pks, batch_size)
+
+    if campaigns_archived:
+        bump_table_version(Campaign)
+    if campaigns_archived or beneficiaries_archived:
+        bump_table_version(Beneficiary)
+    return campaigns_archived, beneficiaries_archived
+
+
+class ChainedResults:
+    """Read-only concatenation of querysets that Django's Paginator can count and slice"""
+
+    def __init__(self, *querysets):
+        self.querysets = querysets
+        self._counts = None
+
+    def counts(self):
+        if self._counts is None:
+            self._counts = [queryset.count() for queryset in self.querysets]
+        return self._counts
+
+    def count(self):
+        return sum(self.counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        for queryset in self.querysets:
+            yield from queryset
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("ChainedResults only supports slicing")
+        start, stop = index.start or 0, index.stop if index.stop is not None else self.count()
+        items = []
+        offset = 0
+        for queryset, count in zip(self.querysets, self.counts()):
+            if stop > offset and start < offset + count:
+                items.extend(queryset[max(start - offset, 0):min(stop - offset, count)])
+            offset += count
+        return items
+
+
+class SoftDeleteMixin:
+    """DELETE hides the row (and its dependents) instead of removing it synchronously"""
+
+    def perform_destroy(self, instance):
+        soft_delete(instance)
+
+
+class IncludeArchivedMixin:
+    """
+    ``?include_archived=1`` on list and retrieve also serves rows from
+    ``archive_model``. List results continue with the archived rows after
+    the live ones; filters, search and ordering apply to both.
+    """
+    archive_model = None
+    archive_serializer_class = None
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+    def get_archive_queryset(self):
+        return self.archive_model.objects.all()
+
+    def serialize_mixed(self, items):
+        live = [item for item in items if not isinstance(item, self.archive_model)]
+        archived = [item for item in items if isinstance(item, self.archive_model)]
+        context = self.get_serializer_context()
+        return (
+            self.get_serializer(live, many=True).data
+            + self.archive_serializer_class(archived, many=True, context=context).data
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not self.include_archived():
+            return super().list(request, *args, **kwargs)
+        results = ChainedResults(
+            self.filter_queryset(self.get_queryset()),
+            self.filter_queryset(self.get_archive_queryset()),
+        )
+        page = self.paginate_queryset(results)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_mixed(page))
+        return Response(self.serialize_mixed(list(results)))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.include_archived():
+                raise
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        instance = get_object_or_404(self.get_archive_queryset(), pk=self.kwargs[lookup_url_kwarg])
+        serializer = self.archive_serializer_class(instance, context=self.get_serializer_context())
+        return Response(serializer.data)
@@ -0,0 +1,259 @@
+"""
+In-memory name index for ``/api/autocomplete/``.
+
+Organization and charity names are kept in two structures:
+
+- a sorted array of normalized name keys (the full name plus every
+  word-suffix, so "cross so" finds "Red Cross Society"), searched with
+  ``bisect``; it is the flattened, compact form of a prefix trie;
+- a trigram index for typo-tolerant matches when prefixes find too little.
+
+The index is built from the database on first use (or at worker start, see
+``charity_project/wsgi.py``) and updated incrementally by model signals.
+Other processes' writes reach it through the table versions when every
+process shares them (``SHARED_CACHE``, see ``cache.versions_shared``);
+otherwise it is rebuilt every ``AUTOCOMPLETE_REBUILD_SECONDS``.
+Organizations rank by their number of live campaigns: campaign signals move
+the count by one, and rebuilds count them again.
+``AUTOCOMPLETE_MAX_ENTRIES`` caps its size by keeping the most popular names.
+"""
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Count, Q, Value
+
+from .cache import table_version, versions_shared
+
+# Prefixes this short match too many keys to scan; their rankings are cached
+SHORT_PREFIX_LENGTH = 2
+SHORT_PREFIX_RESULTS = 50
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+def name_keys(normalized):
+    """The full name and every word-suffix of it"""
+    words = normalized.split(' ')
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+def trigrams(normalized):
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _sources():
+    """(kind, model, queryset of (pk, name, popularity)) for every indexed table"""
+    from .models import Charity, Organization
+
+    return [
+        ('organization', Organization,
+         Organization.objects.annotate(
+             popularity=Count('campaigns', filter=Q(campaigns__deleted_at__isnull=True))
+         ).values_list('pk', 'name', 'popularity')),
+        ('charity', Charity,
+         Charity.objects.annotate(popularity=Value(0)).values_list('pk', 'name', 'popularity')),
+    ]
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._versions = None
+        self._built_at = None
+        self._clear()
+
+    def _clear(self):
+        self.entries = {}       # (kind, pk) -> (name, popularity, trigram count)
+        self.keys = []          # sorted normalized keys
+        self.key_owners = []    # (kind, pk) for each key, parallel to ``keys``
+        self.trigram_postings = defaultdict(set)
+        self._short_prefix_cache = {}
+
+    def reset(self):
+        """Drop every entry; the next search rebuilds the index"""
+        with self._lock:
+            self._clear()
+            self._versions = self._built_at = None
+
+    @property
+    def is_built(self):
+        return self._versions is not None
+
+    def _current_versions(self):
+        return tuple(table_version(model) for _kind, model, _rows in _sources())
+
+    def _ensure_built(self):
+        if not versions_shared():
+            # Other processes' writes would not change the versions seen here
+            max_age = getattr(settings, 'AUTOCOMPLETE_REBUILD_SECONDS', 60)
+            if self._built_at is None or time.monotonic() - self._built_at >= max_age:
+                self.rebuild()
+            return
+        versions = self._current_versions()
+        if versions != self._versions:
+            self.rebuild(versions)
+
+    def rebuild(self, versions=None):
+        """Load every name from the database, most popular first"""
+        max_entries = getattr(settings, 'AUTOCOMPLETE_MAX_ENTRIES', 200000)
+        rows = []
+        for kind, _model, queryset in _sources():
+            rows.extend((kind, pk, name, popularity) for pk, name, popularity in queryset.iterator())
+        rows.sort(key=lambda row: -row[3])
+
+        with self._lock:
+            self._clear()
+            pairs = []
+            for kind, pk, name, popularity in rows[:max_entries]:
+                pairs.extend(self._add_entry(kind, pk, name, popularity))
+            pairs.sort()
+            self.keys = [key for key, _owner in pairs]
+            self.key_owners = [owner for _key, owner in pairs]
+            self._versions = versions or self._current_versions()
+            self._built_at = time.monotonic()
+
+    def _add_entry(self, kind, pk, name, popularity):
+        """Register an entry's metadata and trigrams; return its (key, owner) pairs"""
+        owner = (kind, pk)
+        normalized = normalize(name)
+        grams = trigrams(normalized)
+        self.entries[owner] = (name, popularity, len(grams))
+        for gram in grams:
+            self.trigram_postings[gram].add(owner)
+        return [(key, owner) for key in name_keys(normalized)]
+
+    def _remove_entry(self, owner):
+        name, _popularity, _size = self.entries.pop(owner)
+        normalized = normalize(name)
+        for gram in trigrams(normalized):
+            postings = self.trigram_postings.get(gram)
+            if postings is not None:
+                postings.discard(owner)
+                if not postings:
+                    del self.trigram_postings[gram]
+        for key in name_keys(normalized):
+            index = bisect_left(self.keys, key)
+            while index < len(self.keys) and self.keys[index] == key:
+                if self.key_owners[index] == owner:
+                    del self.keys[index]
+                    del self.key_owners[index]
+                    break
+                index += 1
+
+    def upsert(self, kind, pk, name, popularity=None):
+        """Add or refresh one entry (called from signals)"""
+        with self._lock:
+            if self._versions is None:
+                return
+            owner = (kind, pk)
+            if owner in self.entries:
+                if popularity is None:
+                    popularity = self.entries[owner][1]
+                self._remove_entry(owner)
+            elif len(self.entries) >= getattr(settings, 'AUTOCOMPLETE_MAX_ENTRIES', 200000):
+                return
+            for key, key_owner in self._add_entry(kind, pk, name, popularity or 0):
+                index = bisect_left(self.keys, key)
+                self.keys.insert(index, key)
+                self.key_owners.insert(index, key_owner)
+            self._short_prefix_cache.clear()
+            self._versions = self._current_versions()
+
+    def add_popularity(self, kind, pk, delta):
+        """Move an entry's popularity by delta (called from signals, no query)"""
+        with self._lock:
+            entry = self.entries.get((kind, pk))
+            if entry is not None:
+                self.entries[(kind, pk)] = (entry[0], max(entry[1] + delta, 0), entry[2])
+                self._short_prefix_cache.clear()
+
+    def remove(self, kind, pk):
+        with self._lock:
+            if self._versions is None:
+                return
+            if (kind, pk) in self.entries:
+                self._remove_entry((kind, pk))
+                self._short_prefix_cache.clear()
+            self._versions = self._current_versions()
+
+    def _prefix_matches(self, prefix):
+        """Owners of keys starting with prefix, best first"""
+        if len(prefix) <= SHORT_PREFIX_LENGTH and prefix in self._short_prefix_cache:
+            return self._short_prefix_cache[prefix]
+        owners = set()
+        index = bisect_left(self.keys, prefix)
+        while index < len(self.keys) and self.keys[index].startswith(prefix):
+            owners.add(self.key_owners[index])
+            index += 1
+        ranked = sorted(owners, key=lambda owner: (-self.entries[owner][1], self.entries[owner][0]))
+        if len(prefix) <= SHORT_PREFIX_LENGTH:
+            ranked = ranked[:SHORT_PREFIX_RESULTS]
+            self._short_prefix_cache[prefix] = ranked
+        return ranked
+
+    def _fuzzy_matches(self, normalized):
+        """(similarity, owner) pairs sharing enough trigrams with the query"""
+        query_grams = trigrams(normalized)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for owner in self.trigram_postings.get(gram, ()):
+                shared[owner] += 1
+        scored = []
+        for owner, count in shared.items():
+            similarity = count / (len(query_grams) + self.entries[owner][2] - count)
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                scored.append((similarity, owner))
+        scored.sort(key=lambda item: (-item[0], -self.entries[item[1]][1]))
+        return scored
+
+    def search(self, query, limit=10, kinds=None):
+        """Top matches for a partial name: prefix hits first, then fuzzy ones"""
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        with self._lock:
+            self._ensure_built()
+            results = []
+            seen = set()
+            for owner in self._prefix_matches(normalized):
+                if kinds and owner[0] not in kinds:
+                    continue
+                results.append(self._result(owner, 1.0))
+                seen.add(owner)
+                if len(results) >= limit:
+                    return results
+            if len(normalized) >= 3:
+                for similarity, owner in self._fuzzy_matches(normalized):
+                    if owner in seen or (kinds and owner[0] not in kinds):
+                        continue
+                    results.append(self._result(owner, round(similarity, 3)))
+                    if len(results) >= limit:
+                        break
+            return results
+
+    def _result(self, owner, score):
+        name, popularity, _size = self.entries[owner]
+        return {'type': owner[0], 'id': owner[1], 'name': name, 'popularity': popularity, 'score': score}
+
+
+index = AutocompleteIndex()
+
+
+def warm_up():
+    """Build the index before the first request; skipped if the tables are missing"""
+    try:
+        index.rebuild()
+    except DatabaseError:
+        pass
@@ -0,0 +1,178 @@
+"""
+Several API calls in one round trip (``POST /api/batch/``).
+
+Each sub-request is resolved against the URLconf and handed straight to its
+API view: no second pass through the middleware. The batch's credentials go
+with every sub-request, and the user they authenticated is reused (and the
+token's scopes checked) when the target view accepts the scheme the batch
+was authenticated with; any other view, such as ``/api/token/`` (HTTP Basic
+only), authenticates the sub-request through its own
+``authentication_classes``, exactly as a direct call would. Consecutive reads
+run concurrently in a thread pool of ``BATCH_MAX_WORKERS``; a write waits
+for everything listed before it and runs alone, so sub-requests still see
+the writes listed before them.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve, reverse
+from rest_framework.exceptions import PermissionDenied
+
+from .tokens import check_scope
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+METHODS = READ_METHODS + ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Batch request headers not passed on to sub-requests
+DROPPED_META = (
+    'CONTENT_TYPE', 'CONTENT_LENGTH', 'QUERY_STRING', 'wsgi.input',
+    'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE',
+)
+# Sub-request headers that cannot be set (credentials are the batch's)
+RESERVED_HEADERS = ('authorization', 'cookie', 'content-type', 'content-length')
+# Sub-response headers included in the results
+RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Location')
+
+
+def parse_requests(data):
+    """Validate the batch body; returns the list of sub-requests or raises ValueError"""
+    specs = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("Send a non-empty 'requests' list.")
+    max_requests = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+    if len(specs) > max_requests:
+        raise ValueError(f"At most {max_requests} requests per batch.")
+    for number, spec in enumerate(specs):
+        if not isinstance(spec, dict) or not isinstance(spec.get('path'), str):
+            raise ValueError(f"Request {number} needs a 'path'.")
+        spec['method'] = str(spec.get('method', 'GET')).upper()
+        if spec['method'] not in METHODS:
+            raise ValueError(f"Request {number}: method must be one of {', '.join(METHODS)}.")
+        headers = spec.get('headers', {})
+        if not isinstance(headers, dict) or not all(isinstance(value, str) for value in headers.values()):
+            raise ValueError(f"Request {number}: 'headers' must map names to strings.")
+        if any(name.lower() in RESERVED_HEADERS for name in headers):
+            raise ValueError(f"Request {number}: {', '.join(RESERVED_HEADERS)} headers cannot be set.")
+    return specs
+
+
+def build_request(batch_request, spec):
+    """Django request for one sub-request, carrying the batch request's credentials"""
+    outer = batch_request._request
+    parts = urlsplit(spec['path'])
+    request = HttpRequest()
+    request.method = spec['method']
+    request.path = request.path_info = parts.path
+    request.META = {key: value for key, value in outer.META.items() if key not in DROPPED_META}
+    request.META.update({
+        'REQUEST_METHOD': spec['method'],
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'HTTP_ACCEPT': 'application/json',
+    })
+    for name, value in spec.get('headers', {}).items():
+        request.META['HTTP_' + name.upper().replace('-', '_')] = value
+    request.GET = QueryDict(parts.query)
+    request.COOKIES = outer.COOKIES
+
+    body = b'' if spec.get('body') is None else json.dumps(spec['body']).encode()
+    if body:
+        request.META['CONTENT_TYPE'] = 'application/json'
+    request.META['CONTENT_LENGTH'] = str(len(body))
+    request._stream = BytesIO(body)
+    request._read_started = False
+    return request
+
+
+def reuses_authentication(batch_request, match):
+    """Whether the resolved view accepts the scheme the batch request was authenticated with"""
+    authenticator = batch_request.successful_authenticator
+    view_class = getattr(match.func, 'cls', None)
+    if authenticator is None or view_class is None:
+        return False
+    initkwargs = getattr(match.func, 'initkwargs', {})
+    classes = initkwargs.get('authentication_classes', view_class.authentication_classes)
+    return isinstance(authenticator, tuple(classes))
+
+
+def result(status, body, headers=None):
+    return {'status': status, 'headers': headers or {}, 'body': body}
+
+
+def run_request(batch_request, spec):
+    """Run one sub-request; returns {'status', 'headers', 'body'}"""
+    request = build_request(batch_request, spec)
+    if not request.path_info.startswith(reverse('api-root')):
+        return result(400, {'error': 'Only API paths can be batched.'})
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return result(404, {'error': 'Not found.'})
+    if match.url_name == 'batch':
+        return result(400, {'error': 'Batches cannot be nested.'})
+    request.resolver_match = match
+    if reuses_authentication(batch_request, match):
+        # Forced authentication skips the token's scope check
+        try:
+            check_scope(batch_request.auth, spec['method'], match.func.cls)
+        except PermissionDenied as e:
+            return result(403, {'error': str(e.detail)})
+        # Read by rest_framework.request.Request in place of the authenticators
+        request._force_auth_user = batch_request.user
+        request._force_auth_token = batch_request.auth
+
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception("Batched %s %s failed", spec['method'], spec['path'])
+        return result(500, {'error': 'Internal server error.'})
+
+    if response.streaming:
+        response.close()
+        return result(400, {'error': 'Streaming endpoints cannot be batched.'})
+    headers = {name: response[name] for name in RESPONSE_HEADERS if response.has_header(name)}
+    if hasattr(response, 'data'):
+        body = response.data
+    elif not response.content:
+        body = None
+    elif response.get('Content-Type', '').startswith('application/json'):
+        body = json.loads(response.content)
+    else:
+        body = response.content.decode(response.charset)
+    return result(response.status_code, body, headers)
+
+
+def _run_in_thread(batch_request, spec):
+    try:
+        return run_request(batch_request, spec)
+    finally:
+        # Worker threads open their own connections
+        connections.close_all()
+
+
+def run_batch(batch_request, specs):
+    """Results of every sub-request, in order"""
+    results = [None] * len(specs)
+    max_workers = getattr(settings, 'BATCH_MAX_WORKERS', 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        reads = []
+        for number, spec in enumerate(specs):
+            if spec['method'] in READ_METHODS:
+                reads.append((number, pool.submit(_run_in_thread, batch_request, spec)))
+                continue
+            # A write sees the outcome of every request listed before it
+            for read_number, future in reads:
+                results[read_number] = future.result()
+            reads = []
+            results[number] = run_request(batch_request, spec)
+        for read_number, future in reads:
+            results[read_number] = future.result()
+    return results
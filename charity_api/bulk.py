@@ -0,0 +1,98 @@
+"""
+Set-based write helpers for jobs that touch many rows at once.
+
+They never load model instances, so model signals do not run: callers log
+their changes with ``log_changes`` and bump the table versions themselves
+(``logged_update`` does both). ``logged_atomic`` opens the transaction on
+the database the rows live in (a tenant's own for isolated tenants, see
+``tenancy.py``) and on the change log's, when that is another one.
+"""
+from contextlib import contextmanager
+
+from django.db import connections, models, router, transaction
+from django.db.models import CharField, DateTimeField, F, Value
+from django.utils import timezone
+
+from .cache import bump_table_version
+from .models import ChangeLogEntry
+
+
+def insert_from_select(model, fields, queryset):
+    """INSERT INTO model (fields) SELECT <queryset columns>; returns the row count"""
+    connection = connections[queryset.db]
+    select_sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) {select_sql}', params)
+        return cursor.rowcount
+
+
+@contextmanager
+def logged_atomic(using):
+    """``transaction.atomic`` on database using and, if it is another one, the change log's"""
+    log_db = router.db_for_write(ChangeLogEntry)
+    with transaction.atomic(using=log_db):
+        if using == log_db:
+            yield
+        else:
+            with transaction.atomic(using=using):
+                yield
+
+
+def log_changes(queryset, action, when):
+    """Append one change log entry per row of queryset; returns the row count"""
+    model_name = queryset.model._meta.model_name
+    if queryset.db != router.db_for_write(ChangeLogEntry):
+        # Rows of an isolated tenant: the change log stays in the default database
+        entries = [
+            ChangeLogEntry(model_name=model_name, object_id=pk, action=action)
+            for pk in queryset.order_by().values_list('pk', flat=True).iterator()
+        ]
+        ChangeLogEntry.objects.bulk_create(entries, batch_size=1000)
+        return len(entries)
+    return insert_from_select(
+        ChangeLogEntry,
+        ['model_name', 'object_id', 'action', 'created_at'],
+        queryset.order_by().annotate(
+            log_model=Value(model_name, output_field=CharField()),
+            log_object=F('pk'),
+            log_action=Value(action, output_field=CharField()),
+            log_time=Value(when, output_field=DateTimeField()),
+        ).values_list('log_model', 'log_object', 'log_action', 'log_time'),
+    )
+
+
+def logged_update(queryset, when=None, **values):
+    """
+    ``QuerySet.update()`` that also logs an upsert per row, refreshes
+    ``updated_at`` and invalidates the table's caches; returns the row count
+    """
+    when = when or timezone.now()
+    if any(field.name == 'updated_at' for field in queryset.model._meta.concrete_fields):
+        values.setdefault('updated_at', when)
+    with logged_atomic(queryset.db):
+        log_changes(queryset, 'upsert', when)
+        updated = queryset.update(**values)
+    if updated:
+        bump_table_version(queryset.model)
+    return updated
+
+
+def delete_rows(model, pks, batch_size=1000):
+    """
+    Delete rows by primary key without loading them, applying each
+    relation's ``on_delete`` (CASCADE or SET_NULL) first, in batches.
+    """
+    for relation in model._meta.related_objects:
+        related = relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': pks})
+        if relation.on_delete is models.CASCADE:
+            related_pks = list(related.values_list('pk', flat=True))
+            for start in range(0, len(related_pks), batch_size):
+                delete_rows(relation.related_model, related_pks[start:start + batch_size], batch_size)
+        elif relation.on_delete is models.SET_NULL:
+            related.update(**{relation.field.name: None})
+        elif relation.on_delete is not models.DO_NOTHING:
+            raise ValueError(f"Unsupported on_delete for {relation.related_model.__name__}.{relation.field.name}")
+    # The fast-delete path of QuerySet.delete(): one DELETE, no signals
+    return model._base_manager.filter(pk__in=pks)._raw_delete(model._base_manager.db)
@@ -0,0 +1,57 @@
+"""
+Per-table version counters for cache invalidation.
+
+Cached values derived from a table embed its current version in their key;
+any write to the table bumps the version (see ``signals.py``) so stale
+entries are simply never read again and age out of the cache.
+
+The versions live in the default cache, so a bump only reaches the
+processes sharing it. With a process-local backend (``LocMemCache``), a
+write in one web worker or in a management command leaves the other
+processes serving stale entries, so the caches built on these versions
+(facet and list counts, query results) check ``versions_shared()`` and
+stay off unless ``SHARED_CACHE`` says every process uses the same cache.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+
+def versions_shared():
+    """True when every process writing to the database sees the same table versions"""
+    return getattr(settings, 'SHARED_CACHE', False)
+
+
+def _version_key(model):
+    return f'table-version:{model._meta.label_lower}'
+
+
+def table_version(model):
+    """Current version of a model's table"""
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        # Start from a timestamp so an evicted counter never repeats a version
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_table_version(model):
+    """Invalidate everything cached for a model's table"""
+    key = _version_key(model)
+    _bump(key)
+    # Until the write commits, other connections still read (and may cache
+    # under the new version) the old rows: bump again once it does
+    for connection in connections.all(initialized_only=True):
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: _bump(key), using=connection.alias)
@@ -0,0 +1,212 @@
+"""
+Response compression.
+
+``CompressionMiddleware`` compresses responses with the best coding the
+client accepts (``Accept-Encoding``), in the order of
+``COMPRESSION_ENCODINGS``: zstd and brotli when the ``zstandard`` /
+``brotli`` packages are installed, gzip always. Bodies smaller than
+``COMPRESSION_MIN_BYTES`` and non-text content types go out as they are.
+Streaming responses are compressed chunk by chunk, each chunk flushed so
+clients still receive it right away.
+
+Responses that may carry a secret go out uncompressed, against BREACH (an
+attacker who can reflect input into a compressed page next to a secret
+recovers the secret from the compressed sizes): those that set the CSRF
+cookie or render a CSRF token, and those that depend on the session (they
+vary on ``Cookie``: logged-in pages and the admin). API responses and the
+anonymous, cached web pages are compressed as usual.
+
+The middleware also rewrites the request's ``Accept-Encoding`` to the
+negotiated coding. Pages cached by ``cache_page`` vary on that header, so
+there is one cache entry per coding instead of one per browser's spelling
+of the header; views wrapped in ``precompressed`` (inside the cache)
+store those entries already compressed, and cache hits skip both rendering
+and compression.
+"""
+import zlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import has_vary_header, patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content types worth compressing (prefixes)
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+
+
+class GzipCompressor:
+    def __init__(self, level=6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level=4):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level=3):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+# Codings this process can produce
+COMPRESSORS = {'gzip': GzipCompressor}
+if brotli is not None:
+    COMPRESSORS['br'] = BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS['zstd'] = ZstdCompressor
+
+
+def preferred_codings():
+    configured = getattr(settings, 'COMPRESSION_ENCODINGS', ['zstd', 'br', 'gzip'])
+    return [coding for coding in configured if coding in COMPRESSORS]
+
+
+def negotiate(accept_encoding):
+    """Coding to use for an ``Accept-Encoding`` header, or None for identity"""
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        weight = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                continue
+        if coding:
+            weights[coding.strip().lower()] = weight
+    candidates = [
+        (weights.get(coding, weights.get('*', 0.0)), -rank, coding)
+        for rank, coding in enumerate(preferred_codings())
+    ]
+    candidates = [candidate for candidate in candidates if candidate[0] > 0]
+    return max(candidates)[2] if candidates else None
+
+
+def compress_bytes(data, coding):
+    compressor = COMPRESSORS[coding]()
+    return compressor.compress(data) + compressor.finish()
+
+
+def _compress_chunks(chunks, coding):
+    compressor = COMPRESSORS[coding]()
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def _compress_chunks_async(chunks, coding):
+    compressor = COMPRESSORS[coding]()
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def carries_secrets(response, request=None):
+    """Whether response may hold a CSRF token or per-session data (not compressed, see the module docstring)"""
+    if settings.CSRF_COOKIE_NAME in response.cookies or has_vary_header(response, 'Cookie'):
+        return True
+    if request is None:
+        return False
+    # Inside the view (``precompressed``), before the CSRF and session middleware mark the response
+    session = getattr(request, 'session', None)
+    return bool(request.META.get('CSRF_COOKIE_NEEDS_UPDATE') or (session is not None and session.accessed))
+
+
+def compress_response(response, coding, request=None):
+    """Compress response in place with coding (None: leave it) when worth it and safe"""
+    if response.has_header('Content-Encoding') or response.status_code == 206:
+        return response
+    if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+        return response
+    if carries_secrets(response, request):
+        return response
+    # Sent as is or not, the representation depends on Accept-Encoding (caches must key on it)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if coding is None:
+        return response
+
+    if response.streaming:
+        if response.is_async:
+            response.streaming_content = _compress_chunks_async(response.streaming_content, coding)
+        else:
+            response.streaming_content = _compress_chunks(response.streaming_content, coding)
+        del response['Content-Length']
+    else:
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_BYTES', 512):
+            return response
+        compressed = compress_bytes(response.content, coding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+
+    # The bytes differ from the uncompressed representation
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    response['Content-Encoding'] = coding
+    return response
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        coding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        # One cache variant per coding (see the module docstring)
+        request.META['HTTP_ACCEPT_ENCODING'] = coding or 'identity'
+        return compress_response(self.get_response(request), coding, request)
+
+
+def precompressed(view):
+    """Compress a view's responses itself, so a cache wrapped around it stores compressed bytes"""
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        return compress_response(response, negotiate(request.META.get('HTTP_ACCEPT_ENCODING', '')), request)
+    return wrapped_view
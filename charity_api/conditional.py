@@ -0,0 +1,99 @@
+from calendar import timegm
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.crypto import md5
+from django.utils.http import http_date, quote_etag
+
+from .models import ChangeLogEntry
+
+
+def related_queryset(queryset, path):
+    """Every row reached from queryset through a relation path, as nested ``IN`` subqueries"""
+    model = queryset.model
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        if field.many_to_one or field.one_to_one and not field.auto_created:
+            queryset = field.related_model._base_manager.filter(pk__in=queryset.values(field.attname))
+        else:
+            queryset = field.related_model._base_manager.filter(**{f'{field.field.name}__in': queryset.values('pk')})
+        model = field.related_model
+    return queryset
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs (If-None-Match / If-Modified-Since) on list and
+    retrieve without serializing anything.
+
+    The validator comes from one aggregate query per table over the same
+    (filtered) queryset the view would serialize: ``max(updated_at)`` and the
+    row count, plus the same pair for the rows of every relation listed in
+    ``conditional_related`` so that nested or derived fields (e.g.
+    ``organization_name``, ``beneficiary_count``) are covered too. Deletes
+    never bump ``updated_at``, so the time of the latest delete in the change
+    log for any of those tables counts as a modification as well.
+    """
+    conditional_related = ()
+
+    def get_conditional_state(self, queryset):
+        """Return (etag, last_modified) for a queryset, or (None, None) if empty"""
+        state = {'': queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))}
+        if not state['']['count']:
+            return None, None
+        model_names = {queryset.model._meta.model_name}
+        for related in self.conditional_related:
+            rows = related_queryset(queryset, related)
+            state[related] = rows.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+            model_names.add(rows.model._meta.model_name)
+        state['deleted'] = {'last_modified': ChangeLogEntry.objects.filter(
+            model_name__in=model_names, action='delete',
+        ).aggregate(last=Max('created_at'))['last']}
+
+        last_modified = max(values['last_modified'] for values in state.values()
+                            if values['last_modified'] is not None)
+        fingerprint = '|'.join([
+            self.request.path,
+            self.request.accepted_renderer.format,
+            self.request.query_params.urlencode(),
+            # Tenant-scoped views (see tenancy.py) answer per organization
+            repr(getattr(self, 'tenant', None)),
+            repr(sorted((name, sorted(values.items())) for name, values in state.items())),
+        ])
+        etag = quote_etag(md5(fingerprint.encode(), usedforsecurity=False).hexdigest())
+        return etag, timegm(last_modified.utctimetuple())
+
+    def conditional_response(self, queryset, handler, *args, **kwargs):
+        """Return 304 when the client copy is current, otherwise call handler"""
+        etag, last_modified = self.get_conditional_state(queryset)
+        if etag is not None:
+            not_modified = get_conditional_response(
+                self.request, etag=etag, last_modified=last_modified
+            )
+            if not_modified is not None:
+                patch_vary_headers(not_modified, ['Accept'])
+                return not_modified
+
+        response = handler(self.request, *args, **kwargs)
+        if etag is not None and response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ['Accept'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(queryset, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        # A lookup value of the wrong type is a 404, as in get_object()
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        return self.conditional_response(queryset, super().retrieve, *args, **kwargs)
@@ -0,0 +1,72 @@
+"""
+Row counts that stay cheap on large tables.
+
+``table_estimate`` reads the row count the database keeps in its planner
+statistics (no table scan); ``approximate_count`` uses it for unfiltered
+querysets and stops counting filtered ones at a cap.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+DEFAULT_COUNT_CAP = 10000
+
+
+def table_estimate(model, using='default'):
+    """Row count from the database statistics, or None when there are none"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s", [table]
+            )
+        elif connection.vendor == 'sqlite':
+            # Only present once ANALYZE has run
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    # PostgreSQL reports -1 for tables that were never analyzed
+    return estimate if estimate >= 0 else None
+
+
+def is_unfiltered(queryset):
+    """True if queryset selects every row its model's default manager does"""
+    default = queryset.model._default_manager.all().query
+    return queryset.query.where == default.where and not queryset.query.distinct
+
+
+def capped_count(queryset, cap):
+    """Exact count, but stop counting after ``cap`` rows"""
+    return queryset.order_by()[:cap].count()
+
+
+def approximate_count(queryset, cap=DEFAULT_COUNT_CAP):
+    """
+    Statistics estimate for unfiltered querysets on big tables; otherwise an
+    exact count that stops at ``cap``.
+    """
+    if is_unfiltered(queryset):
+        estimate = table_estimate(queryset.model, queryset.db)
+        if estimate is not None and estimate >= cap:
+            return estimate
+    return capped_count(queryset, cap)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose ``count`` is ``approximate_count``, for admin changelists"""
+    count_cap = DEFAULT_COUNT_CAP
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list, self.count_cap)
@@ -0,0 +1,266 @@
+"""
+Duplicate beneficiary detection.
+
+The same person registered under several campaigns, with small spelling
+differences, would be paid twice. Comparing every pair of beneficiaries is
+quadratic, so rows are grouped into blocks by indexed keys filled on save:
+
+- ``name_key``: Soundex codes of the first and last name ("Jon Smyth" and
+  "John Smith" share ``J500S530``);
+- ``email_key``: the email, lowercased and without a ``+tag``;
+- ``phone_key``: the last nine digits of the phone number;
+- ``date_of_birth``.
+
+Only pairs sharing a block, within one organization, are scored (names by
+Jaro-Winkler similarity, the other fields by equality). Pairs scoring at
+least ``DEDUPE_THRESHOLD`` are recorded as ``BeneficiaryMatch`` rows for
+review (``/api/duplicates/``). New and edited beneficiaries are matched on
+save, imported ones a batch at a time; ``manage.py find_duplicates``
+matches everything, a block at a time.
+Blocks larger than ``DEDUPE_MAX_BLOCK_SIZE`` (say, a placeholder birth
+date) carry no signal and are skipped.
+"""
+from collections import defaultdict
+from itertools import combinations, groupby
+
+from django.conf import settings
+from django.db.models import Q
+
+from .autocomplete import normalize
+
+BLOCK_FIELDS = ('name_key', 'email_key', 'phone_key', 'date_of_birth')
+# Relative weight of each field in a pair's score
+WEIGHTS = {'name': 0.4, 'email': 0.25, 'phone': 0.2, 'date_of_birth': 0.15}
+# Columns read to score a beneficiary
+SCORED_FIELDS = ('id', 'organization_id', 'first_name', 'last_name', 'date_of_birth') + BLOCK_FIELDS[:3]
+
+_SOUNDEX_CODES = {
+    letter: str(digit)
+    for digit, letters in enumerate(['aeiouyhw', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r'])
+    for letter in letters
+}
+
+
+def soundex(word):
+    """American Soundex code of a name ('' for a name without letters)"""
+    letters = [ch for ch in normalize(word) if ch in _SOUNDEX_CODES]
+    if not letters:
+        return ''
+    code, previous = letters[0].upper(), _SOUNDEX_CODES[letters[0]]
+    for letter in letters[1:]:
+        digit = _SOUNDEX_CODES[letter]
+        if digit != '0' and digit != previous:
+            code += digit
+        # Letters split only by h or w count once
+        if letter not in 'hw':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def normalize_email(email):
+    local, _, domain = (email or '').strip().lower().partition('@')
+    if not domain:
+        return ''
+    return f"{local.split('+')[0]}@{domain}"
+
+
+def normalize_phone(phone):
+    """The last nine digits, which survive country code and trunk prefix variations"""
+    digits = ''.join(ch for ch in phone or '' if ch.isdigit())
+    return digits[-9:] if len(digits) >= 6 else ''
+
+
+def match_keys(first_name, last_name, email, phone):
+    """(name_key, email_key, phone_key) for a beneficiary"""
+    return soundex(first_name) + soundex(last_name), normalize_email(email), normalize_phone(phone)
+
+
+def jaro_winkler(a, b):
+    """Similarity of two strings between 0 and 1, favouring a common prefix"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    a_matched, b_matched = [False] * len(a), [False] * len(b)
+    matches = 0
+    for i, ch in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not b_matched[j] and b[j] == ch:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    a_chars = [ch for ch, matched in zip(a, a_matched) if matched]
+    b_chars = [ch for ch, matched in zip(b, b_matched) if matched]
+    transpositions = sum(x != y for x, y in zip(a_chars, b_chars)) / 2
+    jaro = (matches / len(a) + matches / len(b) + (matches - transpositions) / matches) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def score_pair(a, b):
+    """
+    (score between 0 and 1, reasons) for two beneficiaries. Fields blank on
+    either side are left out of the score rather than counted as different.
+    """
+    name = (
+        jaro_winkler(normalize(a.first_name), normalize(b.first_name))
+        + jaro_winkler(normalize(a.last_name), normalize(b.last_name))
+    ) / 2
+    parts = {'name': name}
+    if a.email_key and b.email_key:
+        parts['email'] = float(a.email_key == b.email_key)
+    if a.phone_key and b.phone_key:
+        parts['phone'] = float(a.phone_key == b.phone_key)
+    if a.date_of_birth and b.date_of_birth:
+        parts['date_of_birth'] = float(a.date_of_birth == b.date_of_birth)
+    score = sum(WEIGHTS[field] * value for field, value in parts.items()) / sum(WEIGHTS[field] for field in parts)
+    reasons = [f'name {name:.2f}'] + [field for field, value in parts.items() if field != 'name' and value]
+    return score, ', '.join(reasons)
+
+
+def _threshold():
+    return getattr(settings, 'DEDUPE_THRESHOLD', 0.8)
+
+
+def _max_block_size():
+    return getattr(settings, 'DEDUPE_MAX_BLOCK_SIZE', 200)
+
+
+def record_matches(pairs, threshold=None):
+    """Score pairs of beneficiaries and record new ones reaching the threshold; returns how many were new"""
+    from .models import BeneficiaryMatch
+
+    threshold = _threshold() if threshold is None else threshold
+    matches = {}
+    for a, b in pairs:
+        if a.pk > b.pk:
+            a, b = b, a
+        score, reasons = score_pair(a, b)
+        if score >= threshold:
+            matches[a.pk, b.pk] = BeneficiaryMatch(
+                organization_id=a.organization_id, beneficiary_id=a.pk, other_id=b.pk,
+                score=round(score, 3), reasons=reasons,
+            )
+    if not matches:
+        return 0
+    # Pairs already recorded keep their score and review status
+    recorded = BeneficiaryMatch.objects.filter(
+        beneficiary_id__in={pk for pk, _ in matches}, other_id__in={pk for _, pk in matches},
+    ).values_list('beneficiary_id', 'other_id')
+    for pair in recorded:
+        matches.pop(pair, None)
+    # Conflicts left are pairs recorded concurrently since
+    BeneficiaryMatch.objects.bulk_create(matches.values(), ignore_conflicts=True)
+    return len(matches)
+
+
+def match_beneficiary(beneficiary):
+    """Compare one beneficiary with the others sharing one of its blocks; returns the matches found"""
+    from .models import Beneficiary
+
+    blocks = Q()
+    for field in BLOCK_FIELDS:
+        value = getattr(beneficiary, field)
+        if value:
+            blocks |= Q(**{field: value})
+    if not blocks:
+        return 0
+    candidates = (
+        Beneficiary.objects.filter(blocks, organization_id=beneficiary.organization_id)
+        .exclude(pk=beneficiary.pk).order_by().only(*SCORED_FIELDS)
+    )[:_max_block_size() * len(BLOCK_FIELDS)]
+    return record_matches((beneficiary, candidate) for candidate in candidates)
+
+
+def fill_missing_keys(rebuild=False, batch_size=1000):
+    """Compute blocking keys for rows without them (every row with rebuild); returns the row count"""
+    from .models import Beneficiary
+
+    rows = Beneficiary.all_objects.order_by('pk').only('id', 'first_name', 'last_name', 'email', 'phone')
+    if not rebuild:
+        rows = rows.filter(name_key='')
+    filled, last_pk = 0, 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return filled
+        for beneficiary in batch:
+            beneficiary.fill_match_keys()
+        # Derived columns only: no change log entry, updated_at unchanged
+        Beneficiary.all_objects.bulk_update(batch, ['name_key', 'email_key', 'phone_key'])
+        filled += len(batch)
+        last_pk = batch[-1].pk
+
+
+def find_duplicates(threshold=None):
+    """
+    Match every live beneficiary against its blocks, one block field at a
+    time: rows are streamed in (organization, key) order, so each block is
+    held in memory on its own. Returns {'pairs': pairs scored, 'matches': new pairs
+    reaching the threshold}.
+    """
+    from .models import Beneficiary
+
+    max_block = _max_block_size()
+    pairs = matches = 0
+    for field in BLOCK_FIELDS:
+        if field == 'date_of_birth':
+            rows = Beneficiary.objects.filter(date_of_birth__isnull=False)
+        else:
+            rows = Beneficiary.objects.exclude(**{field: ''})
+        rows = rows.order_by('organization_id', field).only(*SCORED_FIELDS)
+        for _, block in groupby(rows.iterator(chunk_size=2000), key=lambda row: (row.organization_id, getattr(row, field))):
+            block = list(block)
+            if not 1 < len(block) <= max_block:
+                continue
+            block_pairs = list(combinations(block, 2))
+            pairs += len(block_pairs)
+            matches += record_matches(block_pairs, threshold)
+    return {'pairs': pairs, 'matches': matches}
+
+
+def possible_duplicates(beneficiary):
+    """Ids of beneficiaries matched with this one and not dismissed"""
+    from .models import BeneficiaryMatch
+
+    matches = BeneficiaryMatch.objects.filter(
+        Q(beneficiary=beneficiary) | Q(other=beneficiary), status__in=['pending', 'confirmed'],
+    ).values_list('beneficiary_id', 'other_id')
+    return sorted({pk for pair in matches for pk in pair if pk != beneficiary.pk})
+
+
+def match_beneficiaries(beneficiaries):
+    """
+    ``match_beneficiary`` for a queryset of new beneficiaries (an import
+    batch), with one candidate query per block field; returns the matches found
+    """
+    from .models import Beneficiary
+
+    new = list(beneficiaries.order_by().only(*SCORED_FIELDS))
+    organizations = {beneficiary.organization_id for beneficiary in new}
+    pairs = {}
+    for field in BLOCK_FIELDS:
+        values = {getattr(beneficiary, field) for beneficiary in new if getattr(beneficiary, field)}
+        if not values:
+            continue
+        blocks = defaultdict(list)
+        candidates = Beneficiary.objects.filter(
+            **{f'{field}__in': values}, organization_id__in=organizations,
+        ).order_by().only(*SCORED_FIELDS)
+        for candidate in candidates:
+            blocks[candidate.organization_id, getattr(candidate, field)].append(candidate)
+        for beneficiary in new:
+            block = blocks.get((beneficiary.organization_id, getattr(beneficiary, field)), ())
+            if len(block) > _max_block_size():
+                continue
+            for candidate in block:
+                if candidate.pk != beneficiary.pk:
+                    pairs[min(candidate.pk, beneficiary.pk), max(candidate.pk, beneficiary.pk)] = (beneficiary, candidate)
+    return record_matches(pairs.values())
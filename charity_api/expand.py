@@ -0,0 +1,236 @@
+"""
+Declarative relationship expansion (``POST /api/query/``).
+
+Clients name a root resource, the fields they want and the relations to
+expand, recursively. Nodes are resolved a level at a time: every relation
+of a level is fetched with one ``IN (...)`` query over all parent keys, and
+counts (``campaign_count``, ``beneficiary_count``) and names of related rows
+(``organization_name``, ``campaign_title``) with one query each, so the
+number of queries follows the depth of the tree, not its size. A
+per-request ``Loader`` memoizes rows, so a row already fetched (say, a
+campaign reached through two relations) is not queried again. Every list
+relation keeps at most ``limit`` rows per parent (``DEFAULT_LIMIT`` unless
+given), and queries that could return more than ``MAX_ROWS`` rows in all are
+rejected before running.
+
+Field values are formatted by the regular API serializers.
+"""
+from collections import namedtuple
+
+from django.db import connections
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Beneficiary, Campaign, Organization
+from .serializers import BeneficiarySerializer, CampaignSerializer, OrganizationSerializer
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+MAX_DEPTH = 4
+# Most rows a whole query tree may return, counting every row at its limits
+MAX_ROWS = 5000
+
+# ``key``: field of the related rows matched against the parents' ``source``
+Relation = namedtuple('Relation', 'type key source many', defaults=('id', True))
+# ``counts``: field -> (model, key) counted per row; ``joins``: field -> foreign key it reads through
+NodeType = namedtuple('NodeType', 'model serializer_class counts joins relations')
+
+TYPES = {
+    'organization': NodeType(
+        Organization, OrganizationSerializer,
+        counts={'campaign_count': (Campaign, 'organization_id')},
+        joins={},
+        relations={
+            'campaigns': Relation('campaign', 'organization_id'),
+            'beneficiaries': Relation('beneficiary', 'organization_id'),
+        },
+    ),
+    'campaign': NodeType(
+        Campaign, CampaignSerializer,
+        counts={'beneficiary_count': (Beneficiary, 'campaign_id')},
+        joins={'organization_name': 'organization'},
+        relations={
+            'organization': Relation('organization', 'id', 'organization_id', many=False),
+            'beneficiaries': Relation('beneficiary', 'campaign_id'),
+        },
+    ),
+    'beneficiary': NodeType(
+        Beneficiary, BeneficiarySerializer,
+        counts={},
+        joins={'campaign_title': 'campaign'},
+        relations={
+            'campaign': Relation('campaign', 'id', 'campaign_id', many=False),
+        },
+    ),
+}
+
+# Root resources and their node types
+RESOURCES = {'organizations': 'organization', 'campaigns': 'campaign', 'beneficiaries': 'beneficiary'}
+
+
+class Loader:
+    """
+    Batched, memoized fetching for one request: ``load`` returns related
+    rows for many keys with one query (per chunk of the database's
+    parameter limit) and remembers them, also by primary key.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self._rows = {}
+        self._counts = {}
+
+    def _chunks(self, model, keys):
+        size = connections[model.objects.db].features.max_query_params or len(keys)
+        for start in range(0, len(keys), size):
+            yield keys[start:start + size]
+
+    def load(self, model, field, keys, limit=None):
+        """{key: [rows whose ``field`` is key]}, at most ``limit`` rows per key"""
+        cache = self._rows.setdefault((model, field, limit), {})
+        by_pk = self._rows.setdefault((model, 'id', None), {})
+        missing = sorted({key for key in keys if key is not None and key not in cache})
+        for chunk in self._chunks(model, missing):
+            queryset = model.objects.filter(**{f'{field}__in': chunk})
+            if limit is not None:
+                queryset = queryset.annotate(position=Window(
+                    RowNumber(), partition_by=F(field), order_by=[
+                        F(name[1:]).desc() if name.startswith('-') else F(name).asc()
+                        for name in model._meta.ordering
+                    ] or None,
+                )).filter(position__lte=limit)
+            self.queries += 1
+            for key in chunk:
+                cache[key] = []
+            for row in queryset:
+                cache[getattr(row, field)].append(row)
+                by_pk.setdefault(row.pk, [row])
+        return {key: cache.get(key, []) for key in keys}
+
+    def count(self, model, field, keys):
+        """{key: number of rows whose ``field`` is key}"""
+        cache = self._counts.setdefault((model, field), {})
+        missing = sorted({key for key in keys if key is not None and key not in cache})
+        for chunk in self._chunks(model, missing):
+            self.queries += 1
+            rows = model.objects.filter(**{f'{field}__in': chunk}).order_by().values(field).annotate(total=Count('pk'))
+            counts = {row[field]: row['total'] for row in rows}
+            for key in chunk:
+                cache[key] = counts.get(key, 0)
+        return {key: cache.get(key, 0) for key in keys}
+
+
+def _clean_spec(type_name, spec, depth, many=True):
+    """Validate a (sub)query; returns it with defaults filled in, or raises ValueError"""
+    if not isinstance(spec, dict):
+        raise ValueError(f"Expected an object for '{type_name}'.")
+    node = TYPES[type_name]
+    available = list(node.serializer_class.Meta.fields)
+    fields = spec.get('fields', available)
+    if not isinstance(fields, list) or not fields:
+        raise ValueError(f"'fields' for {type_name} must be a non-empty list.")
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown {type_name} fields: {', '.join(map(str, unknown))}. Available: {', '.join(available)}")
+
+    limit = spec.get('limit', DEFAULT_LIMIT) if many else None
+    if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= MAX_LIMIT):
+        raise ValueError(f"'limit' must be between 1 and {MAX_LIMIT}.")
+
+    expand = spec.get('expand', {})
+    if not isinstance(expand, dict):
+        raise ValueError("'expand' must map relation names to queries.")
+    if expand and depth >= MAX_DEPTH:
+        raise ValueError(f"Relations can be expanded at most {MAX_DEPTH} levels deep.")
+    cleaned = {}
+    for name, sub_spec in expand.items():
+        relation = node.relations.get(name)
+        if relation is None:
+            raise ValueError(f"Unknown {type_name} relation '{name}'. Available: {', '.join(node.relations)}")
+        cleaned[name] = _clean_spec(relation.type, sub_spec, depth + 1, relation.many)
+        if not relation.many and 'limit' in sub_spec:
+            raise ValueError(f"'limit' only applies to list relations, not '{name}'.")
+    return {'fields': fields, 'limit': limit, 'expand': cleaned}
+
+
+def _max_rows(query, rows):
+    """Most rows a (sub)query returns for ``rows`` rows at its own level, relations included"""
+    return rows + sum(
+        _max_rows(sub_query, rows * (sub_query['limit'] or 1)) for sub_query in query['expand'].values()
+    )
+
+
+def parse_query(data):
+    """Validate a request body; returns (node type name, cleaned query)"""
+    if not isinstance(data, dict) or data.get('resource') not in RESOURCES:
+        raise ValueError(f"'resource' must be one of: {', '.join(RESOURCES)}")
+    type_name = RESOURCES[data['resource']]
+    query = _clean_spec(type_name, data, depth=0)
+    max_rows = _max_rows(query, query['limit'])
+    if max_rows > MAX_ROWS:
+        raise ValueError(
+            f"This query could return {max_rows} rows, more than {MAX_ROWS}; lower the 'limit' of its lists."
+        )
+    ids = data.get('ids')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids)):
+        raise ValueError("'ids' must be a list of integers.")
+    offset = data.get('offset', 0)
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("'offset' must be a non-negative integer.")
+    query.update(ids=ids, offset=offset)
+    return type_name, query
+
+
+def _resolve(loader, type_name, rows, query, context):
+    """Representations of rows (unique instances of one node type), keyed by primary key"""
+    node = TYPES[type_name]
+    fields = query['fields']
+    pks = [row.pk for row in rows]
+
+    counts = {
+        name: loader.count(model, key, pks)
+        for name, (model, key) in node.counts.items() if name in fields
+    }
+    for name, fk_name in node.joins.items():
+        if name in fields:
+            fk = node.model._meta.get_field(fk_name)
+            related = loader.load(fk.related_model, 'id', [getattr(row, fk.attname) for row in rows])
+            for row in rows:
+                matches = related[getattr(row, fk.attname)]
+                fk.set_cached_value(row, matches[0] if matches else None)
+
+    serializer = node.serializer_class(context=context)
+    plain = [serializer.fields[name] for name in fields if name not in counts]
+    data = {}
+    for row in rows:
+        item = {name: values[row.pk] for name, values in counts.items()}
+        for field in plain:
+            attribute = field.get_attribute(row)
+            item[field.field_name] = None if attribute is None else field.to_representation(attribute)
+        data[row.pk] = {name: item[name] for name in fields}
+
+    for name, sub_query in query['expand'].items():
+        relation = node.relations[name]
+        sources = {row.pk: getattr(row, relation.source) for row in rows}
+        related = loader.load(TYPES[relation.type].model, relation.key, list(sources.values()), sub_query['limit'])
+        children = {child.pk: child for matches in related.values() for child in matches}
+        resolved = _resolve(loader, relation.type, list(children.values()), sub_query, context)
+        for pk, source in sources.items():
+            matches = [resolved[child.pk] for child in related.get(source, [])]
+            data[pk][name] = matches if relation.many else (matches[0] if matches else None)
+    return data
+
+
+def run_query(type_name, query, tenant=None, context=None):
+    """Resolve a parsed query; returns (results, number of queries run)"""
+    node = TYPES[type_name]
+    loader = Loader()
+    roots = node.model.objects.all()
+    if tenant is not None:
+        roots = roots.filter(**{'pk' if node.model is Organization else 'organization_id': tenant})
+    if query['ids'] is not None:
+        roots = roots.filter(pk__in=query['ids'])
+    roots = list(roots[query['offset']:query['offset'] + query['limit']])
+    loader.queries += 1
+    resolved = _resolve(loader, type_name, roots, query, context or {})
+    return [resolved[row.pk] for row in roots], loader.queries
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.crypto import md5
+from rest_framework.exceptions import ValidationError
+
+from .cache import table_version, versions_shared
+
+
+class FacetMixin:
+    """
+    Add facet counts to list responses: ``?facets=category,location``.
+
+    Counts come from one grouped ``COUNT`` query per facet over the already
+    filtered queryset and are cached per filter combination when the cache
+    is shared (see ``cache.py``); the cache key embeds the table version, so
+    any write invalidates them.
+    """
+    facet_fields = ()
+    facet_limit = 50
+    # Query parameters that do not change which rows match
+    facet_ignored_params = ('page', 'page_size', 'ordering', 'format', 'facets')
+
+    def get_requested_facets(self):
+        raw = self.request.query_params.get('facets')
+        if not raw:
+            return []
+        requested = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = sorted(set(requested) - set(self.facet_fields))
+        if unknown:
+            raise ValidationError({'facets': f"Unknown facet(s): {', '.join(unknown)}. "
+                                             f"Available: {', '.join(self.facet_fields)}."})
+        return requested
+
+    def get_facet_cache_key(self, facets):
+        model = self.get_queryset().model
+        params = sorted(
+            (key, value)
+            for key, values in self.request.query_params.lists()
+            if key not in self.facet_ignored_params
+            for value in values
+        )
+        signature = md5(repr((facets, params)).encode(), usedforsecurity=False).hexdigest()
+        return f'facets:{model._meta.label_lower}:{table_version(model)}:{signature}'
+
+    def compute_facets(self, queryset, facets):
+        result = {}
+        for name in facets:
+            field = queryset.model._meta.get_field(name)
+            labels = dict(field.flatchoices)
+            rows = (
+                queryset.order_by()
+                .values_list(name)
+                .annotate(count=Count('pk'))
+                .order_by('-count', name)[:self.facet_limit]
+            )
+            result[name] = [
+                {'value': value, 'label': labels.get(value, value), 'count': count}
+                for value, count in rows
+            ]
+        return result
+
+    def get_facets(self, queryset):
+        facets = self.get_requested_facets()
+        if not facets:
+            return None
+        if not versions_shared():
+            return self.compute_facets(queryset, facets)
+        key = self.get_facet_cache_key(facets)
+        result = cache.get(key)
+        if result is None:
+            result = self.compute_facets(queryset, facets)
+            cache.set(key, result, getattr(settings, 'FACET_CACHE_SECONDS', 300))
+        return result
+
+    def list(self, request, *args, **kwargs):
+        facets = self.get_facets(self.filter_queryset(self.get_queryset()))
+        response = super().list(request, *args, **kwargs)
+        if facets is not None and isinstance(response.data, dict):
+            response.data['facets'] = facets
+        return response
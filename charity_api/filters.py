@@ -0,0 +1,61 @@
+import math
+
+from django.db.models import Value
+from django.db.models.functions import ACos, Cos, Greatest, Least, Radians, Sin
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .geo import EARTH_RADIUS_KM, bounding_box, cells_for_box
+
+
+class NearFilter(BaseFilterBackend):
+    """
+    Radius filter on models with coordinates: ``?near=lat,lon&radius=km``.
+
+    Candidates are selected through the indexed ``geo_cell`` column (plus a
+    lat/lon bounding box); only those rows get the exact great-circle
+    distance check, annotated as ``distance_km``.
+    """
+    default_radius_km = 25.0
+    max_radius_km = 1000.0
+
+    def parse(self, request):
+        near = request.query_params.get('near')
+        if not near:
+            return None
+        try:
+            latitude, longitude = (float(value) for value in near.split(','))
+            radius = float(request.query_params.get('radius', self.default_radius_km))
+        except ValueError:
+            raise ValidationError({'near': 'Use ?near=<lat>,<lon>&radius=<km>.'})
+        # nan and inf parse as floats but compare false with everything
+        if not all(math.isfinite(value) for value in (latitude, longitude, radius)):
+            raise ValidationError({'near': 'Coordinates and radius must be finite numbers.'})
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError({'near': 'Coordinates out of range.'})
+        if not 0 < radius <= self.max_radius_km:
+            raise ValidationError({'radius': f'Radius must be above 0 and at most {self.max_radius_km:g} km.'})
+        return latitude, longitude, radius
+
+    def filter_queryset(self, request, queryset, view):
+        params = self.parse(request)
+        if params is None:
+            return queryset
+        latitude, longitude, radius = params
+
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius)
+        queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+        cells = cells_for_box(min_lat, max_lat, min_lon, max_lon)
+        if cells is not None:
+            queryset = queryset.filter(geo_cell__in=cells)
+        if min_lon is not None and -180 <= min_lon and max_lon <= 180:
+            queryset = queryset.filter(longitude__gte=min_lon, longitude__lte=max_lon)
+
+        # Spherical law of cosines, clamped against rounding outside [-1, 1]
+        lat_rad, lon_rad = math.radians(latitude), math.radians(longitude)
+        cosine = (
+            Sin(Radians('latitude')) * Value(math.sin(lat_rad))
+            + Cos(Radians('latitude')) * Value(math.cos(lat_rad)) * Cos(Radians('longitude') - Value(lon_rad))
+        )
+        distance = ACos(Least(Greatest(cosine, Value(-1.0)), Value(1.0))) * Value(EARTH_RADIUS_KM)
+        return queryset.annotate(distance_km=distance).filter(distance_km__lte=radius)
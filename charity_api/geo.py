@@ -0,0 +1,98 @@
+"""
+Offline geocoding and grid index helpers for "near me" lookups.
+
+Locations are free text; ``geocode`` resolves them against the bundled
+gazetteer (``data/gazetteer.csv``) without any network access. Coordinates
+are bucketed into fixed ``CELL_DEGREES`` grid cells so a radius query can
+first select candidate rows by indexed cell id and only then run the exact
+great-circle distance check.
+"""
+import csv
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer.csv'
+
+EARTH_RADIUS_KM = 6371.0
+CELL_DEGREES = 0.5
+GRID_COLUMNS = int(360 / CELL_DEGREES)
+# Above this many cells the prefilter falls back to a plain lat/lon range
+MAX_PREFILTER_CELLS = 500
+
+
+def _normalize(name):
+    return re.sub(r'\s+', ' ', name.strip().lower())
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer():
+    """Return {normalized place name: (latitude, longitude)}"""
+    places = {}
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            coordinates = (float(row['latitude']), float(row['longitude']))
+            name = _normalize(row['name'])
+            places.setdefault(name, coordinates)
+            places.setdefault(f"{name}, {_normalize(row['country'])}", coordinates)
+    return places
+
+
+def geocode(location):
+    """Resolve a free-text location to (latitude, longitude), or None"""
+    if not location:
+        return None
+    places = load_gazetteer()
+    normalized = _normalize(location)
+    if normalized in places:
+        return places[normalized]
+    # "Berlin, DE" / "Northern Region, Kenya": try the leading place name
+    return places.get(normalized.split(',')[0].strip())
+
+
+def grid_cell(latitude, longitude):
+    """Id of the grid cell containing a point"""
+    row = int(math.floor((latitude + 90) / CELL_DEGREES))
+    column = int(math.floor((longitude + 180) / CELL_DEGREES)) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    delta_phi = phi2 - phi1
+    delta_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) enclosing the circle.
+
+    Longitudes may fall outside [-180, 180] when the box crosses the
+    antimeridian; they are ``None`` when the box covers a pole.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+    delta_lon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(latitude))))
+    return min_lat, max_lat, longitude - delta_lon, longitude + delta_lon
+
+
+def cells_for_box(min_lat, max_lat, min_lon, max_lon):
+    """Grid cell ids covering a bounding box, or None if there are too many"""
+    if min_lon is None:
+        return None
+    first_row, last_row = grid_cell(min_lat, 0) // GRID_COLUMNS, grid_cell(max_lat, 0) // GRID_COLUMNS
+    first_column = int(math.floor((min_lon + 180) / CELL_DEGREES))
+    last_column = int(math.floor((max_lon + 180) / CELL_DEGREES))
+    if (last_row - first_row + 1) * (last_column - first_column + 1) > MAX_PREFILTER_CELLS:
+        return None
+    return [
+        row * GRID_COLUMNS + column % GRID_COLUMNS
+        for row in range(first_row, last_row + 1)
+        for column in range(first_column, last_column + 1)
+    ]
@@ -0,0 +1,442 @@
+"""
+Offline bulk import of CSV / NDJSON files (``manage.py import_data``).
+
+The file is read as a stream of byte ranges, a batch of rows at a time.
+Batches are validated in a process pool by the API serializers, minus the
+checks that need the database, and turned into column values there (the
+work ``save()`` and ``bulk_create`` would do). Foreign keys and unique
+fields are checked in the parent against maps preloaded once (ids of live
+organizations, campaign id -> organization id, existing unique values).
+Valid rows are inserted with multi-row ``INSERT ... RETURNING`` statements
+(one ``INSERT`` per row where the database cannot return ids from a bulk
+insert), in a transaction that also writes their change log entries (and,
+for campaigns, the history rows the ``post_save`` handlers would write) and
+the checkpoint: the byte offset reached, kept in ``ImportCheckpoint``. An
+interrupted import resumes after the last committed batch, without
+inserting any row twice. At most ``workers * 2`` batches are in flight, whatever the size
+of the file. With ``keep_ids`` the primary key sequence is moved past the
+ids inserted. Imported beneficiaries are matched against the others for
+duplicates once their batch commits (``DEDUPE_ON_SAVE``; ``manage.py
+find_duplicates`` covers a batch whose matching was interrupted).
+
+Rows go to the default database; move rows of isolated tenants afterwards
+with ``manage.py move_tenant``.
+"""
+import csv
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import CharField, DateTimeField, F, ForeignKey, Value
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+
+from .bulk import insert_from_select, log_changes
+from .cache import bump_table_version
+from .dedupe import match_beneficiaries
+from .models import Beneficiary, CampaignStatusChange, GeoLocated, ImportCheckpoint, RaisedAmountChange
+from .serializers import BeneficiarySerializer, CampaignSerializer, CharitySerializer, OrganizationSerializer
+
+DEFAULT_BATCH_SIZE = 5000
+
+RESOURCES = {
+    'organizations': OrganizationSerializer,
+    'campaigns': CampaignSerializer,
+    'beneficiaries': BeneficiarySerializer,
+    'charities': CharitySerializer,
+}
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'ndjson'}
+
+
+def detect_format(path):
+    fmt = FORMATS.get(Path(path).suffix.lower())
+    if fmt is None:
+        raise ValueError(f"Cannot tell the format of {path}; pass csv or ndjson")
+    return fmt
+
+
+def _csv_records(handle):
+    """(record text, end offset) per CSV record; quoted fields may span lines"""
+    parts = []
+    quotes = 0
+    for line in iter(handle.readline, b''):
+        parts.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            yield b''.join(parts).decode('utf-8'), handle.tell()
+            parts, quotes = [], 0
+    if parts:
+        yield b''.join(parts).decode('utf-8'), handle.tell()
+
+
+def read_batches(path, fmt, offset, batch_size):
+    """
+    Batches of rows from offset on: (rows, end offset), each row a dict.
+    CSV rows leave out empty cells, so model defaults apply as for an API
+    request that omits the field.
+    """
+    with open(path, 'rb') as handle:
+        if fmt == 'csv':
+            records = _csv_records(handle)
+            header, header_end = next(records, ('', 0))
+            columns = [name.strip() for name in next(csv.reader([header.lstrip('\ufeff')]), [])]
+            handle.seek(max(offset, header_end))
+            records = _csv_records(handle)
+        else:
+            handle.seek(offset)
+            records = ((line.decode('utf-8'), handle.tell()) for line in iter(handle.readline, b''))
+
+        rows, end = [], offset
+        for text, end in records:
+            if not text.strip():
+                rows.append(None)
+            elif fmt == 'csv':
+                values = next(csv.reader([text]))
+                rows.append({name: value for name, value in zip(columns, values) if value != ''})
+            else:
+                try:
+                    rows.append(json.loads(text))
+                except ValueError:
+                    rows.append({'__invalid__': 'Not valid JSON.'})
+            if len(rows) >= batch_size:
+                yield rows, end
+                rows = []
+        if rows:
+            yield rows, end
+
+
+# Per worker process: one import serializer per resource
+_serializers = {}
+
+
+def import_serializer(resource):
+    """
+    The resource's API serializer without its database checks: relations
+    become plain ids, unique validators are dropped (both are checked by
+    ``Importer``) and file fields are left out.
+    """
+    if resource not in _serializers:
+        serializer = RESOURCES[resource]()
+        for name, field in list(serializer.fields.items()):
+            if isinstance(field, serializers.RelatedField):
+                serializer.fields[name] = serializers.IntegerField(
+                    min_value=1, required=field.required, allow_null=field.allow_null,
+                )
+            elif isinstance(field, serializers.FileField):
+                serializer.fields.pop(name)
+            else:
+                field.validators = [
+                    validator for validator in field.validators
+                    if not isinstance(validator, UniqueValidator)
+                ]
+        serializer.validators = []
+        _serializers[resource] = serializer
+    return _serializers[resource]
+
+
+def insert_fields(model, keep_ids):
+    """Columns written by the import, in order"""
+    return [field for field in model._meta.concrete_fields if keep_ids or not field.primary_key]
+
+
+def check_fields(model):
+    """Fields the parent checks against its maps: editable foreign keys and unique fields"""
+    return [
+        field for field in model._meta.concrete_fields
+        if (isinstance(field, ForeignKey) and field.editable) or (field.unique and not field.primary_key)
+    ]
+
+
+def validate_rows(resource, rows, first_number, keep_ids):
+    """
+    Run in a worker: (valid, rejected) for a batch. Valid rows come as
+    (row number, primary key or None, {checked field: value}, column
+    values ready for the database), rejected ones as (row number, errors).
+    """
+    serializer = import_serializer(resource)
+    model = serializer.Meta.model
+    fields = insert_fields(model, keep_ids)
+    checked = check_fields(model)
+    connection = connections[DEFAULT_DB_ALIAS]
+    valid, rejected = [], []
+    for number, row in enumerate(rows, first_number):
+        if row is None:
+            continue
+        if not isinstance(row, dict) or '__invalid__' in row:
+            rejected.append((number, {'row': [row['__invalid__'] if isinstance(row, dict) else 'Expected an object.']}))
+            continue
+        pk = None
+        if keep_ids:
+            try:
+                pk = int(row['id'])
+                if pk < 1:
+                    raise ValueError
+            except (KeyError, TypeError, ValueError):
+                rejected.append((number, {'id': ['A positive integer id is required with --keep-ids.']}))
+                continue
+        try:
+            data = serializer.run_validation(row)
+        except serializers.ValidationError as e:
+            # Plain lists and dicts travel back to the parent
+            rejected.append((number, json.loads(json.dumps(e.detail))))
+            continue
+
+        # What save() and the insert compiler would do: geocoding, auto_now, database types
+        instance = model(pk=pk, **{model._meta.get_field(name).attname: value for name, value in data.items()})
+        if isinstance(instance, GeoLocated):
+            instance.fill_coordinates()
+        if isinstance(instance, Beneficiary):
+            instance.fill_match_keys()
+        values = [field.get_db_prep_save(field.pre_save(instance, True), connection) for field in fields]
+        valid.append((number, pk, {field.name: getattr(instance, field.attname) for field in checked}, values))
+    return valid, rejected
+
+
+def _start_worker():
+    import django
+    django.setup()
+
+
+class Importer:
+    """
+    Inserts validated batches of one resource. Foreign keys and unique
+    fields are checked against maps loaded once and kept up to date with the
+    rows it inserts.
+    """
+
+    def __init__(self, resource, keep_ids=False):
+        self.model = RESOURCES[resource].Meta.model
+        self.keep_ids = keep_ids
+        self.fields = insert_fields(self.model, keep_ids)
+        self.foreign_keys = [field for field in check_fields(self.model) if isinstance(field, ForeignKey)]
+        # Live rows, as the serializers' relation fields would accept
+        self.related = {}
+        for field in self.foreign_keys:
+            manager = field.related_model._default_manager
+            if field.related_model._meta.model_name == 'campaign':
+                self.related[field.name] = dict(manager.values_list('pk', 'organization_id'))
+            else:
+                self.related[field.name] = dict.fromkeys(manager.values_list('pk', flat=True))
+        # Every row, as the serializers' unique validators check
+        self.unique = {
+            field.name: set(self.model._base_manager.exclude(**{field.name: None}).values_list(field.name, flat=True))
+            for field in check_fields(self.model) if field.unique
+        }
+        self.ids = set(self.model._base_manager.values_list('pk', flat=True)) if keep_ids else set()
+
+    def check(self, pk, keys):
+        """Errors of a validated row against the maps, or None"""
+        errors = {}
+        if pk is not None and pk in self.ids:
+            errors['id'] = [f'{self.model._meta.verbose_name} {pk} already exists.']
+        for field in self.foreign_keys:
+            value = keys[field.name]
+            if value is not None and value not in self.related[field.name]:
+                errors[field.name] = [f'Invalid pk "{value}" - object does not exist.']
+        for name, seen in self.unique.items():
+            if keys[name] is not None and keys[name] in seen:
+                errors[name] = [f'{self.model._meta.verbose_name} with this {name.replace("_", " ")} already exists.']
+        return errors or None
+
+    def insert(self, valid):
+        """
+        Insert a batch of validated rows (in the caller's transaction, if
+        any); returns (rows created, [(row number, errors)] of the rows refused)
+        """
+        rows, pks, rejected = [], [], []
+        # Beneficiary.save() copies the tenant key from the campaign
+        tenant_key = next((
+            index for index, field in enumerate(self.fields)
+            if self.model._meta.model_name == 'beneficiary' and field.name == 'organization'
+        ), None)
+        for number, pk, keys, values in valid:
+            errors = self.check(pk, keys)
+            if errors:
+                rejected.append((number, errors))
+                continue
+            if tenant_key is not None:
+                values[tenant_key] = self.related['campaign'][keys['campaign']]
+            rows.append(values)
+            if pk is not None:
+                self.ids.add(pk)
+                pks.append(pk)
+            for name, seen in self.unique.items():
+                if keys[name] is not None:
+                    seen.add(keys[name])
+        if not rows:
+            return 0, rejected
+
+        now = timezone.now()
+        with transaction.atomic():
+            if self.keep_ids:
+                self._insert_rows(rows)
+                self._reset_sequence()
+            else:
+                pks = self._insert_rows(rows)
+            for created in self._querysets(pks):
+                log_changes(created, 'upsert', now)
+                if self.model._meta.model_name == 'campaign':
+                    self._record_history(created, now)
+            if self.model._meta.model_name == 'beneficiary' and getattr(settings, 'DEDUPE_ON_SAVE', True):
+                # What find_beneficiary_duplicates does on save, once the batch is visible
+                transaction.on_commit(lambda: self._match_duplicates(pks))
+        bump_table_version(self.model)
+        return len(rows), rejected
+
+    def _reset_sequence(self):
+        """Move the primary key sequence past the ids inserted, as ``restore_snapshot`` does"""
+        connection = connections[DEFAULT_DB_ALIAS]
+        with connection.cursor() as cursor:
+            for statement in connection.ops.sequence_reset_sql(no_style(), [self.model]):
+                cursor.execute(statement)
+
+    def _match_duplicates(self, pks):
+        for created in self._querysets(pks):
+            match_beneficiaries(created)
+
+    def _insert_rows(self, rows):
+        """INSERT rows of column values; returns the primary keys they were given"""
+        connection = connections[DEFAULT_DB_ALIAS]
+        opts = self.model._meta
+        table = connection.ops.quote_name(opts.db_table)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in self.fields)
+        placeholders = ['%s'] * len(self.fields)
+        pks = []
+        with connection.cursor() as cursor:
+            if self.keep_ids:
+                cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({", ".join(placeholders)})', rows)
+            elif connection.features.can_return_rows_from_bulk_insert:
+                returning, _ = connection.ops.return_insert_columns([opts.pk])
+                size = connection.ops.bulk_batch_size(self.fields, rows) or len(rows)
+                for start in range(0, len(rows), size):
+                    chunk = rows[start:start + size]
+                    values = connection.ops.bulk_insert_sql(self.fields, [placeholders] * len(chunk))
+                    cursor.execute(
+                        f'INSERT INTO {table} ({columns}) {values} {returning}',
+                        [value for row in chunk for value in row],
+                    )
+                    pks.extend(row[0] for row in cursor.fetchall())
+            else:
+                for row in rows:
+                    cursor.execute(f'INSERT INTO {table} ({columns}) VALUES ({", ".join(placeholders)})', row)
+                    pks.append(connection.ops.last_insert_id(cursor, opts.db_table, opts.pk.column))
+        return pks
+
+    def _querysets(self, pks):
+        """The rows with primary keys pks, in querysets of at most the parameter limit"""
+        manager = self.model._base_manager
+        size = connections[DEFAULT_DB_ALIAS].features.max_query_params or len(pks)
+        for start in range(0, len(pks), size):
+            yield manager.filter(pk__in=pks[start:start + size])
+
+    def _record_history(self, campaigns, now):
+        """The rows ``record_campaign_history`` writes for new campaigns"""
+        # Annotated in column order, which the SELECT follows
+        campaigns = campaigns.order_by()
+        when = Value(now, output_field=DateTimeField())
+        insert_from_select(
+            RaisedAmountChange, ['campaign', 'organization', 'amount', 'created_at'],
+            campaigns.exclude(raised_amount=0).annotate(
+                history_campaign=F('pk'),
+                history_organization=F('organization_id'),
+                history_amount=F('raised_amount'),
+                history_time=when,
+            ).values_list('history_campaign', 'history_organization', 'history_amount', 'history_time'),
+        )
+        insert_from_select(
+            CampaignStatusChange, ['campaign', 'organization', 'from_status', 'to_status', 'changed_at'],
+            campaigns.annotate(
+                history_campaign=F('pk'),
+                history_organization=F('organization_id'),
+                history_from=Value('', output_field=CharField()),
+                history_to=F('status'),
+                history_time=when,
+            ).values_list('history_campaign', 'history_organization', 'history_from', 'history_to', 'history_time'),
+        )
+
+
+def checkpoint_name(path, resource):
+    return f'{resource}:{Path(path).resolve()}'
+
+
+def load_checkpoint(checkpoint, path, resource):
+    """Progress saved by an earlier run of the same import, or None"""
+    saved = ImportCheckpoint.objects.filter(name=checkpoint).first()
+    if saved is None:
+        return None
+    state = saved.state
+    if state.get('file') != str(Path(path).resolve()) or state.get('resource') != resource:
+        return None
+    if state.get('size') != os.path.getsize(path):
+        raise ValueError(f"{path} changed since checkpoint {checkpoint}; pass --restart")
+    return state
+
+
+def save_checkpoint(checkpoint, state):
+    ImportCheckpoint.objects.update_or_create(name=checkpoint, defaults={'state': state})
+
+
+def import_file(path, resource, fmt=None, workers=None, batch_size=DEFAULT_BATCH_SIZE, keep_ids=False,
+                checkpoint=None, restart=False, on_batch=None, on_rejected=None):
+    """
+    Import a file of one resource; returns the final state
+    ({'offset', 'rows', 'created', 'rejected', 'done', ...}).
+    ``on_batch(state)`` is called after each committed batch and
+    ``on_rejected(row number, errors)`` for each refused row.
+    """
+    fmt = fmt or detect_format(path)
+    checkpoint = checkpoint or checkpoint_name(path, resource)
+    state = None if restart else load_checkpoint(checkpoint, path, resource)
+    if state is None:
+        state = {
+            'file': str(Path(path).resolve()), 'resource': resource, 'size': os.path.getsize(path),
+            'offset': 0, 'rows': 0, 'created': 0, 'rejected': 0, 'done': False,
+        }
+    if state['done']:
+        return state
+
+    importer = Importer(resource, keep_ids)
+    workers = workers or os.cpu_count() or 1
+    # Forked workers must not share the parent's connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker) as pool:
+        pending = deque()
+        batches = read_batches(path, fmt, state['offset'], batch_size)
+        number = state['rows'] + 1
+
+        def finish_oldest():
+            future, size, end = pending.popleft()
+            valid, rejected = future.result()
+            # The batch and the checkpoint past it commit together
+            with transaction.atomic():
+                created, refused = importer.insert(valid)
+                rejected = sorted(rejected + refused, key=lambda item: item[0])
+                state['offset'] = end
+                state['rows'] += size
+                state['created'] += created
+                state['rejected'] += len(rejected)
+                save_checkpoint(checkpoint, state)
+            if on_rejected:
+                for row_number, errors in rejected:
+                    on_rejected(row_number, errors)
+            if on_batch:
+                on_batch(state)
+
+        for rows, end in batches:
+            pending.append((pool.submit(validate_rows, resource, rows, number, keep_ids), len(rows), end))
+            number += len(rows)
+            if len(pending) >= workers * 2:
+                finish_oldest()
+        while pending:
+            finish_oldest()
+
+    state['done'] = True
+    save_checkpoint(checkpoint, state)
+    return state
@@ -0,0 +1,58 @@
+"""
+Date-driven campaign status transitions, run by ``manage.py run_scheduler``.
+
+Each transition is applied to every matching campaign at once: one
+``INSERT ... SELECT`` into the status history, one into the change log and
+one ``UPDATE ... WHERE`` on the campaigns, all filtered on the indexed
+(status, start_date) / (status, end_date) columns. ``QuerySet.update()``
+sends no signals, so ``logged_update`` bumps the cache version instead.
+"""
+from django.db.models import CharField, DateTimeField, Q, Value
+from django.utils import timezone
+
+from .bulk import insert_from_select, logged_atomic, logged_update
+from .models import Campaign, CampaignStatusChange
+
+# (current statuses, new status, condition on the dates for a given day)
+TRANSITIONS = (
+    (('planning',), 'active', lambda today: Q(start_date__lte=today, end_date__gte=today)),
+    (('planning', 'active'), 'completed', lambda today: Q(end_date__lt=today)),
+)
+
+
+def due_campaigns(from_statuses, condition, today):
+    return Campaign.objects.order_by().filter(condition(today), status__in=from_statuses)
+
+
+def change_status(campaigns, to_status, when=None):
+    """Set-based status change with status history and change log rows; returns the campaigns changed"""
+    when = when or timezone.now()
+    campaigns = campaigns.order_by().exclude(status=to_status)
+    with logged_atomic(campaigns.db):
+        # History rows first, while the rows still match
+        insert_from_select(
+            CampaignStatusChange,
+            ['campaign', 'organization', 'from_status', 'to_status', 'changed_at'],
+            campaigns.annotate(
+                new_status=Value(to_status, output_field=CharField()),
+                now=Value(when, output_field=DateTimeField()),
+            ).values_list('id', 'organization_id', 'status', 'new_status', 'now'),
+        )
+        return logged_update(campaigns, when, status=to_status)
+
+
+def run_transitions(today=None, dry_run=False):
+    """
+    Move every campaign whose dates say so to its new status.
+
+    Returns [(from statuses, new status, number of campaigns)].
+    """
+    today = today or timezone.localdate()
+    results = []
+    for from_statuses, to_status, condition in TRANSITIONS:
+        due = due_campaigns(from_statuses, condition, today)
+        if dry_run:
+            results.append((from_statuses, to_status, due.count()))
+        else:
+            results.append((from_statuses, to_status, change_status(due, to_status)))
+    return results
@@ -0,0 +1,257 @@
+"""
+Live campaign progress over Server-Sent Events.
+
+``progress_stream`` is a plain ASGI callable mounted in front of Django by
+``charity_project/asgi.py``; idle subscribers cost one small object and a
+parked coroutine, with no middleware or worker thread attached. Updates are
+published by the ``Campaign`` post_save signal, once the save commits, into
+an in-process hub, which keeps only the latest payload per campaign for each
+subscriber so that a burst of saves is coalesced into at most one event per
+``LIVE_PROGRESS_INTERVAL``.
+
+With the ``X-Organization`` header (required under ``TENANT_SCOPING``) a
+stream only covers that organization's campaigns, read from its database
+when it is isolated (see ``tenancy.py``); without it, every organization's.
+
+Subscribers only see saves made in the same process; run a single ASGI worker
+for the stream (or route it to one) when using several processes. Under
+WSGI there is no stream: pages only subscribe when ``stream_path`` says the
+request came through the ASGI app.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from decimal import Decimal
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .tenancy import TENANT_HEADER, tenant_scopes, use_tenant
+
+STREAM_PATH = '/api/campaigns/stream/'
+KEEPALIVE_SECONDS = 15
+
+
+def stream_path(request):
+    """STREAM_PATH when request came through ``charity_project.asgi`` (which serves it), else None"""
+    return getattr(request, 'scope', {}).get('progress_stream')
+
+
+def progress_payload(campaign_id, raised_amount, goal_amount, status):
+    """Build the event payload for one campaign"""
+    raised_amount = Decimal(raised_amount)
+    goal_amount = Decimal(goal_amount)
+    progress = (raised_amount / goal_amount) * 100 if goal_amount > 0 else 0
+    return {
+        'id': campaign_id,
+        'raised_amount': f'{raised_amount:.2f}',
+        'goal_amount': f'{goal_amount:.2f}',
+        'progress_percentage': round(float(progress), 2),
+        'status': status,
+    }
+
+
+class Subscription:
+    """Pending updates for one client, keyed by campaign id (latest wins)"""
+    __slots__ = ('campaign_ids', 'tenant', 'pending', 'ready')
+
+    def __init__(self, campaign_ids, tenant=None):
+        self.campaign_ids = campaign_ids
+        self.tenant = tenant
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def push(self, campaign_id, payload):
+        self.pending[campaign_id] = payload
+        self.ready.set()
+
+    def take(self):
+        pending, self.pending = self.pending, {}
+        self.ready.clear()
+        return pending
+
+
+class ProgressHub:
+    """
+    In-process pub/sub for campaign progress.
+
+    ``publish`` may be called from any thread (sync views run in a thread
+    pool under ASGI); delivery always happens on the event loop that owns the
+    subscriptions.
+    """
+
+    def __init__(self):
+        # Campaign id -> subscriptions; ``None`` holds "all campaigns" subscribers
+        self._subscribers = defaultdict(set)
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, campaign_ids, tenant=None):
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(campaign_ids, tenant)
+        with self._lock:
+            for key in campaign_ids or (None,):
+                self._subscribers[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for key in subscription.campaign_ids or (None,):
+                subscribers = self._subscribers.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[key]
+
+    def publish(self, campaign_id, payload, organization_id=None):
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(campaign_id, payload, organization_id)
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, campaign_id, payload, organization_id)
+        except RuntimeError:
+            # Event loop already closed (server shutting down)
+            pass
+
+    def _deliver(self, campaign_id, payload, organization_id=None):
+        with self._lock:
+            targets = self._subscribers.get(campaign_id, set()) | self._subscribers.get(None, set())
+        for subscription in targets:
+            if subscription.tenant is None or subscription.tenant == organization_id:
+                subscription.push(campaign_id, payload)
+
+
+hub = ProgressHub()
+
+
+def publish_campaign(campaign, using=DEFAULT_DB_ALIAS):
+    """Publish the progress of a saved campaign once the transaction saving it commits"""
+    campaign_id, organization_id = campaign.pk, campaign.organization_id
+    payload = progress_payload(campaign.pk, campaign.raised_amount, campaign.goal_amount, campaign.status)
+    transaction.on_commit(lambda: hub.publish(campaign_id, payload, organization_id), using=using)
+
+
+def progress_snapshot(campaign_ids, tenant=None):
+    """Current progress for the subscribed campaigns (active ones if none given) of tenant, or of every tenant"""
+    from .models import Campaign
+
+    payloads = []
+    for scope in tenant_scopes() if tenant is None else [tenant]:
+        with use_tenant(scope):
+            campaigns = Campaign.objects.all()
+            if tenant is not None:
+                campaigns = campaigns.filter(organization=tenant)
+            if campaign_ids:
+                campaigns = campaigns.filter(pk__in=campaign_ids)
+            else:
+                campaigns = campaigns.filter(status='active')
+            payloads.extend(
+                progress_payload(*row)
+                for row in campaigns.values_list('pk', 'raised_amount', 'goal_amount', 'status')
+            )
+    return payloads
+
+
+def format_event(payload):
+    data = json.dumps(payload)
+    return f"event: progress\ndata: {data}\n\n".encode()
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def _send_body(send, body):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def _send_error(send, message):
+    await send({
+        'type': 'http.response.start',
+        'status': 400,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+def _request_tenant(scope):
+    """Organization id from the X-Organization header, or None; raises ValueError"""
+    name = TENANT_HEADER.lower().encode()
+    value = next((value for key, value in scope['headers'] if key == name), b'')
+    if not value:
+        if getattr(settings, 'TENANT_SCOPING', False):
+            raise ValueError(f'The {TENANT_HEADER} header is required')
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{TENANT_HEADER} must be an organization id')
+
+
+async def progress_stream(scope, receive, send):
+    """
+    ASGI endpoint: GET /api/campaigns/stream/?ids=1,2,3
+
+    Without ``ids`` the stream covers every campaign (of the X-Organization
+    tenant, if given) and the initial snapshot lists the active ones.
+    """
+    try:
+        raw_ids = parse_qs(scope['query_string'].decode()).get('ids', [''])[0]
+        campaign_ids = frozenset(int(value) for value in raw_ids.split(',') if value)
+    except ValueError:
+        await _send_error(send, 'Invalid ids')
+        return
+    try:
+        tenant = _request_tenant(scope)
+    except ValueError as e:
+        await _send_error(send, str(e))
+        return
+
+    interval = getattr(settings, 'LIVE_PROGRESS_INTERVAL', 1.0)
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    # Subscribe before the snapshot so no update slips in between
+    subscription = hub.subscribe(campaign_ids, tenant)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        for payload in await sync_to_async(progress_snapshot)(campaign_ids, tenant):
+            await _send_body(send, format_event(payload))
+
+        while not disconnected.done():
+            ready = asyncio.ensure_future(subscription.ready.wait())
+            await asyncio.wait({ready, disconnected}, timeout=KEEPALIVE_SECONDS,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not ready.done():
+                ready.cancel()
+                if not disconnected.done():
+                    await _send_body(send, b': keepalive\n\n')
+                continue
+
+            for payload in subscription.take().values():
+                await _send_body(send, format_event(payload))
+            # Coalescing window: later updates overwrite each other until then
+            await asyncio.wait({disconnected}, timeout=interval)
+    finally:
+        hub.unsubscribe(subscription)
+        disconnected.cancel()
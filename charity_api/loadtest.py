@@ -0,0 +1,393 @@
+"""
+Load testing against a real server.
+
+``manage.py load_test`` seeds a SQLite database, starts
+``charity_project.wsgi`` (gunicorn when installed, Django's threaded
+development server otherwise) or ``charity_project.asgi`` (uvicorn) on it,
+and drives a mix of requests at increasing concurrency:
+
+- ``read``: one campaign, ``GET /api/campaigns/{id}/``;
+- ``list``: a page of campaigns of one organization;
+- ``search``: campaign search or name autocomplete;
+- ``donate``: ``POST /api/campaigns/{id}/update_raised_amount/`` with a
+  bearer token.
+
+Clients are asyncio tasks on keep-alive HTTP/1.1 connections, spread over
+several processes so the load generator itself is not the bottleneck. Each
+client sends its next request as soon as the previous one is answered, so
+a concurrency level is a number of requests in flight. Only requests both
+started and answered inside the measurement window (after the warm-up)
+count. This module does not import Django: the client processes stay light.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from importlib.util import find_spec
+
+OPERATIONS = ('read', 'list', 'search', 'donate')
+DEFAULT_MIX = {'read': 60, 'list': 15, 'search': 15, 'donate': 10}
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16, 32, 64]
+# A concurrency step is past the knee once doubling it adds less than this to throughput
+KNEE_GAIN = 0.1
+
+SEARCH_WORDS = [
+    'water', 'school', 'clinic', 'food', 'shelter', 'relief', 'winter', 'books',
+    'health', 'orphans', 'wells', 'meals', 'flood', 'literacy', 'solar', 'farm',
+]
+
+# Runs in a fresh interpreter on the load test database: migrate, seed if
+# empty, and print what the clients need (campaign ids, organization ids, a token)
+SEED_SCRIPT = """
+import json, os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
+import django
+django.setup()
+from django.core.management import call_command
+from charity_api.loadtest import seed_database
+call_command('migrate', verbosity=0, interactive=False)
+print(json.dumps(seed_database(*map(int, sys.argv[1:4]))))
+"""
+
+# Django's threaded development server, when gunicorn is not installed. It
+# sends headers and body in separate writes: without TCP_NODELAY, Nagle's
+# algorithm and delayed ACKs would add ~40 ms to every response.
+DJANGO_SERVER_SCRIPT = """
+import logging, os, socket, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
+from charity_project.wsgi import application
+from django.core.servers.basehttp import WSGIServer, run
+
+class NoDelayWSGIServer(WSGIServer):
+    def get_request(self):
+        connection, address = super().get_request()
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection, address
+
+logging.getLogger('django.server').setLevel(logging.WARNING)
+run('127.0.0.1', int(sys.argv[1]), application, threading=True, server_cls=NoDelayWSGIServer)
+"""
+
+
+def parse_mix(text):
+    """{'read': 60, ...} from "read=60,search=40"; unknown operations raise ValueError"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r} (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight) if weight else 1.0
+        if mix[name] < 0:
+            raise ValueError(f"Negative weight for {name}")
+    if not sum(mix.values()):
+        raise ValueError("The mix needs at least one positive weight")
+    return mix
+
+
+def seed_database(organizations, campaigns, beneficiaries):
+    """
+    Fill an empty database with organizations, ``campaigns`` campaigns each
+    and ``beneficiaries`` beneficiaries per campaign, plus a load test user.
+    Returns the catalog the clients draw from.
+    """
+    from datetime import date, timedelta
+    from decimal import Decimal
+
+    from django.contrib.auth import get_user_model
+
+    from .models import Beneficiary, Campaign, Organization
+    from .tokens import issue_token
+
+    rng = random.Random(0)
+    if not Organization.objects.exists():
+        Organization.objects.bulk_create([
+            Organization(
+                name=f"{rng.choice(SEARCH_WORDS).title()} Foundation {number}",
+                email=f"contact{number}@example.org",
+                description=' '.join(rng.sample(SEARCH_WORDS, 4)),
+            )
+            for number in range(organizations)
+        ], batch_size=1000)
+        start = date.today() - timedelta(days=180)
+        Campaign.objects.bulk_create([
+            Campaign(
+                organization_id=organization_id,
+                title=f"{rng.choice(SEARCH_WORDS).title()} {rng.choice(SEARCH_WORDS)} {number}",
+                description=' '.join(rng.choices(SEARCH_WORDS, k=12)),
+                goal_amount=Decimal(rng.randrange(1000, 100000)),
+                raised_amount=Decimal(rng.randrange(0, 1000)),
+                status=rng.choice(['planning', 'active', 'active', 'completed']),
+                start_date=start + timedelta(days=rng.randrange(180)),
+                end_date=start + timedelta(days=rng.randrange(180, 540)),
+            )
+            for organization_id in Organization.objects.values_list('pk', flat=True)
+            for number in range(campaigns)
+        ], batch_size=1000)
+        Beneficiary.objects.bulk_create([
+            Beneficiary(
+                campaign_id=campaign_id,
+                organization_id=organization_id,
+                first_name=f"First{rng.randrange(10000)}",
+                last_name=f"Last{rng.randrange(10000)}",
+                amount_received=Decimal(rng.randrange(0, 500)),
+            )
+            for campaign_id, organization_id in Campaign.objects.values_list('pk', 'organization_id')
+            for _ in range(beneficiaries)
+        ], batch_size=1000)
+
+    user, created = get_user_model().objects.get_or_create(username='loadtest')
+    if created:
+        user.set_unusable_password()
+        user.save()
+    return {
+        'campaigns': list(Campaign.objects.values_list('pk', flat=True)),
+        'organizations': list(Organization.objects.values_list('pk', flat=True)),
+        'token': issue_token(user, lifetime=7 * 24 * 3600)[0],
+    }
+
+
+def prepare_database(path, organizations, campaigns, beneficiaries, project_dir):
+    """
+    Migrate and seed the database at path (in a subprocess run from
+    project_dir, as the server will see it); returns the catalog
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', SEED_SCRIPT, str(organizations), str(campaigns), str(beneficiaries)],
+        capture_output=True, text=True, env=server_environment(path), cwd=project_dir,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Seeding failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def server_environment(database):
+    env = os.environ.copy()
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
+    env.update({'DATABASE_NAME': str(database), 'DEBUG': 'False', 'ALLOWED_HOSTS': '127.0.0.1,localhost'})
+    return env
+
+
+def available_servers():
+    """Server kinds this environment can start"""
+    return ['wsgi'] + (['asgi'] if find_spec('uvicorn') else [])
+
+
+def server_command(kind, port, workers, threads):
+    """(argv, description) starting a server of kind ('wsgi' or 'asgi') on 127.0.0.1:port"""
+    if kind == 'asgi':
+        if not find_spec('uvicorn'):
+            raise RuntimeError("The ASGI server needs uvicorn (pip install uvicorn)")
+        return [
+            sys.executable, '-m', 'uvicorn', 'charity_project.asgi:application', '--host', '127.0.0.1',
+            '--port', str(port), '--workers', str(workers), '--log-level', 'warning', '--no-access-log',
+        ], f"uvicorn, {workers} workers"
+    if find_spec('gunicorn'):
+        return [
+            sys.executable, '-m', 'gunicorn', 'charity_project.wsgi:application', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers), '--threads', str(threads), '--worker-class', 'gthread',
+            '--log-level', 'warning',
+        ], f"gunicorn, {workers} workers x {threads} threads"
+    return [sys.executable, '-c', DJANGO_SERVER_SCRIPT, str(port)], "Django threaded server (gunicorn not installed)"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(process, port, timeout=60):
+    """Block until the server answers on port; raise RuntimeError if it exits or never does"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with status {process.returncode}")
+        try:
+            status, _close = asyncio.run(_probe(port))
+            if status:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"The server did not answer within {timeout}s")
+
+
+async def _probe(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        return await _exchange(reader, writer, port, 'GET', '/api/', None, {})
+    finally:
+        writer.close()
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def build_request(operation, rng, catalog):
+    """(method, path, JSON body or None) for one operation"""
+    if operation == 'read':
+        return 'GET', f"/api/campaigns/{rng.choice(catalog['campaigns'])}/", None
+    if operation == 'list':
+        return 'GET', f"/api/campaigns/?organization={rng.choice(catalog['organizations'])}&page=1", None
+    if operation == 'search':
+        word = rng.choice(SEARCH_WORDS)
+        if rng.random() < 0.5:
+            return 'GET', f"/api/campaigns/?search={word}", None
+        return 'GET', f"/api/autocomplete/?q={word[:rng.randrange(2, len(word) + 1)]}", None
+    amount = f"{rng.randrange(1, 20000) / 100:.2f}"
+    return 'POST', f"/api/campaigns/{rng.choice(catalog['campaigns'])}/update_raised_amount/", {'amount': amount}
+
+
+async def _exchange(reader, writer, port, method, path, body, headers):
+    """Send one request and read the whole response; returns (status, connection closed)"""
+    payload = json.dumps(body).encode() if body is not None else b''
+    lines = [
+        f"{method} {path} HTTP/1.1", f"Host: 127.0.0.1:{port}", "Accept: application/json",
+        "Accept-Encoding: gzip", f"Content-Length: {len(payload)}",
+    ]
+    if body is not None:
+        lines.append("Content-Type: application/json")
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+    await writer.drain()
+
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    status = int(status_line.split()[1])
+    response_headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(':')
+        if name:
+            response_headers[name.strip().lower()] = value.strip().lower()
+
+    close = response_headers.get('connection') == 'close' or status_line.startswith('HTTP/1.0')
+    if 'content-length' in response_headers:
+        await reader.readexactly(int(response_headers['content-length']))
+    elif response_headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        close = True
+    return status, close
+
+
+async def _client(port, seed, catalog, mix, window, timeout, results):
+    rng = random.Random(seed)
+    operations, weights = list(mix), list(mix.values())
+    auth = {'Authorization': f"Bearer {catalog['token']}"}
+    measure_from, measure_until = window
+    connection = None
+    while time.time() < measure_until:
+        operation = rng.choices(operations, weights)[0]
+        method, path, body = build_request(operation, rng, catalog)
+        started = time.time()
+        try:
+            if connection is None:
+                connection = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+            status, close = await asyncio.wait_for(
+                _exchange(*connection, port, method, path, body, auth if method == 'POST' else {}), timeout,
+            )
+            error = str(status) if status >= 400 else None
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            error, close = type(e).__name__, True
+        finished = time.time()
+        if close and connection is not None:
+            connection[1].close()
+            connection = None
+        if started >= measure_from and finished <= measure_until:
+            if error is None:
+                results['latencies'][operation].append((finished - started) * 1000)
+            else:
+                errors = results['errors'][operation]
+                errors[error] = errors.get(error, 0) + 1
+    if connection is not None:
+        connection[1].close()
+
+
+def run_clients(port, clients, seed, catalog, mix, start_at, warmup, duration, timeout):
+    """
+    Run in a load generator process: ``clients`` concurrent clients from
+    start_at (a time.time() shared by every process) for warmup + duration
+    seconds. Returns {'latencies': {operation: [ms, ...]}, 'errors': {operation: {kind: count}}}.
+    """
+    results = {'latencies': {name: [] for name in mix}, 'errors': {name: {} for name in mix}}
+    window = (start_at + warmup, start_at + warmup + duration)
+
+    async def main():
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        await asyncio.gather(*(
+            _client(port, seed * 10000 + number, catalog, mix, window, timeout, results)
+            for number in range(clients)
+        ))
+
+    asyncio.run(main())
+    return results
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of a sorted list (None when empty)"""
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))], 2)
+
+
+def summarize(concurrency, duration, parts):
+    """One step of the report from the results of every load generator process"""
+    latencies = {}
+    errors = {}
+    for part in parts:
+        for operation, values in part['latencies'].items():
+            latencies.setdefault(operation, []).extend(values)
+        for operation, kinds in part['errors'].items():
+            for kind, count in kinds.items():
+                errors.setdefault(operation, {}).setdefault(kind, 0)
+                errors[operation][kind] += count
+
+    def stats(values, error_counts):
+        values = sorted(values)
+        failed = sum(error_counts.values())
+        total = len(values) + failed
+        return {
+            'requests': total,
+            'throughput': round(len(values) / duration, 1),
+            'p50_ms': percentile(values, 0.5),
+            'p95_ms': percentile(values, 0.95),
+            'p99_ms': percentile(values, 0.99),
+            'error_rate': round(failed / total, 4) if total else 0.0,
+            'errors': error_counts,
+        }
+
+    every_error = {}
+    for kinds in errors.values():
+        for kind, count in kinds.items():
+            every_error[kind] = every_error.get(kind, 0) + count
+    step = {'concurrency': concurrency}
+    step.update(stats([value for values in latencies.values() for value in values], every_error))
+    step['operations'] = {
+        operation: stats(latencies.get(operation, []), errors.get(operation, {}))
+        for operation in sorted({*latencies, *errors})
+    }
+    return step
+
+
+def find_knee(steps):
+    """Concurrency past which more clients add little throughput, or None if the steps never level off"""
+    for step, following in zip(steps, steps[1:]):
+        if following['throughput'] < step['throughput'] * (1 + KNEE_GAIN):
+            return step['concurrency']
+    return None
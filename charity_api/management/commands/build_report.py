@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from charity_api.reporting import FORMATS, build_report, write_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the organization and campaign summary report (totals by status, "
+        "goal attainment distribution, progress percentiles, organization ranking) "
+        "and write it as columnar files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='reports', help="Output directory (default: reports)")
+        parser.add_argument(
+            '--format', action='append', choices=FORMATS, dest='formats',
+            help="Output format, repeatable (default: json and csv; parquet needs pyarrow)"
+        )
+
+    def handle(self, *args, **options):
+        formats = options['formats'] or ['json', 'csv']
+        if 'parquet' in formats:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise CommandError("Parquet output needs pyarrow: pip install pyarrow")
+
+        started = time.perf_counter()
+        report = build_report()
+        paths = write_report(report, options['output'], formats)
+        elapsed = time.perf_counter() - started
+
+        summary = report['tables']['summary']
+        self.stdout.write(self.style.SUCCESS(
+            f"Report of {summary['campaigns'][0]} campaigns and {summary['organizations'][0]} "
+            f"organizations built in {elapsed:.2f}s ({report['engine']} engine)"
+        ))
+        for path in paths:
+            self.stdout.write(f"  {path}")
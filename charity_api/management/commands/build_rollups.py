@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from charity_api.analytics import build_daily_rollups
+
+
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', use YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute daily analytics rollups. By default only the complete days "
+        "since the last run are rolled up; run it daily (e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to (re)compute, YYYY-MM-DD")
+        parser.add_argument('--end', help="Last day to (re)compute, YYYY-MM-DD (default: yesterday)")
+
+    def handle(self, *args, **options):
+        start = _parse_day(options['start']) if options['start'] else None
+        end = _parse_day(options['end']) if options['end'] else None
+        if start and end and end < start:
+            raise CommandError("--end must not be before --start")
+
+        written = build_daily_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup rows"))
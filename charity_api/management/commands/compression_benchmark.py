@@ -0,0 +1,108 @@
+import json
+import time
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.http import StreamingHttpResponse
+
+from charity_api.compression import COMPRESSORS, compress_response
+
+DEFAULT_PATHS = ['/api/campaigns/', '/api/beneficiaries/', '/api/organizations/', '/api/query/']
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure response compression: bytes on the wire and CPU time per request for "
+        "each available coding, through the full middleware stack, plus a streamed response."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="GET path to measure (repeatable; default: the main API lists and /)")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per path and coding (default: 50)")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def request(self, application, path, coding):
+        host = next((h for h in settings.ALLOWED_HOSTS if h and h != '*' and not h.startswith('.')), 'localhost')
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path.split('?')[0],
+            'QUERY_STRING': path.partition('?')[2],
+            'HTTP_HOST': host,
+            'HTTP_ACCEPT': 'application/json',
+            'HTTP_ACCEPT_ENCODING': coding,
+            'wsgi.input': BytesIO(),
+        }
+        setup_testing_defaults(environ)
+        statuses = []
+        body = b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+        return statuses[0], body
+
+    def measure(self, application, path, coding, count):
+        status, body = self.request(application, path, coding)  # warm-up
+        cpu, wall = time.process_time(), time.perf_counter()
+        for _ in range(count):
+            self.request(application, path, coding)
+        return {
+            'path': path,
+            'coding': coding,
+            'status': status,
+            'bytes': len(body),
+            'cpu_ms': round((time.process_time() - cpu) * 1000 / count, 3),
+            'wall_ms': round((time.perf_counter() - wall) * 1000 / count, 3),
+        }
+
+    def measure_stream(self, coding, count):
+        """A streamed export of 500 JSON lines, compressed chunk by chunk"""
+        line = json.dumps({'id': 1, 'title': 'Winter Relief', 'description': 'Blankets and meals ' * 8}) + '\n'
+        cpu = time.process_time()
+        for _ in range(count):
+            response = StreamingHttpResponse((line.encode() for _ in range(500)), content_type='application/json')
+            response = compress_response(response, None if coding == 'identity' else coding)
+            chunks = list(response.streaming_content)
+        return {
+            'path': '(streamed, 500 chunks)',
+            'coding': coding,
+            'status': '200 OK',
+            'bytes': sum(len(chunk) for chunk in chunks),
+            'cpu_ms': round((time.process_time() - cpu) * 1000 / count, 3),
+            'wall_ms': None,
+        }
+
+    def handle(self, *args, **options):
+        if options['requests'] <= 0:
+            raise CommandError("--requests must be positive")
+        paths = options['paths'] or DEFAULT_PATHS + ([] if settings.API_ONLY else ['/'])
+        paths = [path for path in paths if path != '/api/query/']  # POST only
+        application = get_wsgi_application()
+        codings = ['identity'] + list(COMPRESSORS)
+
+        rows = []
+        for path in paths:
+            for coding in codings:
+                rows.append(self.measure(application, path, coding, options['requests']))
+        for coding in codings:
+            rows.append(self.measure_stream(coding, options['requests']))
+
+        identity = {row['path']: row['bytes'] for row in rows if row['coding'] == 'identity'}
+        for row in rows:
+            row['ratio'] = round(row['bytes'] / identity[row['path']], 3) if identity[row['path']] else None
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compression benchmark, {options['requests']} requests each "
+            f"(codings available: {', '.join(COMPRESSORS)}; page cache: {settings.WEB_PAGE_CACHE_SECONDS}s)"
+        ))
+        self.stdout.write(f"  {'Path':<26} {'Coding':<9} {'Status':<16} {'Bytes':>9} {'Ratio':>6} {'CPU ms':>8} {'Wall ms':>8}")
+        for row in rows:
+            self.stdout.write(
+                f"  {row['path']:<26} {row['coding']:<9} {row['status']:<16} {row['bytes']:>9} "
+                f"{row['ratio'] if row['ratio'] is not None else '-':>6} {row['cpu_ms']:>8} "
+                f"{row['wall_ms'] if row['wall_ms'] is not None else '-':>8}"
+            )
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from charity_api.dedupe import fill_missing_keys, find_duplicates
+from charity_api.tenancy import tenant_scopes, use_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Record possible duplicate beneficiaries for review at /api/duplicates/, comparing only "
+        "beneficiaries that share a blocking key (name sound, email, phone or date of birth)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild-keys', action='store_true',
+                            help="Recompute every beneficiary's blocking keys, not only missing ones")
+        parser.add_argument('--threshold', type=float,
+                            help=f"Score a pair needs to be recorded (default: DEDUPE_THRESHOLD, {settings.DEDUPE_THRESHOLD})")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per key update (default: 1000)")
+
+    def handle(self, *args, **options):
+        if options['threshold'] is not None and not 0 <= options['threshold'] <= 1:
+            raise CommandError("--threshold must be between 0 and 1")
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive")
+
+        # The default database, then each isolated tenant's own file
+        for tenant in tenant_scopes():
+            started = time.perf_counter()
+            with use_tenant(tenant):
+                filled = fill_missing_keys(options['rebuild_keys'], options['batch_size'])
+                result = find_duplicates(options['threshold'])
+            label = 'default database' if tenant is None else f'tenant {tenant}'
+            self.stdout.write(
+                f"{label}: {filled} keys filled, {result['pairs']} pairs compared, "
+                f"{result['matches']} new possible duplicates ({time.perf_counter() - started:.1f}s)"
+            )
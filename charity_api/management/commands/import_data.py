@@ -0,0 +1,83 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from charity_api.importer import DEFAULT_BATCH_SIZE, RESOURCES, checkpoint_name, import_file, load_checkpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Import organizations, campaigns, beneficiaries or charities from a CSV or NDJSON file, "
+        "validated like API requests, in batches. Interrupted imports resume from their checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=list(RESOURCES), help="What the file holds")
+        parser.add_argument('path', help="CSV file with a header row, or NDJSON (one object per line)")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="File format (default: from the extension)")
+        parser.add_argument('--workers', type=int, help="Validation processes (default: one per CPU)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f"Rows per validation batch and transaction (default: {DEFAULT_BATCH_SIZE})")
+        parser.add_argument('--keep-ids', action='store_true',
+                            help="Insert rows with the ids in the file's id column, so later files can refer to them")
+        parser.add_argument('--checkpoint', help="Checkpoint name (default: <resource>:<absolute path>)")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start over")
+        parser.add_argument('--errors', help="Write refused rows to this NDJSON file instead of printing them")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0 or (options['workers'] is not None and options['workers'] <= 0):
+            raise CommandError("--batch-size and --workers must be positive")
+
+        checkpoint = options['checkpoint'] or checkpoint_name(options['path'], options['resource'])
+        try:
+            previous = None if options['restart'] else load_checkpoint(checkpoint, options['path'], options['resource'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if previous and previous['done']:
+            self.stdout.write(f"{options['path']} was already imported (checkpoint {checkpoint}); pass --restart to import it again")
+            return
+        if previous:
+            self.stdout.write(f"Resuming after row {previous['rows']} ({previous['created']} rows already created)")
+
+        started = time.perf_counter()
+        shown = 0
+        errors_file = open(options['errors'], 'a', encoding='utf-8') if options['errors'] else None
+
+        def on_rejected(number, errors):
+            nonlocal shown
+            if errors_file:
+                errors_file.write(json.dumps({'row': number, 'errors': errors}) + '\n')
+            elif shown < 20:
+                shown += 1
+                self.stderr.write(f"Row {number}: {json.dumps(errors)}")
+
+        def on_batch(state):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"  {state['rows']} rows read, {state['created']} created, {state['rejected']} refused "
+                f"({state['offset'] / 1e6:.1f} MB, {elapsed:.1f}s)"
+            )
+
+        try:
+            state = import_file(
+                options['path'], options['resource'],
+                fmt=options['format'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                keep_ids=options['keep_ids'],
+                checkpoint=options['checkpoint'],
+                restart=options['restart'],
+                on_batch=on_batch if options['verbosity'] > 1 else None,
+                on_rejected=on_rejected,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['created']} {options['resource']} ({state['rejected']} rows refused) "
+            f"in {time.perf_counter() - started:.2f}s; progress kept in checkpoint {checkpoint}"
+        ))
@@ -0,0 +1,159 @@
+import json
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from charity_api.loadtest import (
+    DEFAULT_CONCURRENCY, DEFAULT_MIX, available_servers, find_knee, free_port, parse_mix, prepare_database,
+    run_clients, server_command, server_environment, stop_server, summarize, wait_for_server,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the API under a real WSGI or ASGI server on a seeded SQLite database: "
+        "throughput, p50/p95/p99 latency and error rate at increasing concurrency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', action='append', choices=['wsgi', 'asgi'], dest='servers',
+                            help="Server to test (repeatable; default: wsgi, and asgi when uvicorn is installed)")
+        parser.add_argument('--concurrency', default=','.join(map(str, DEFAULT_CONCURRENCY)),
+                            help="Requests in flight at each step, comma separated (default: %(default)s)")
+        parser.add_argument('--duration', type=float, default=10, help="Measured seconds per step (default: 10)")
+        parser.add_argument('--warmup', type=float, default=2, help="Unmeasured seconds before each step (default: 2)")
+        parser.add_argument('--mix', default=','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()),
+                            help="Weights of read, list, search and donate requests (default: %(default)s)")
+        parser.add_argument('--processes', type=int, default=min(4, os.cpu_count() or 1),
+                            help="Load generator processes (default: %(default)s)")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Server worker processes (default: %(default)s; gunicorn and uvicorn only)")
+        parser.add_argument('--threads', type=int, default=4, help="Threads per gunicorn worker (default: 4)")
+        parser.add_argument('--timeout', type=float, default=10, help="Seconds before a request counts as failed (default: 10)")
+        parser.add_argument('--database',
+                            help="SQLite file to test against, seeded if new (default: a temporary file)")
+        parser.add_argument('--organizations', type=int, default=100, help="Organizations to seed (default: 100)")
+        parser.add_argument('--campaigns', type=int, default=20, help="Campaigns per organization (default: 20)")
+        parser.add_argument('--beneficiaries', type=int, default=5, help="Beneficiaries per campaign (default: 5)")
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError as e:
+            raise CommandError(f"Invalid --mix or --concurrency: {e}")
+        if min(levels) <= 0 or options['duration'] <= 0 or options['warmup'] < 0:
+            raise CommandError("--concurrency and --duration must be positive")
+        if min(options['processes'], options['workers'], options['threads']) <= 0:
+            raise CommandError("--processes, --workers and --threads must be positive")
+
+        servers = options['servers'] or available_servers()
+        if options['servers'] is None and 'asgi' not in servers:
+            self.stderr.write("Skipping the ASGI server: uvicorn is not installed")
+        if 'asgi' in servers and 'asgi' not in available_servers():
+            raise CommandError("The ASGI server needs uvicorn (pip install uvicorn)")
+
+        with tempfile.TemporaryDirectory() as scratch:
+            database = Path(options['database'] or Path(scratch) / 'load_test.sqlite3')
+            self.log(options, f"Preparing {database}")
+            try:
+                catalog = prepare_database(
+                    database, options['organizations'], options['campaigns'], options['beneficiaries'],
+                    settings.BASE_DIR,
+                )
+            except RuntimeError as e:
+                raise CommandError(str(e))
+
+            report = {
+                'database': str(database),
+                'campaigns': len(catalog['campaigns']),
+                'mix': mix,
+                'duration': options['duration'],
+                'servers': [],
+            }
+            for kind in servers:
+                report['servers'].append(self.run_server(kind, database, catalog, mix, levels, options, Path(scratch)))
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for server in report['servers']:
+            self.stdout.write(self.style.SUCCESS(
+                f"{server['kind'].upper()} ({server['server']}), {report['campaigns']} campaigns, "
+                f"{report['duration']:g}s per step"
+            ))
+            self.stdout.write(
+                f"  {'Clients':>7} {'Requests':>9} {'Req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Errors':>8}"
+            )
+            for step in server['steps']:
+                self.stdout.write(
+                    f"  {step['concurrency']:>7} {step['requests']:>9} {step['throughput']:>9} "
+                    f"{step['p50_ms'] if step['p50_ms'] is not None else '-':>9} "
+                    f"{step['p95_ms'] if step['p95_ms'] is not None else '-':>9} "
+                    f"{step['p99_ms'] if step['p99_ms'] is not None else '-':>9} {step['error_rate']:>8.2%}"
+                )
+            if server['knee'] is None:
+                self.stdout.write("  Throughput still rising at the last step: try higher --concurrency")
+            else:
+                self.stdout.write(f"  Knee: throughput levels off past {server['knee']} clients")
+            self.stdout.write("")
+
+    def log(self, options, message):
+        if not options['json']:
+            self.stdout.write(message)
+
+    def run_server(self, kind, database, catalog, mix, levels, options, scratch):
+        port = free_port()
+        try:
+            argv, description = server_command(kind, port, options['workers'], options['threads'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.log(options, f"Starting {description} on port {port}")
+
+        log_path = scratch / f'{kind}.log'
+        with open(log_path, 'wb') as log:
+            process = subprocess.Popen(
+                argv, stdout=log, stderr=subprocess.STDOUT, env=server_environment(database), cwd=settings.BASE_DIR,
+            )
+        try:
+            try:
+                wait_for_server(process, port)
+            except RuntimeError as e:
+                raise CommandError(f"{e}\n{log_path.read_text(errors='replace')[-2000:]}")
+
+            steps = []
+            with ProcessPoolExecutor(max_workers=options['processes']) as pool:
+                for concurrency in levels:
+                    processes = min(options['processes'], concurrency)
+                    shares = [concurrency // processes + (number < concurrency % processes) for number in range(processes)]
+                    # Every process starts at the same moment, once the pool is up
+                    start_at = time.time() + 1
+                    futures = [
+                        pool.submit(
+                            run_clients, port, clients, concurrency * 100 + number, catalog, mix, start_at,
+                            options['warmup'], options['duration'], options['timeout'],
+                        )
+                        for number, clients in enumerate(shares)
+                    ]
+                    step = summarize(concurrency, options['duration'], [future.result() for future in futures])
+                    steps.append(step)
+                    self.log(
+                        options,
+                        f"  {concurrency} clients: {step['throughput']} req/s, p99 {step['p99_ms']} ms, "
+                        f"{step['error_rate']:.2%} errors",
+                    )
+        finally:
+            stop_server(process)
+
+        return {'kind': kind, 'server': description, 'steps': steps, 'knee': find_knee(steps)}
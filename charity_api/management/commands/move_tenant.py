@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from charity_api.models import Organization
+from charity_api.tenancy import move_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Move an organization's campaigns, beneficiaries, history and archive rows into "
+        "its own SQLite database (tenant_<id>, listed in TENANT_DATABASES) or back to the "
+        "default one. Stop the workers serving the organization while it runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization', type=int, help="Organization id")
+        parser.add_argument('--to-default', action='store_true',
+                            help="Move the rows back into the default database")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows copied per INSERT batch (default: 1000)")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive")
+
+        started = time.perf_counter()
+        try:
+            moved = move_tenant(options['organization'], options['to_default'], options['batch_size'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization {options['organization']} does not exist")
+        except ValueError as e:
+            raise CommandError(f"{e}; add it and rerun")
+
+        for model_name, rows in moved.items():
+            self.stdout.write(f"{model_name}: {rows}")
+        target = 'the default database' if options['to_default'] else f"tenant_{options['organization']}"
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {sum(moved.values())} rows to {target} in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,63 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from charity_api.archive import DEFAULT_BATCH_SIZE, purge_deleted
+from charity_api.lifecycle import run_transitions
+from charity_api.tenancy import tenant_scopes, use_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Move campaigns to 'active' once their start date is reached and to "
+        "'completed' once their end date has passed, in bulk, then remove "
+        "soft-deleted rows in batches. Runs every --interval seconds until "
+        "stopped, or once with --once (e.g. from cron). Covers the default database and every isolated tenant's."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run a single pass and exit")
+        parser.add_argument('--interval', type=int, default=3600, help="Seconds between passes (default: 3600)")
+        parser.add_argument('--date', help="Evaluate dates as of this day, YYYY-MM-DD (default: today)")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many campaigns are due")
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f"Rows removed per transaction when purging deleted rows (default: {DEFAULT_BATCH_SIZE})"
+        )
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date '{options['date']}', use YYYY-MM-DD")
+        if options['interval'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError("--interval and --batch-size must be positive")
+
+        try:
+            while True:
+                self.run_pass(today, options['dry_run'], options['batch_size'])
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Scheduler stopped")
+
+    def run_pass(self, today, dry_run, batch_size):
+        started = time.perf_counter()
+        verb = "due" if dry_run else "moved"
+        for tenant in tenant_scopes():
+            if tenant is not None:
+                self.stdout.write(f" tenant {tenant}:")
+            with use_tenant(tenant):
+                results = run_transitions(today, dry_run=dry_run)
+                for from_statuses, to_status, count in results:
+                    self.stdout.write(f"  {'/'.join(from_statuses)} -> {to_status}: {count} {verb}")
+                if not dry_run:
+                    for model_name, count in purge_deleted(batch_size).items():
+                        if count:
+                            self.stdout.write(f"  purged {count} deleted {model_name} rows")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Status pass finished in {elapsed:.2f}s"))
@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError
+
+from charity_api.cache import versions_shared
+from charity_api.snapshot import read_header, restore_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace the rows of every table in a snapshot file (from snapshot_export) with the "
+        "snapshot's, in one transaction. The database must be migrated like the source."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Snapshot file")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database to restore into (default: default)")
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help="Do not ask for confirmation")
+
+    def handle(self, *args, **options):
+        try:
+            header = read_header(options['path'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        if options['interactive']:
+            confirm = input(
+                f"This replaces all rows of {len(header['models'])} tables in the '{options['database']}' "
+                f"database with the snapshot taken {header['created_at']}.\n"
+                "Type 'yes' to continue, or 'no' to cancel: "
+            )
+            if confirm != 'yes':
+                self.stdout.write("Restore cancelled.")
+                return
+
+        started = time.perf_counter()
+        try:
+            counts = restore_snapshot(
+                options['path'],
+                using=options['database'],
+                progress=lambda label, rows: self.stdout.write(f"  {label}: {rows}") if options['verbosity'] > 1 else None,
+            )
+        except (ValueError, IntegrityError, DatabaseError) as e:
+            raise CommandError(f"Restore failed, nothing was changed: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {sum(counts.values())} rows into {len(counts)} tables in {time.perf_counter() - started:.2f}s"
+        ))
+        if not versions_shared():
+            self.stdout.write(
+                "Workers pick up the restored names in their autocomplete indexes within "
+                f"AUTOCOMPLETE_REBUILD_SECONDS ({getattr(settings, 'AUTOCOMPLETE_REBUILD_SECONDS', 60)}s)."
+            )
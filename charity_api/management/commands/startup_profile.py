@@ -0,0 +1,137 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing is imported yet
+PROBE_SCRIPT = """
+import json, os, sys, time
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+ready = time.perf_counter()
+
+from django.conf import settings
+host = next((h for h in settings.ALLOWED_HOSTS if h and h != '*' and not h.startswith('.')), 'localhost')
+environ = {
+    'REQUEST_METHOD': 'GET',
+    'PATH_INFO': sys.argv[1],
+    'HTTP_HOST': host,
+    'HTTP_ACCEPT': 'application/json',
+    'wsgi.input': BytesIO(),
+}
+setup_testing_defaults(environ)
+statuses = []
+body = b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+served = time.perf_counter()
+
+try:
+    import resource
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    max_rss_kb = None
+
+print(json.dumps({
+    'api_only': settings.API_ONLY,
+    'setup_ms': (ready - started) * 1000,
+    'first_request_ms': (served - ready) * 1000,
+    'status': statuses[0] if statuses else None,
+    'body_bytes': len(body),
+    'modules': len(sys.modules),
+    'max_rss_kb': max_rss_kb,
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Aggregate `-X importtime` output into {top-level package: (self_us, modules)}"""
+    packages = defaultdict(lambda: [0, 0])
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            self_us, _cumulative, name = line[len('import time:'):].split('|', 2)
+            package = name.strip().split('.')[0]
+            packages[package][0] += int(self_us)
+            packages[package][1] += 1
+        except ValueError:
+            continue
+    return packages
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start: import time per package (as `python -X importtime`) "
+        "and time to serve the first request, in a fresh interpreter."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/', help="Path of the first request (default: /api/)")
+        parser.add_argument('--top', type=int, default=15, help="Number of packages to list (default: 15)")
+        parser.add_argument('--api-only', action='store_true', help="Profile with API_ONLY=True")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        env = os.environ.copy()
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
+        if options['api_only']:
+            env['API_ONLY'] = 'True'
+
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE_SCRIPT, options['path']],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            raise CommandError(f"Probe process failed:\n{result.stderr[-2000:]}")
+
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        packages = parse_importtime(result.stderr)
+        total_us = sum(self_us for self_us, _count in packages.values())
+        ranked = sorted(packages.items(), key=lambda item: item[1][0], reverse=True)[:options['top']]
+
+        report = {
+            # As the probe's settings saw it: API_ONLY may also come from the environment
+            'api_only': probe['api_only'],
+            'path': options['path'],
+            'status': probe['status'],
+            'process_wall_ms': round(wall_ms, 1),
+            'setup_ms': round(probe['setup_ms'], 1),
+            'first_request_ms': round(probe['first_request_ms'], 1),
+            'import_total_ms': round(total_us / 1000, 1),
+            'modules_loaded': probe['modules'],
+            'max_rss_kb': probe['max_rss_kb'],
+            'packages': [
+                {'package': name, 'self_ms': round(self_us / 1000, 1), 'modules': count}
+                for name, (self_us, count) in ranked
+            ],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Startup profile for GET {report['path']} (API_ONLY={report['api_only']})"
+        ))
+        self.stdout.write(f"  Response status:     {report['status']}")
+        self.stdout.write(f"  Process wall time:   {report['process_wall_ms']} ms")
+        self.stdout.write(f"  django.setup + WSGI: {report['setup_ms']} ms")
+        self.stdout.write(f"  First request:       {report['first_request_ms']} ms")
+        self.stdout.write(f"  Import time (self):  {report['import_total_ms']} ms in {report['modules_loaded']} modules")
+        if report['max_rss_kb'] is not None:
+            self.stdout.write(f"  Peak RSS:            {report['max_rss_kb'] / 1024:.1f} MB")
+        self.stdout.write("")
+        self.stdout.write(f"  {'Package':<30} {'Self ms':>10} {'Modules':>8}")
+        for row in report['packages']:
+            self.stdout.write(f"  {row['package']:<30} {row['self_ms']:>10} {row['modules']:>8}")
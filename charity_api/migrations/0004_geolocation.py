@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:13
+
+import django.core.validators
+from django.db import migrations, models
+
+from charity_api.geo import geocode, grid_cell
+
+
+def geocode_existing(apps, schema_editor):
+    for model_name in ('Campaign', 'Charity'):
+        model = apps.get_model('charity_api', model_name)
+        pending = []
+        for instance in model.objects.exclude(location='').only('pk', 'location').iterator():
+            coordinates = geocode(instance.location)
+            if coordinates is not None:
+                instance.latitude, instance.longitude = coordinates
+                instance.geo_cell = grid_cell(*coordinates)
+                pending.append(instance)
+        model.objects.bulk_update(pending, ['latitude', 'longitude', 'geo_cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charity_api', '0003_changelogentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='geo_cell',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddField(
+            model_name='charity',
+            name='geo_cell',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='charity',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='charity',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.RunPython(geocode_existing, migrations.RunPython.noop),
+    ]
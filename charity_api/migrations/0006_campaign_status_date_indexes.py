@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charity_api', '0005_analytics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['status', 'start_date'], name='charity_api_status_7f9b8c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['status', 'end_date'], name='charity_api_status_91b4f1_idx'),
+        ),
+    ]
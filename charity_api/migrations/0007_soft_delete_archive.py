@@ -0,0 +1,83 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:24
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charity_api', '0006_campaign_status_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beneficiary',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedCampaign',
+            fields=[
+                ('latitude', models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)])),
+                ('longitude', models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)])),
+                ('geo_cell', models.IntegerField(blank=True, db_index=True, editable=False, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('goal_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('raised_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('planning', 'Planning'), ('active', 'Active'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('location', models.CharField(blank=True, max_length=200)),
+                ('beneficiary_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(db_index=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_campaigns', to='charity_api.organization')),
+            ],
+            options={
+                'verbose_name': 'Archived campaign',
+                'verbose_name_plural': 'Archived campaigns',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBeneficiary',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('campaign_title', models.CharField(max_length=200)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('phone', models.CharField(blank=True, max_length=20)),
+                ('address', models.TextField(blank=True)),
+                ('date_of_birth', models.DateField(blank=True, null=True)),
+                ('needs_description', models.TextField()),
+                ('amount_received', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_active', models.BooleanField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(db_index=True)),
+                ('campaign', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_beneficiaries', to='charity_api.campaign')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_beneficiaries', to='charity_api.organization')),
+            ],
+            options={
+                'verbose_name': 'Archived beneficiary',
+                'verbose_name_plural': 'Archived beneficiaries',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:33
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def copy_organization(apps, schema_editor):
+    Beneficiary = apps.get_model('charity_api', 'Beneficiary')
+    Campaign = apps.get_model('charity_api', 'Campaign')
+    Beneficiary.objects.update(
+        organization=Subquery(Campaign.objects.filter(pk=OuterRef('campaign')).values('organization')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charity_api', '0007_soft_delete_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beneficiary',
+            name='organization',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='beneficiaries', to='charity_api.organization'),
+        ),
+        migrations.RunPython(copy_organization, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='beneficiary',
+            name='organization',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='beneficiaries', to='charity_api.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='beneficiary',
+            index=models.Index(fields=['organization', '-created_at'], name='charity_api_organiz_a3e7c5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='beneficiary',
+            index=models.Index(fields=['organization', 'is_active'], name='charity_api_organiz_dcafb4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['organization', '-created_at'], name='charity_api_organiz_25a641_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['organization', 'status'], name='charity_api_organiz_22541d_idx'),
+        ),
+        # Replaced by the indexes led by organization above
+        migrations.AlterField(
+            model_name='campaign',
+            name='organization',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='campaigns', to='charity_api.organization'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from charity_api.dedupe import match_keys
+
+
+def fill_match_keys(apps, schema_editor):
+    Beneficiary = apps.get_model('charity_api', 'Beneficiary')
+    rows = Beneficiary.objects.order_by('pk').only('id', 'first_name', 'last_name', 'email', 'phone')
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:1000])
+        if not batch:
+            return
+        for row in batch:
+            row.name_key, row.email_key, row.phone_key = match_keys(row.first_name, row.last_name, row.email, row.phone)
+        Beneficiary.objects.bulk_update(batch, ['name_key', 'email_key', 'phone_key'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charity_api', '0008_tenant_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BeneficiaryMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('reasons', models.CharField(help_text='Fields that agree, e.g. "name 0.94, email"', max_length=200)),
+                ('status', models.CharField(choices=[('pending', 'Pending review'), ('confirmed', 'Same person'), ('dismissed', 'Different people')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Beneficiary match',
+                'verbose_name_plural': 'Beneficiary matches',
+                'ordering': ['-score'],
+            },
+        ),
+        migrations.AddField(
+            model_name='beneficiary',
+            name='email_key',
+            field=models.CharField(blank=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='beneficiary',
+            name='name_key',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='beneficiary',
+            name='phone_key',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(fill_match_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='beneficiary',
+            index=models.Index(fields=['organization', 'name_key'], name='charity_api_organiz_0692d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='beneficiary',
+            index=models.Index(fields=['organization', 'email_key'], name='charity_api_organiz_5aa44d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='beneficiary',
+            index=models.Index(fields=['organization', 'phone_key'], name='charity_api_organiz_a963f6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='beneficiary',
+            index=models.Index(fields=['organization', 'date_of_birth'], name='charity_api_organiz_b93740_idx'),
+        ),
+        migrations.AddField(
+            model_name='beneficiarymatch',
+            name='beneficiary',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='charity_api.beneficiary'),
+        ),
+        migrations.AddField(
+            model_name='beneficiarymatch',
+            name='organization',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='beneficiary_matches', to='charity_api.organization'),
+        ),
+        migrations.AddField(
+            model_name='beneficiarymatch',
+            name='other',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matched_by', to='charity_api.beneficiary'),
+        ),
+        migrations.AddIndex(
+            model_name='beneficiarymatch',
+            index=models.Index(fields=['organization', 'status', '-score'], name='charity_api_organiz_d349db_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='beneficiarymatch',
+            constraint=models.UniqueConstraint(fields=('beneficiary', 'other'), name='unique_beneficiary_match'),
+        ),
+    ]
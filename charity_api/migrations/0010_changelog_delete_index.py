@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charity_api', '0009_beneficiary_dedupe'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['model_name', 'action', 'created_at'], name='charity_api_model_n_344ce6_idx'),
+        ),
+    ]
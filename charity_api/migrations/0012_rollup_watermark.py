@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:42
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_watermarks(apps, schema_editor):
+    """Start from the last rolled-up day, as analytics read it before this table"""
+    DailyRollup = apps.get_model('charity_api', 'DailyRollup')
+    RollupWatermark = apps.get_model('charity_api', 'RollupWatermark')
+    last_days = {}
+    for metric, day in DailyRollup.objects.values('metric').annotate(last=Max('day')).values_list('metric', 'last'):
+        name = metric.partition(':')[0]
+        last_days[name] = max(day, last_days.get(name, day))
+    RollupWatermark.objects.bulk_create([
+        RollupWatermark(metric=name, processed_through=day) for name, day in last_days.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charity_api', '0011_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=50, unique=True)),
+                ('processed_through', models.DateField()),
+            ],
+        ),
+        migrations.RunPython(seed_watermarks, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,83 @@
 from django.db import models
-from django.core.validators import MinValueValidator, EmailValidator
+from django.core.validators import MinValueValidator, MaxValueValidator, EmailValidator
+from .dedupe import match_keys
+from .geo import geocode, grid_cell
+from .querycache import CachedManager
 
 
-class Organization(models.Model):
+class GeoLocated(models.Model):
+    """
+    Abstract base adding coordinates, filled from ``location`` using the
+    offline gazetteer, plus the indexed grid cell used by ``?near=`` queries
+    """
+    latitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    geo_cell = models.IntegerField(null=True, blank=True, editable=False, db_index=True)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_location = instance.__dict__.get('location')
+        return instance
+
+    def fill_coordinates(self):
+        """Geocode a new or changed location and refresh the grid cell"""
+        location_changed = getattr(self, '_loaded_location', None) != self.location
+        if self.location and (location_changed or self.latitude is None or self.longitude is None):
+            coordinates = geocode(self.location)
+            if coordinates is not None:
+                self.latitude, self.longitude = coordinates
+        if self.latitude is not None and self.longitude is not None:
+            self.geo_cell = grid_cell(self.latitude, self.longitude)
+        else:
+            self.geo_cell = None
+        self._loaded_location = self.location
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        geo_fields = {'location', 'latitude', 'longitude'}
+        if update_fields is None or geo_fields.intersection(update_fields):
+            self.fill_coordinates()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | geo_fields | {'geo_cell'}
+        super().save(*args, **kwargs)
+
+
+class LiveManager(CachedManager):
+    """Default manager: hides soft-deleted rows; ``.cached()`` queries (see querycache.py)"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class SoftDeletable(models.Model):
+    """
+    Abstract base for rows that are hidden when deleted through the API and
+    physically removed later, in chunks, by ``archive.purge_deleted``.
+    ``objects`` (the default manager, also used by related managers) hides
+    them; ``all_objects`` sees every row.
+    """
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
+
+
+class Organization(SoftDeletable):
     """
     Model representing a charity organization
     """
@@ -27,7 +102,7 @@ class Organization(models.Model):
         return self.name
 
 
-class Campaign(models.Model):
+class Campaign(SoftDeletable, GeoLocated):
     """
     Model representing a charity campaign
     """
@@ -41,7 +116,9 @@ class Campaign(models.Model):
     organization = models.ForeignKey(
         Organization,
         on_delete=models.CASCADE,
-        related_name='campaigns'
+        related_name='campaigns',
+        # Covered by the indexes led by organization below
+        db_index=False,
     )
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -71,10 +148,27 @@ class Campaign(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Campaign'
         verbose_name_plural = 'Campaigns'
+        indexes = [
+            # Used by the status scheduler (see lifecycle.py)
+            models.Index(fields=['status', 'start_date']),
+            models.Index(fields=['status', 'end_date']),
+            # Tenant-scoped lists (see tenancy.py)
+            models.Index(fields=['organization', '-created_at']),
+            models.Index(fields=['organization', 'status']),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.organization.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so saves can record raised amount and status history
+        instance._loaded_raised_amount = instance.__dict__.get('raised_amount')
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_organization_id = instance.__dict__.get('organization_id')
+        return instance
+
     @property
     def progress_percentage(self):
         """Calculate the percentage of goal achieved"""
@@ -83,7 +177,7 @@ class Campaign(models.Model):
         return 0
 
 
-class Beneficiary(models.Model):
+class Beneficiary(SoftDeletable):
     """
     Model representing a beneficiary receiving help from campaigns
     """
@@ -92,6 +186,14 @@ class Beneficiary(models.Model):
         on_delete=models.CASCADE,
         related_name='beneficiaries'
     )
+    # Tenant key, copied from the campaign so tenant-scoped queries need no join
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='beneficiaries',
+        editable=False,
+        db_index=False,
+    )
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     email = models.EmailField(blank=True, validators=[EmailValidator()])
@@ -108,23 +210,111 @@ class Beneficiary(models.Model):
         validators=[MinValueValidator(0)]
     )
     is_active = models.BooleanField(default=True)
+    # Blocking keys for duplicate detection (see dedupe.py), filled on save
+    name_key = models.CharField(max_length=20, blank=True, editable=False)
+    email_key = models.CharField(max_length=254, blank=True, editable=False)
+    phone_key = models.CharField(max_length=20, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Fields the blocking keys are derived from
+    MATCH_FIELDS = {'first_name', 'last_name', 'email', 'phone'}
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Beneficiary'
         verbose_name_plural = 'Beneficiaries'
+        indexes = [
+            models.Index(fields=['created_at']),
+            # Tenant-scoped lists (see tenancy.py)
+            models.Index(fields=['organization', '-created_at']),
+            models.Index(fields=['organization', 'is_active']),
+            # Duplicate detection blocks (see dedupe.py)
+            models.Index(fields=['organization', 'name_key']),
+            models.Index(fields=['organization', 'email_key']),
+            models.Index(fields=['organization', 'phone_key']),
+            models.Index(fields=['organization', 'date_of_birth']),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.campaign.title}"
 
+    def save(self, *args, **kwargs):
+        if self.campaign_id is not None:
+            self.organization_id = self.campaign.organization_id
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'campaign' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'organization'}
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.MATCH_FIELDS.intersection(update_fields):
+            self.fill_match_keys()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'name_key', 'email_key', 'phone_key'}
+        super().save(*args, **kwargs)
+
+    def fill_match_keys(self):
+        self.name_key, self.email_key, self.phone_key = match_keys(
+            self.first_name, self.last_name, self.email, self.phone,
+        )
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
 
 
-class Charity(models.Model):
+class BeneficiaryMatch(models.Model):
+    """
+    Two beneficiaries of one organization that look like the same person,
+    found by ``dedupe.py`` and queued for review; ``beneficiary`` is the one
+    with the lower id
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending review'),
+        ('confirmed', 'Same person'),
+        ('dismissed', 'Different people'),
+    ]
+
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='beneficiary_matches',
+        # Covered by the index led by organization below
+        db_index=False,
+    )
+    beneficiary = models.ForeignKey(
+        Beneficiary,
+        on_delete=models.CASCADE,
+        related_name='matches',
+        # Covered by the unique constraint below
+        db_index=False,
+    )
+    other = models.ForeignKey(
+        Beneficiary,
+        on_delete=models.CASCADE,
+        related_name='matched_by'
+    )
+    score = models.FloatField()
+    reasons = models.CharField(max_length=200, help_text="Fields that agree, e.g. \"name 0.94, email\"")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'Beneficiary match'
+        verbose_name_plural = 'Beneficiary matches'
+        constraints = [
+            models.UniqueConstraint(fields=['beneficiary', 'other'], name='unique_beneficiary_match'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'status', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.beneficiary_id} ~ {self.other_id} ({self.score:.2f}, {self.status})"
+
+
+class Charity(GeoLocated):
     """
     Charity entity to showcase on the site and via API
     """
@@ -142,6 +332,8 @@ class Charity(models.Model):
     link = models.URLField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CachedManager()
+
     class Meta:
         ordering = ["-created_at"]
         indexes = [
@@ -152,3 +344,230 @@ class Charity(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only log of writes to the API models, read by the change feed.
+
+    The auto-incrementing primary key doubles as the monotonically increasing
+    ``since`` token handed to clients.
+    """
+    ACTION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    model_name = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Latest delete per model (conditional GET validators)
+            models.Index(fields=['model_name', 'action', 'created_at']),
+        ]
+        verbose_name = 'Change log entry'
+        verbose_name_plural = 'Change log entries'
+
+    def __str__(self):
+        return f"#{self.pk} {self.action} {self.model_name}:{self.object_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a ``manage.py import_data`` run, saved in the transaction
+    that inserts each batch, so a resumed import never repeats a batch
+    """
+    name = models.CharField(max_length=500, unique=True)
+    state = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RaisedAmountChange(models.Model):
+    """
+    Ledger of changes to ``Campaign.raised_amount``, recorded on every save
+    that changes it; the source of "raised per day" analytics
+    """
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='raised_amount_changes'
+    )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='raised_amount_changes'
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.amount} to campaign {self.campaign_id}"
+
+
+class CampaignStatusChange(models.Model):
+    """
+    History of ``Campaign.status`` transitions
+    """
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='status_changes'
+    )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='campaign_status_changes'
+    )
+    from_status = models.CharField(max_length=20, choices=Campaign.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Campaign.STATUS_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-changed_at']
+
+    def __str__(self):
+        return f"Campaign {self.campaign_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+class DailyRollup(models.Model):
+    """
+    Precomputed per-day, per-organization totals for analytics metrics.
+
+    Filled by ``manage.py build_rollups`` for complete days; analytics queries
+    read these for old buckets and aggregate raw rows only for recent ones.
+    """
+    metric = models.CharField(max_length=50)
+    day = models.DateField()
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='daily_rollups'
+    )
+    value = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'day', 'organization'], name='unique_daily_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['metric', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.metric} {self.day}: {self.value}"
+
+
+class RollupWatermark(models.Model):
+    """
+    Last day ``manage.py build_rollups`` has processed for a metric, rows or
+    not: analytics read rollups up to it and raw rows after it
+    """
+    metric = models.CharField(max_length=50, unique=True)
+    processed_through = models.DateField()
+
+    def __str__(self):
+        return f"{self.metric} through {self.processed_through}"
+
+
+class ArchivedCampaign(GeoLocated):
+    """
+    Completed campaign moved out of the hot ``Campaign`` table by
+    ``manage.py archive_campaigns``; keeps its original id and columns, plus
+    the number of beneficiaries it had
+    """
+    id = models.BigIntegerField(primary_key=True)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='archived_campaigns'
+    )
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    goal_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    raised_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Campaign.STATUS_CHOICES)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    location = models.CharField(max_length=200, blank=True)
+    beneficiary_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Archived campaign'
+        verbose_name_plural = 'Archived campaigns'
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def progress_percentage(self):
+        if self.goal_amount > 0:
+            return (self.raised_amount / self.goal_amount) * 100
+        return 0
+
+
+class ArchivedBeneficiary(models.Model):
+    """
+    Beneficiary moved out of the hot table, either with its archived
+    campaign or on its own after being inactive for long enough.
+
+    ``campaign`` usually points at an archived campaign, so it has no
+    database constraint and the campaign title is kept as it was when
+    archived; rows go away with their organization.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='archived_beneficiaries'
+    )
+    campaign_title = models.CharField(max_length=200)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='archived_beneficiaries'
+    )
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    email = models.EmailField(blank=True)
+    phone = models.CharField(max_length=20, blank=True)
+    address = models.TextField(blank=True)
+    date_of_birth = models.DateField(null=True, blank=True)
+    needs_description = models.TextField()
+    amount_received = models.DecimalField(max_digits=10, decimal_places=2)
+    is_active = models.BooleanField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Archived beneficiary'
+        verbose_name_plural = 'Archived beneficiaries'
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name} - {self.campaign_title}"
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
@@ -0,0 +1,174 @@
+"""
+Page-number pagination with a choice of how the total ``count`` is obtained.
+
+``PageNumberPagination`` runs an exact ``COUNT(*)`` (with every filter and
+search join) on each request. ``CountModePagination`` supports:
+
+- ``exact``: the plain count;
+- ``cached``: the exact count, cached per query; the key embeds the
+  versions of every table the query reads, so writes invalidate it. Only
+  with a cache every process shares (``SHARED_CACHE``, see ``cache.py``);
+  otherwise the plain count;
+- ``estimate``: the planner statistics row count for unfiltered lists,
+  ``cached`` otherwise;
+- ``capped``: count at most ``PAGINATION_COUNT_CAP`` rows.
+
+The mode is ``PAGINATION_COUNT_MODE`` by default, ``count_mode`` on a view
+overrides it and ``?count=<mode>`` overrides both for one request. Responses
+carry ``count_exact: false`` when ``count`` is an estimate or a cap; pages
+past it are still served as long as they have rows.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.utils.crypto import md5
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from .cache import table_version, versions_shared
+from .counts import capped_count, is_unfiltered, table_estimate
+
+COUNT_MODES = ('exact', 'cached', 'estimate', 'capped')
+
+
+def query_tables_version(queryset):
+    """Versions of every table a queryset reads (its own plus joined ones)"""
+    tables = {join.table_name for join in queryset.query.alias_map.values()}
+    tables.add(queryset.model._meta.db_table)
+    models = sorted(
+        (model for model in apps.get_models() if model._meta.db_table in tables),
+        key=lambda model: model._meta.label_lower,
+    )
+    return tuple(table_version(model) for model in models)
+
+
+def cached_count(queryset):
+    """Exact count, cached under the query's SQL and its tables' versions"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    signature = md5(repr((sql, params)).encode(), usedforsecurity=False).hexdigest()
+    versions = '.'.join(map(str, query_tables_version(queryset)))
+    key = f'count:{queryset.model._meta.label_lower}:{versions}:{signature}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, getattr(settings, 'COUNT_CACHE_SECONDS', 300))
+    return count
+
+
+class InexactPage(Page):
+    """Page of a paginator whose count is not exact: knows whether a next page exists"""
+    has_more = False
+
+    def has_next(self):
+        return self.has_more
+
+
+class CountModePaginator(Paginator):
+    def __init__(self, object_list, per_page, count_mode='exact', count_cap=10000, **kwargs):
+        self.count_mode = count_mode
+        self.count_cap = count_cap
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def counted(self):
+        """(count, whether it is exact)"""
+        object_list = self.object_list
+        if not hasattr(object_list, 'query') or self.count_mode == 'exact':
+            return super().count, True
+        if self.count_mode == 'capped':
+            count = capped_count(object_list, self.count_cap + 1)
+            if count > self.count_cap:
+                return self.count_cap, False
+            return count, True
+        if self.count_mode == 'estimate' and is_unfiltered(object_list):
+            estimate = table_estimate(object_list.model, object_list.db)
+            if estimate is not None:
+                return estimate, False
+        if not versions_shared():
+            # Writes in other processes would not invalidate a cached count
+            return super().count, True
+        return cached_count(object_list), True
+
+    @property
+    def count(self):
+        return self.counted[0]
+
+    @property
+    def count_exact(self):
+        return self.counted[1]
+
+    def validate_number(self, number):
+        if self.count_exact:
+            return super().validate_number(number)
+        # Pages past an estimate or a cap may still have rows
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+        # One extra row tells whether there is a next page
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            raise EmptyPage('That page contains no results')
+        page = InexactPage(items[:self.per_page], number, self)
+        page.has_more = len(items) > self.per_page
+        return page
+
+
+class CountModePagination(PageNumberPagination):
+    count_query_param = 'count'
+
+    def get_count_mode(self, request, view=None):
+        mode = request.query_params.get(self.count_query_param)
+        if mode is None:
+            mode = getattr(view, 'count_mode', None) or getattr(settings, 'PAGINATION_COUNT_MODE', 'exact')
+        if mode not in COUNT_MODES:
+            raise ValidationError({self.count_query_param: f"Use one of: {', '.join(COUNT_MODES)}."})
+        return mode
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = CountModePaginator(
+            queryset, page_size,
+            count_mode=self.get_count_mode(request, view),
+            count_cap=getattr(settings, 'PAGINATION_COUNT_CAP', 10000),
+        )
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_exact': self.page.paginator.count_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_exact'] = {'type': 'boolean', 'example': True}
+        return response_schema
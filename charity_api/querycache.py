@@ -0,0 +1,181 @@
+"""
+Opt-in cache of queryset results.
+
+``queryset.cached()`` (on the managers of the models in ``CACHED_MODELS``)
+returns a queryset whose rows come from ``query_cache`` when the same query
+ran before: same compiled SQL and parameters, same database, same result
+shape (``values()``, ``values_list()``, instances). The key also holds the
+current version of every table the SQL reads (see ``cache.py``), so any
+write to one of them makes the entry unreachable; it is evicted, least
+recently used first, once the cache holds ``QUERY_CACHE_MAX_BYTES`` of
+pickled rows, or when ``QUERY_CACHE_SECONDS`` have passed.
+
+Only tables whose every write bumps their version can be cached: a query
+touching any other table, locking rows (``select_for_update``) or running
+inside a transaction goes to the database. Rows are kept per process;
+invalidation reaches other processes through the table versions, so the
+cache stays off unless every process shares them (``SHARED_CACHE``, see
+``cache.versions_shared``): ``cached()`` then returns the queryset as it is.
+Callers get fresh copies of the rows, never the cached objects themselves.
+
+``CachedQueryMixin`` turns it on for the GET requests of a view.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models
+from django.utils.crypto import md5
+
+from .cache import table_version, versions_shared
+
+# Models whose writes all bump their table version (signals.TRACKED_MODELS)
+CACHED_MODELS = ('charity_api.organization', 'charity_api.campaign', 'charity_api.beneficiary', 'charity_api.charity')
+
+
+class QueryCache:
+    """In-process LRU of pickled query results, bounded by their total size"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(['hits', 'misses', 'bypassed', 'stored', 'too_large', 'evicted'], 0)
+
+    def count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[1]
+
+    def set(self, key, payload, timeout):
+        limit = getattr(settings, 'QUERY_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+        with self._lock:
+            # One result may not crowd out most of the others
+            if len(payload) > limit // 4:
+                self._counters['too_large'] += 1
+                return
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + timeout, payload)
+            self._bytes += len(payload)
+            self._counters['stored'] += 1
+            while self._bytes > limit:
+                self._discard(next(iter(self._entries)))
+                self._counters['evicted'] += 1
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for counter in self._counters:
+                self._counters[counter] = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                'enabled': versions_shared(),
+                **self._counters,
+                'hit_ratio': round(self._counters['hits'] / lookups, 4) if lookups else None,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': getattr(settings, 'QUERY_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+            }
+
+
+query_cache = QueryCache()
+
+
+def tables_read(sql, connection):
+    """Labels of the models whose tables appear in sql, or None if one of them cannot be cached"""
+    labels = []
+    for model in apps.get_models(include_auto_created=True):
+        if connection.ops.quote_name(model._meta.db_table) in sql:
+            if model._meta.label_lower not in CACHED_MODELS:
+                return None
+            labels.append(model._meta.label_lower)
+    return sorted(labels)
+
+
+def fetch(queryset):
+    """The queryset's rows, from the cache or the database, or None when it cannot be cached"""
+    connection = connections[queryset.db]
+    if queryset.query.select_for_update or connection.in_atomic_block:
+        query_cache.count('bypassed')
+        return None
+    try:
+        sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        return None
+    labels = tables_read(sql, connection)
+    if labels is None:
+        query_cache.count('bypassed')
+        return None
+
+    versions = [table_version(apps.get_model(label)) for label in labels]
+    shape = (queryset._iterable_class.__qualname__, queryset._fields)
+    key = md5(repr((queryset.db, shape, sql, params, versions)).encode(), usedforsecurity=False).hexdigest()
+    payload = query_cache.get(key)
+    if payload is not None:
+        return pickle.loads(payload)
+
+    rows = list(queryset._iterable_class(queryset))
+    query_cache.set(key, pickle.dumps(rows, pickle.HIGHEST_PROTOCOL), queryset._cache_timeout)
+    return rows
+
+
+class CachedQuerySet(models.QuerySet):
+    _cache_timeout = None
+
+    def cached(self, timeout=None):
+        """This queryset, its rows served from ``query_cache`` for up to timeout seconds (with a shared cache)"""
+        clone = self._chain()
+        if not versions_shared():
+            # Other processes' writes would not invalidate the entries
+            return clone
+        clone._cache_timeout = getattr(settings, 'QUERY_CACHE_SECONDS', 300) if timeout is None else timeout
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._cache_timeout:
+            self._result_cache = fetch(self)
+        super()._fetch_all()
+
+
+CachedManager = models.Manager.from_queryset(CachedQuerySet)
+
+
+class CachedQueryMixin:
+    """Serve the rows of a view's GET requests from ``query_cache``"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in ('GET', 'HEAD') and isinstance(queryset, CachedQuerySet):
+            queryset = queryset.cached()
+        return queryset
@@ -0,0 +1,292 @@
+"""
+Columnar summary reports for ``manage.py build_report`` and ``/api/reports/``.
+
+Campaign and beneficiary columns are read in one ``values_list`` pass each
+(per tenant database) into typed ``array`` columns (viewed as NumPy arrays
+when NumPy is installed). Every figure is then computed over whole columns: group-bys are
+bincounts over dense organization/status codes, so the cost grows linearly
+with the number of rows and no model instance is ever built.
+"""
+import csv
+import heapq
+import json
+import math
+from array import array
+from bisect import bisect_right
+from operator import itemgetter
+from pathlib import Path
+
+from django.utils import timezone
+
+from .models import Beneficiary, Campaign, Organization
+from .tenancy import tenant_databases
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STATUS_CODES = [code for code, _label in Campaign.STATUS_CHOICES]
+# Lower edges of the goal attainment buckets, in percent of the goal
+ATTAINMENT_EDGES = (0, 25, 50, 75, 100)
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+FORMATS = ('json', 'csv', 'parquet')
+
+
+class Columns:
+    """Named, equal-length typed columns"""
+
+    def __init__(self, **typecodes):
+        self.typecodes = typecodes
+        self.data = {name: array(code) for name, code in typecodes.items()}
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def __len__(self):
+        return len(next(iter(self.data.values()), ()))
+
+    def vectorize(self):
+        """Zero-copy NumPy views of the columns, if NumPy is available"""
+        if np is not None:
+            self.data = {name: np.frombuffer(column, dtype=column.typecode) if len(column) else
+                         np.zeros(0, dtype=column.typecode) for name, column in self.data.items()}
+        return self
+
+
+def load_columns(chunk_size=20000):
+    """
+    Read everything the report needs: (campaigns, beneficiary campaign ids,
+    organization names, status names). Statuses are stored as codes into the
+    status names list.
+    """
+    status_index = {code: i for i, code in enumerate(STATUS_CODES)}
+    campaigns = Columns(id='q', organization='q', status='b', goal='d', raised='d')
+    # Every tenant database's campaigns, merged in id order (see tenancy.py)
+    rows = heapq.merge(*(
+        Campaign.objects.using(alias).order_by('id').values_list(
+            'id', 'organization_id', 'status', 'goal_amount', 'raised_amount'
+        ).iterator(chunk_size=chunk_size)
+        for alias in tenant_databases(Campaign)
+    ), key=itemgetter(0))
+    append_id, append_org, append_status = campaigns['id'].append, campaigns['organization'].append, \
+        campaigns['status'].append
+    append_goal, append_raised = campaigns['goal'].append, campaigns['raised'].append
+    for pk, organization_id, status, goal, raised in rows:
+        append_id(pk)
+        append_org(organization_id)
+        append_status(status_index.setdefault(status, len(status_index)))
+        append_goal(float(goal))
+        append_raised(float(raised))
+
+    beneficiaries = Columns(campaign='q')
+    for alias in tenant_databases(Beneficiary):
+        beneficiaries['campaign'].extend(
+            Beneficiary.objects.using(alias).order_by().values_list('campaign_id', flat=True).iterator(chunk_size=chunk_size)
+        )
+    names = dict(Organization.objects.values_list('id', 'name').iterator(chunk_size=chunk_size))
+    return campaigns.vectorize(), beneficiaries.vectorize(), names, list(status_index)
+
+
+# Column operations, NumPy first with a pure Python fallback
+
+def _dense_codes(values):
+    """(sorted unique values, code of each value in that list)"""
+    if np is not None:
+        return np.unique(values, return_inverse=True)
+    uniques = sorted(set(values))
+    position = {value: i for i, value in enumerate(uniques)}
+    return uniques, array('q', (position[value] for value in values))
+
+
+def _lookup(sorted_keys, values):
+    """Position of each value in sorted_keys; values not found are dropped"""
+    if np is not None:
+        positions = np.searchsorted(sorted_keys, values)
+        found = positions < len(sorted_keys)
+        found[found] = sorted_keys[positions[found]] == values[found]
+        return positions[found]
+    position = {key: i for i, key in enumerate(sorted_keys)}
+    return array('q', (position[value] for value in values if value in position))
+
+
+def _group_sum(codes, size, weights=None):
+    """Per-code count (or sum of weights) for codes in range(size)"""
+    if np is not None:
+        return np.bincount(codes, weights=weights, minlength=size)
+    totals = [0.0 if weights is not None else 0] * size
+    if weights is None:
+        for code in codes:
+            totals[code] += 1
+    else:
+        for code, weight in zip(codes, weights):
+            totals[code] += weight
+    return totals
+
+
+def _ratio_pct(numerators, denominators):
+    """numerator / denominator * 100, 0 where the denominator is 0"""
+    if np is not None:
+        numerators = np.asarray(numerators, dtype='d')
+        denominators = np.asarray(denominators, dtype='d')
+        out = np.zeros_like(numerators)
+        np.divide(numerators * 100, denominators, out=out, where=denominators > 0)
+        return out
+    return array('d', (n * 100 / d if d > 0 else 0.0 for n, d in zip(numerators, denominators)))
+
+
+def _percentiles(values, points):
+    """Linear-interpolated percentiles, as ``numpy.percentile``"""
+    if not len(values):
+        return [None] * len(points)
+    if np is not None:
+        return [float(v) for v in np.percentile(values, points)]
+    ordered = sorted(values)
+    result = []
+    for point in points:
+        rank = (len(ordered) - 1) * point / 100
+        low, high = math.floor(rank), math.ceil(rank)
+        result.append(ordered[low] + (ordered[high] - ordered[low]) * (rank - low))
+    return result
+
+
+def _bucket_counts(values, edges):
+    """Number of values per bucket [edges[i], edges[i+1]), the last one open-ended"""
+    if np is not None:
+        return np.bincount(np.digitize(values, edges[1:]), minlength=len(edges))
+    counts = [0] * len(edges)
+    for value in values:
+        counts[bisect_right(edges, value, lo=1) - 1] += 1
+    return counts
+
+
+def _rank_desc(values):
+    """Indices ordering values from largest to smallest (stable)"""
+    if np is not None:
+        return np.argsort(-np.asarray(values), kind='stable')
+    return sorted(range(len(values)), key=lambda i: -values[i])
+
+
+def _values(column, digits=None):
+    """Column as a plain list of Python numbers"""
+    values = column.tolist() if hasattr(column, 'tolist') else list(column)
+    return [round(value, digits) for value in values] if digits is not None else values
+
+
+def build_report(columns=None):
+    """
+    Compute every report table.
+
+    Returns ``{'generated_at', 'engine', 'tables'}`` where each table is a
+    dict of equal-length column lists.
+    """
+    campaigns, beneficiaries, names, statuses = columns or load_columns()
+    campaign_count = len(campaigns)
+
+    # Beneficiaries per campaign, by position of their campaign id (rows
+    # added between the two reads may reference campaigns not loaded)
+    beneficiary_counts = _group_sum(_lookup(campaigns['id'], beneficiaries['campaign']), campaign_count)
+    progress = _ratio_pct(campaigns['raised'], campaigns['goal'])
+
+    org_ids, org_codes = _dense_codes(campaigns['organization'])
+    org_count = len(org_ids)
+    org_campaigns = _group_sum(org_codes, org_count)
+    org_goal = _group_sum(org_codes, org_count, campaigns['goal'])
+    org_raised = _group_sum(org_codes, org_count, campaigns['raised'])
+    org_beneficiaries = _group_sum(org_codes, org_count, beneficiary_counts)
+    org_attainment = _ratio_pct(org_raised, org_goal)
+    order = _rank_desc(org_raised)
+
+    status_codes = campaigns['status']
+    status_size = len(statuses)
+    status_campaigns = _group_sum(status_codes, status_size)
+    status_goal = _group_sum(status_codes, status_size, campaigns['goal'])
+    status_raised = _group_sum(status_codes, status_size, campaigns['raised'])
+    status_beneficiaries = _group_sum(status_codes, status_size, beneficiary_counts)
+
+    bucket_counts = _values(_bucket_counts(progress, ATTAINMENT_EDGES))
+    labels = [f'{low}-{high}%' for low, high in zip(ATTAINMENT_EDGES, ATTAINMENT_EDGES[1:])]
+    labels.append(f'{ATTAINMENT_EDGES[-1]}%+')
+
+    goal_total, raised_total = float(sum(org_goal)), float(sum(org_raised))
+    ranked_ids = _take(org_ids, order)
+
+    tables = {
+        'summary': {
+            'campaigns': [campaign_count],
+            'organizations': [org_count],
+            'beneficiaries': [len(beneficiaries)],
+            'goal_total': [round(goal_total, 2)],
+            'raised_total': [round(raised_total, 2)],
+            'attainment_pct': [round(raised_total * 100 / goal_total, 2) if goal_total else 0.0],
+        },
+        'by_status': {
+            'status': statuses,
+            'campaigns': _values(status_campaigns),
+            'goal_total': _values(status_goal, 2),
+            'raised_total': _values(status_raised, 2),
+            'beneficiaries': [int(value) for value in _values(status_beneficiaries)],
+        },
+        'attainment_distribution': {
+            'bucket': labels,
+            'campaigns': bucket_counts,
+            'share_pct': [round(count * 100 / campaign_count, 2) if campaign_count else 0.0
+                          for count in bucket_counts],
+        },
+        'progress_percentiles': {
+            'percentile': list(PERCENTILES),
+            'progress_pct': [None if value is None else round(value, 2)
+                             for value in _percentiles(progress, PERCENTILES)],
+        },
+        'organizations': {
+            'rank': list(range(1, org_count + 1)),
+            'organization_id': ranked_ids,
+            'name': [names.get(pk, '') for pk in ranked_ids],
+            'campaigns': [int(value) for value in _take(org_campaigns, order)],
+            'goal_total': [round(value, 2) for value in _take(org_goal, order)],
+            'raised_total': [round(value, 2) for value in _take(org_raised, order)],
+            'attainment_pct': [round(value, 2) for value in _take(org_attainment, order)],
+            'beneficiaries': [int(value) for value in _take(org_beneficiaries, order)],
+        },
+    }
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'engine': 'numpy' if np is not None else 'array',
+        'tables': tables,
+    }
+
+
+def _take(column, order):
+    """Column values reordered by order, as a plain list"""
+    if np is not None:
+        return np.asarray(column)[order].tolist()
+    return [column[i] for i in order]
+
+
+def write_report(report, directory, formats=('json',)):
+    """Write the report tables under directory; returns the paths written"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = []
+    if 'json' in formats:
+        path = directory / 'report.json'
+        path.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        written.append(path)
+    if 'csv' in formats:
+        for name, table in report['tables'].items():
+            path = directory / f'{name}.csv'
+            with open(path, 'w', newline='', encoding='utf-8') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(table.keys())
+                writer.writerows(zip(*table.values()))
+            written.append(path)
+    if 'parquet' in formats:
+        # Optional dependency, checked by the caller
+        import pyarrow
+        import pyarrow.parquet
+
+        for name, table in report['tables'].items():
+            path = directory / f'{name}.parquet'
+            pyarrow.parquet.write_table(pyarrow.table(table), path)
+            written.append(path)
+    return written
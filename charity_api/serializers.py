@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Organization, Campaign, Beneficiary, Charity
+from rest_framework.validators import UniqueValidator
+from .models import Organization, Campaign, Beneficiary, BeneficiaryMatch, Charity, ArchivedCampaign, ArchivedBeneficiary
 
 
 class OrganizationSerializer(serializers.ModelSerializer):
@@ -26,6 +27,17 @@ class OrganizationSerializer(serializers.ModelSerializer):
             'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        # Soft-deleted organizations keep their unique values until purged
+        extra_kwargs = {
+            'name': {'validators': [UniqueValidator(
+                queryset=Organization.all_objects.all(),
+                message='Organization with this name already exists.',
+            )]},
+            'registration_number': {'validators': [UniqueValidator(
+                queryset=Organization.all_objects.all(),
+                message='Organization with this registration number already exists.',
+            )]},
+        }
 
     def get_campaign_count(self, obj):
         """Get the total number of campaigns for this organization"""
@@ -55,6 +67,8 @@ class CampaignSerializer(serializers.ModelSerializer):
             'start_date',
             'end_date',
             'location',
+            'latitude',
+            'longitude',
             'beneficiary_count',
             'created_at',
             'updated_at'
@@ -106,6 +120,19 @@ class BeneficiarySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'full_name']
 
 
+class BeneficiaryMatchSerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for possible duplicate pairs, with both beneficiaries
+    """
+    beneficiary = BeneficiarySerializer(read_only=True)
+    other = BeneficiarySerializer(read_only=True)
+
+    class Meta:
+        model = BeneficiaryMatch
+        fields = ['id', 'organization', 'score', 'reasons', 'status', 'beneficiary', 'other', 'created_at', 'reviewed_at']
+        read_only_fields = fields
+
+
 # Detailed serializers with nested data
 class CampaignDetailSerializer(CampaignSerializer):
     """
@@ -127,6 +154,31 @@ class OrganizationDetailSerializer(OrganizationSerializer):
         fields = OrganizationSerializer.Meta.fields + ['campaigns']
 
 
+class ArchivedCampaignSerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for archived campaigns, shaped like CampaignSerializer
+    """
+    organization_name = serializers.CharField(source='organization.name', read_only=True)
+    progress_percentage = serializers.ReadOnlyField()
+
+    class Meta:
+        model = ArchivedCampaign
+        fields = CampaignSerializer.Meta.fields + ['archived_at']
+        read_only_fields = fields
+
+
+class ArchivedBeneficiarySerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for archived beneficiaries, shaped like BeneficiarySerializer
+    """
+    full_name = serializers.ReadOnlyField()
+
+    class Meta:
+        model = ArchivedBeneficiary
+        fields = BeneficiarySerializer.Meta.fields + ['archived_at']
+        read_only_fields = fields
+
+
 class CharitySerializer(serializers.ModelSerializer):
     """
     Serializer for Charity model supporting logo uploads and read-only created_at
@@ -138,6 +190,8 @@ class CharitySerializer(serializers.ModelSerializer):
             'name',
             'category',
             'location',
+            'latitude',
+            'longitude',
             'logo',
             'link',
             'created_at',
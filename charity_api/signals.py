@@ -0,0 +1,167 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+
+from .autocomplete import index as autocomplete_index
+from .cache import bump_table_version
+from .dedupe import match_beneficiary
+from .live import publish_campaign
+from .tenancy import mirror_organization
+from .tokens import principals
+from .models import (
+    Beneficiary,
+    Campaign,
+    CampaignStatusChange,
+    ChangeLogEntry,
+    Charity,
+    Organization,
+    RaisedAmountChange,
+)
+
+# Models whose writes are recorded in the change log
+TRACKED_MODELS = (Organization, Campaign, Beneficiary, Charity)
+
+
+def record_change(instance, action):
+    """Append a change log entry and invalidate cached data for the table"""
+    bump_table_version(type(instance))
+    ChangeLogEntry.objects.create(
+        model_name=instance._meta.model_name,
+        object_id=instance.pk,
+        action=action,
+    )
+
+
+def log_save(sender, instance, raw=False, **kwargs):
+    # Skip fixture loading (raw saves); the rows are not API writes
+    if not raw:
+        # A soft delete is a save that hides the row
+        record_change(instance, 'delete' if getattr(instance, 'deleted_at', None) else 'upsert')
+
+
+def log_delete(sender, instance, **kwargs):
+    record_change(instance, 'delete')
+
+
+for model in TRACKED_MODELS:
+    post_save.connect(log_save, sender=model, dispatch_uid=f'changelog_save_{model.__name__}')
+    post_delete.connect(log_delete, sender=model, dispatch_uid=f'changelog_delete_{model.__name__}')
+
+
+def record_campaign_history(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Record raised amount deltas and status transitions for analytics"""
+    if raw:
+        return
+    if created:
+        previous_amount, previous_status = Decimal('0'), ''
+    elif hasattr(instance, '_loaded_status'):
+        previous_amount, previous_status = instance._loaded_raised_amount, instance._loaded_status
+    else:
+        # Instance not loaded from the database: nothing to compare against
+        return
+
+    if update_fields is None or 'raised_amount' in update_fields:
+        delta = Decimal(str(instance.raised_amount)) - Decimal(str(previous_amount))
+        if delta:
+            RaisedAmountChange.objects.create(
+                campaign=instance, organization_id=instance.organization_id, amount=delta
+            )
+        instance._loaded_raised_amount = instance.raised_amount
+    if (update_fields is None or 'status' in update_fields) and instance.status != previous_status:
+        CampaignStatusChange.objects.create(
+            campaign=instance,
+            organization_id=instance.organization_id,
+            from_status=previous_status,
+            to_status=instance.status,
+        )
+        instance._loaded_status = instance.status
+
+
+def follow_campaign_organization(sender, instance, created, raw=False, **kwargs):
+    """Keep the beneficiaries' tenant key in step when a campaign changes organization"""
+    if raw or created:
+        return
+    previous = getattr(instance, '_loaded_organization_id', None)
+    if previous is not None and previous != instance.organization_id:
+        Beneficiary.all_objects.filter(campaign=instance).update(organization_id=instance.organization_id)
+        bump_table_version(Beneficiary)
+    instance._loaded_organization_id = instance.organization_id
+
+
+def push_campaign_progress(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        publish_campaign(instance, using)
+
+
+post_save.connect(record_campaign_history, sender=Campaign, dispatch_uid='campaign_history')
+post_save.connect(follow_campaign_organization, sender=Campaign, dispatch_uid='campaign_tenant_key')
+post_save.connect(push_campaign_progress, sender=Campaign, dispatch_uid='live_campaign_progress')
+
+
+def copy_to_tenant_database(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mirror_organization(instance)
+
+
+post_save.connect(copy_to_tenant_database, sender=Organization, dispatch_uid='tenant_organization_copy')
+
+
+def index_name(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if getattr(instance, 'deleted_at', None):
+        autocomplete_index.remove(sender._meta.model_name, instance.pk)
+    else:
+        autocomplete_index.upsert(sender._meta.model_name, instance.pk, instance.name)
+
+
+def unindex_name(sender, instance, **kwargs):
+    autocomplete_index.remove(sender._meta.model_name, instance.pk)
+
+
+def count_campaign(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # Organizations rank by number of live campaigns; rebuilds recount them
+    if raw:
+        return
+    if created:
+        delta = 0 if instance.deleted_at else 1
+    elif update_fields is not None and 'deleted_at' in update_fields:
+        delta = -1 if instance.deleted_at else 1
+    else:
+        return
+    if delta:
+        autocomplete_index.add_popularity('organization', instance.organization_id, delta)
+
+
+def uncount_campaign(sender, instance, **kwargs):
+    if not instance.deleted_at:
+        autocomplete_index.add_popularity('organization', instance.organization_id, -1)
+
+
+for model in (Organization, Charity):
+    post_save.connect(index_name, sender=model, dispatch_uid=f'autocomplete_save_{model.__name__}')
+    post_delete.connect(unindex_name, sender=model, dispatch_uid=f'autocomplete_delete_{model.__name__}')
+post_save.connect(count_campaign, sender=Campaign, dispatch_uid='autocomplete_campaign_save')
+post_delete.connect(uncount_campaign, sender=Campaign, dispatch_uid='autocomplete_campaign_delete')
+
+
+def find_beneficiary_duplicates(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Match a new or renamed beneficiary against its blocks"""
+    if raw or instance.deleted_at or not getattr(settings, 'DEDUPE_ON_SAVE', True):
+        return
+    if update_fields is None or Beneficiary.MATCH_FIELDS.union({'date_of_birth'}).intersection(update_fields):
+        match_beneficiary(instance)
+
+
+post_save.connect(find_beneficiary_duplicates, sender=Beneficiary, dispatch_uid='dedupe_beneficiary_save')
+
+
+def forget_principal(sender, instance, **kwargs):
+    """Reload a changed user on its next token request (in this process; others wait out the TTL)"""
+    principals.discard(instance.pk)
+
+
+post_save.connect(forget_principal, sender=get_user_model(), dispatch_uid='tokens_forget_principal_save')
+post_delete.connect(forget_principal, sender=get_user_model(), dispatch_uid='tokens_forget_principal_delete')
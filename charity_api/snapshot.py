@@ -0,0 +1,389 @@
+"""
+Snapshots of a whole database, for staging refreshes and test fixtures.
+
+``manage.py snapshot_export`` writes every table into one compressed file
+(zstd, brotli or gzip, see ``compression.py``), a model at a time, read in
+primary key order with ``.iterator()`` inside one transaction so the tables
+agree with each other. Rows go in chunks, and each chunk is stored column
+by column: integers and floats as packed 64-bit arrays, booleans as bytes,
+everything else as length-prefixed UTF-8 text, with a null mask when the
+column has nulls. Columns of one type compress far better than JSON
+objects, and only one chunk is ever held in memory.
+
+``manage.py snapshot_restore`` replaces the contents of those tables in one
+transaction: it empties them, drops their secondary indexes (SQLite and
+PostgreSQL), inserts each chunk with a single ``executemany``, rebuilds the
+indexes and checks the foreign keys once at the end. No model instances,
+signals or per-row validation are involved. The target database must be
+migrated to the same migrations as the source.
+
+File layout: a ``CHARITY-SNAPSHOT <version> <coding>`` line, then the
+compressed stream of records, each a type byte and a 4-byte length: ``H``
+(JSON header: migrations, models and their columns), ``C`` (a chunk: model
+index, row count, then each column's length and bytes) and ``E`` (JSON row
+counts per model, checked on restore).
+"""
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from itertools import islice
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.utils import timezone
+
+from .compression import COMPRESSORS, brotli, zstandard
+
+MAGIC = b'CHARITY-SNAPSHOT'
+FORMAT_VERSION = 1
+DEFAULT_CHUNK_SIZE = 10000
+# Read size when restoring
+READ_BYTES = 1024 * 1024
+
+INTEGER_TYPES = {
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField',
+}
+# Stored as text and inserted as they are
+PLAIN_TEXT_TYPES = {
+    'CharField', 'TextField', 'EmailField', 'URLField', 'SlugField', 'FileField', 'ImageField', 'FilePathField',
+}
+ARRAY_CODES = {'int': 'q', 'float': 'd'}
+
+
+def _decompressor(coding):
+    """Function turning the next compressed bytes into the next uncompressed ones"""
+    if coding == 'none':
+        return bytes
+    if coding == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+    if coding == 'br' and brotli is not None:
+        return brotli.Decompressor().process
+    if coding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj().decompress
+    raise ValueError(f"This snapshot is compressed with {coding}, which is not installed here")
+
+
+def default_coding():
+    return next((coding for coding in ('zstd', 'gzip') if coding in COMPRESSORS), 'gzip')
+
+
+def column_kind(field):
+    """How a field's column is stored: int, float, bool, json, bytes or text"""
+    if field.is_relation:
+        return column_kind(field.target_field)
+    internal = field.get_internal_type()
+    if internal in INTEGER_TYPES:
+        return 'int'
+    if internal == 'FloatField':
+        return 'float'
+    if internal == 'BooleanField':
+        return 'bool'
+    if internal == 'JSONField':
+        return 'json'
+    if internal == 'BinaryField':
+        return 'bytes'
+    return 'text'
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def encode_column(kind, values):
+    has_nulls = any(value is None for value in values)
+    parts = [b'\x01' + bytes(value is None for value in values) if has_nulls else b'\x00']
+    if kind in ARRAY_CODES:
+        blank = 0 if kind == 'int' else 0.0
+        packed = array(ARRAY_CODES[kind], [blank if value is None else value for value in values])
+        parts.append(_little_endian(packed).tobytes())
+    elif kind == 'bool':
+        parts.append(bytes(bool(value) for value in values))
+    else:
+        if kind == 'json':
+            items = [b'' if value is None else json.dumps(value).encode() for value in values]
+        elif kind == 'bytes':
+            items = [b'' if value is None else bytes(value) for value in values]
+        else:
+            items = [
+                b'' if value is None else (value.isoformat() if hasattr(value, 'isoformat') else str(value)).encode()
+                for value in values
+            ]
+        parts.append(_little_endian(array('I', map(len, items))).tobytes())
+        parts.extend(items)
+    return b''.join(parts)
+
+
+def decode_column(kind, data, count):
+    view = memoryview(data)
+    nulls = bytes(view[1:1 + count]) if data[0] else None
+    position = 1 + count if nulls else 1
+    if kind in ARRAY_CODES:
+        values = array(ARRAY_CODES[kind])
+        values.frombytes(view[position:position + 8 * count])
+        values = _little_endian(values).tolist()
+    elif kind == 'bool':
+        values = [byte == 1 for byte in view[position:position + count]]
+    else:
+        lengths = array('I')
+        lengths.frombytes(view[position:position + 4 * count])
+        position += 4 * count
+        values = []
+        for length in _little_endian(lengths):
+            values.append(bytes(view[position:position + length]))
+            position += length
+        if kind != 'bytes':
+            values = [value.decode() for value in values]
+    if nulls:
+        values = [None if null else value for value, null in zip(values, nulls)]
+    return values
+
+
+def column_converter(field, kind, connection):
+    """Function turning a stored value into the value to insert, or None when it goes in as it is"""
+    if kind == 'json':
+        return lambda value: field.get_db_prep_save(json.loads(value), connection)
+    if kind == 'bool':
+        return bool
+    internal = (field.target_field if field.is_relation else field).get_internal_type()
+    if kind in ('int', 'float', 'bytes') or internal in PLAIN_TEXT_TYPES:
+        return None
+    # Parses the text itself (dates, times, decimals, UUIDs)
+    prepare = field.get_db_prep_save
+    return lambda value: prepare(value, connection)
+
+
+def snapshot_models(using=DEFAULT_DB_ALIAS, exclude=()):
+    """Models whose tables a snapshot of the database covers (``exclude``: app labels or app.model labels)"""
+    return [
+        model for model in apps.get_models(include_auto_created=True)
+        if model._meta.managed and not model._meta.proxy
+        and router.allow_migrate_model(using, model)
+        and model._meta.app_label not in exclude and model._meta.label_lower not in exclude
+    ]
+
+
+def applied_migrations(connection, app_labels):
+    return sorted([app, name] for app, name in MigrationRecorder(connection).applied_migrations() if app in app_labels)
+
+
+class SnapshotWriter:
+    def __init__(self, out, coding):
+        self.out = out
+        self.compressor = COMPRESSORS[coding]() if coding != 'none' else None
+        out.write(b'%s %d %s\n' % (MAGIC, FORMAT_VERSION, coding.encode()))
+
+    def record(self, kind, payload):
+        data = kind + struct.pack('<I', len(payload)) + payload
+        self.out.write(self.compressor.compress(data) if self.compressor else data)
+
+    def close(self):
+        if self.compressor:
+            self.out.write(self.compressor.finish())
+
+
+class SnapshotReader:
+    def __init__(self, source):
+        self.source = source
+        line = source.readline(100).split()
+        if len(line) != 3 or line[0] != MAGIC:
+            raise ValueError("Not a snapshot file")
+        _magic, version, coding = line
+        if int(version) != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version {int(version)}")
+        self.decompress = _decompressor(coding.decode())
+        self.buffer = bytearray()
+        self.position = 0
+
+    def read(self, size):
+        while len(self.buffer) - self.position < size:
+            data = self.source.read(READ_BYTES)
+            if not data:
+                raise ValueError("Truncated snapshot file")
+            del self.buffer[:self.position]
+            self.position = 0
+            self.buffer += self.decompress(data)
+        data = bytes(self.buffer[self.position:self.position + size])
+        self.position += size
+        return data
+
+    def records(self):
+        """(type, payload) for each record, up to the end record"""
+        while True:
+            kind, length = struct.unpack('<cI', self.read(5))
+            yield kind, self.read(length)
+            if kind == b'E':
+                return
+
+
+def export_snapshot(path, using=DEFAULT_DB_ALIAS, exclude=(), coding=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Write a snapshot of the database to path; returns {model label: rows}"""
+    coding = coding or default_coding()
+    connection = connections[using]
+    models = snapshot_models(using, exclude)
+    header = {
+        'created_at': timezone.now().isoformat(),
+        'vendor': connection.vendor,
+        'migrations': applied_migrations(connection, {model._meta.app_label for model in models}),
+        'models': [
+            {
+                'label': model._meta.label_lower,
+                'table': model._meta.db_table,
+                'columns': [[field.column, column_kind(field)] for field in model._meta.local_concrete_fields],
+            }
+            for model in models
+        ],
+    }
+    counts = {}
+    partial = f'{path}.partial'
+    # One transaction: the tables are read as of the same moment
+    with open(partial, 'wb') as out, transaction.atomic(using=using):
+        writer = SnapshotWriter(out, coding)
+        writer.record(b'H', json.dumps(header).encode())
+        for index, model in enumerate(models):
+            fields = model._meta.local_concrete_fields
+            kinds = [column_kind(field) for field in fields]
+            rows = (
+                model._base_manager.using(using).order_by(model._meta.pk.attname)
+                .values_list(*[field.attname for field in fields]).iterator(chunk_size=chunk_size)
+            )
+            counts[model._meta.label_lower] = 0
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                payload = [struct.pack('<HI', index, len(chunk))]
+                for kind, values in zip(kinds, zip(*chunk)):
+                    column = encode_column(kind, values)
+                    payload.append(struct.pack('<I', len(column)) + column)
+                writer.record(b'C', b''.join(payload))
+                counts[model._meta.label_lower] += len(chunk)
+            if progress:
+                progress(model._meta.label_lower, counts[model._meta.label_lower])
+        writer.record(b'E', json.dumps({'rows': counts}).encode())
+        writer.close()
+    os.replace(partial, path)
+    return counts
+
+
+def secondary_indexes(cursor, connection, table):
+    """(name, CREATE statement) of the indexes of a table that can be dropped and rebuilt"""
+    if connection.vendor == 'sqlite':
+        # Indexes backing UNIQUE and PRIMARY KEY columns have no SQL and stay
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL", [table]
+        )
+    elif connection.vendor == 'postgresql':
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint)", [table]
+        )
+    else:
+        return []
+    return cursor.fetchall()
+
+
+def read_header(path):
+    """The header of the snapshot at path (creation time, migrations, models)"""
+    with open(path, 'rb') as source:
+        return json.loads(next(SnapshotReader(source).records())[1])
+
+
+def restore_snapshot(path, using=DEFAULT_DB_ALIAS, progress=None):
+    """
+    Replace the rows of every table in the snapshot at path with the
+    snapshot's; returns {model label: rows}. Raises ValueError when the file
+    does not fit the database.
+    """
+    from .cache import bump_table_version
+    from .tokens import principals
+
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    with open(path, 'rb') as source:
+        records = SnapshotReader(source).records()
+        header = json.loads(next(records)[1])
+
+        targets = []
+        for entry in header['models']:
+            try:
+                model = apps.get_model(entry['label'])
+            except LookupError:
+                raise ValueError(f"The snapshot holds {entry['label']}, which is not installed here")
+            fields = {field.column: field for field in model._meta.local_concrete_fields}
+            if [column for column, _kind in entry['columns']] != list(fields):
+                raise ValueError(f"The columns of {entry['label']} differ from the snapshot's")
+            targets.append((model, [fields[column] for column, _kind in entry['columns']], entry['columns']))
+        migrations = applied_migrations(connection, {model._meta.app_label for model, _fields, _columns in targets})
+        if migrations != header['migrations']:
+            missing = {tuple(item) for item in header['migrations']} ^ {tuple(item) for item in migrations}
+            raise ValueError(
+                "The database is not migrated like the snapshot's source; differing migrations: "
+                + ', '.join(f'{app}.{name}' for app, name in sorted(missing))
+            )
+
+        plans = []
+        for model, fields, columns in targets:
+            sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+                quote(model._meta.db_table),
+                ', '.join(quote(column) for column, _kind in columns),
+                ', '.join(['%s'] * len(columns)),
+            )
+            converters = [column_converter(field, kind, connection) for field, (_column, kind) in zip(fields, columns)]
+            plans.append((model, sql, [kind for _column, kind in columns], converters))
+
+        counts = dict.fromkeys((entry['label'] for entry in header['models']), 0)
+        tables = [model._meta.db_table for model, _fields, _columns in targets]
+        with transaction.atomic(using=using):
+            with connection.constraint_checks_disabled(), connection.cursor() as cursor:
+                indexes = []
+                for table in tables:
+                    cursor.execute(f'DELETE FROM {quote(table)}')
+                    for name, create in secondary_indexes(cursor, connection, table):
+                        cursor.execute(f'DROP INDEX {quote(name)}')
+                        indexes.append(create)
+
+                for record, payload in records:
+                    if record != b'C':
+                        break
+                    index, count = struct.unpack_from('<HI', payload)
+                    model, sql, kinds, converters = plans[index]
+                    position = 6
+                    columns = []
+                    for kind, converter in zip(kinds, converters):
+                        (length,) = struct.unpack_from('<I', payload, position)
+                        values = decode_column(kind, payload[position + 4:position + 4 + length], count)
+                        position += 4 + length
+                        if converter is not None:
+                            values = [None if value is None else converter(value) for value in values]
+                        columns.append(values)
+                    cursor.executemany(sql, list(zip(*columns)))
+                    counts[model._meta.label_lower] += count
+                    if progress:
+                        progress(model._meta.label_lower, counts[model._meta.label_lower])
+
+                expected = json.loads(payload)['rows']
+                if counts != expected:
+                    raise ValueError(f"Row counts differ from the snapshot's: read {counts}, expected {expected}")
+                for create in indexes:
+                    cursor.execute(create)
+                for statement in connection.ops.sequence_reset_sql(no_style(), [model for model, *_ in targets]):
+                    cursor.execute(statement)
+            # Foreign keys were not checked row by row
+            connection.check_constraints(table_names=tables)
+
+    # Caches built on the old rows
+    for model, _fields, _columns in targets:
+        bump_table_version(model)
+    if apps.is_installed('django.contrib.contenttypes'):
+        from django.contrib.contenttypes.models import ContentType
+        ContentType.objects.clear_cache()
+    principals.clear()
+    return counts
@@ -0,0 +1,279 @@
+"""
+Organization-scoped tenancy.
+
+Campaign and beneficiary endpoints serve one organization (the tenant) per
+request, named by the ``X-Organization`` header: their querysets are
+filtered on the tenant key (``organization``, which leads their indexes) and
+writes must stay inside the tenant. With ``TENANT_SCOPING`` on, the header
+is required there.
+
+Organizations listed in ``TENANT_DATABASES`` keep their campaigns,
+beneficiaries, history and archive rows in their own SQLite file (database
+alias ``tenant_<id>``). ``TenantRouter`` sends those models to it while the
+tenant is active (``use_tenant``), so a big tenant can be isolated and
+scaled on its own; ``manage.py move_tenant`` moves the rows. Organization
+rows stay in the default database, with a copy in the tenant's file for its
+foreign keys.
+
+Code that is not scoped to a tenant reads every database through
+``tenant_scopes`` / ``tenant_databases``: the scheduler, archive and
+duplicate jobs run once per scope, analytics, rollups and reports merge the
+rows of every database, and the change log (in the default database) gets
+the writes made in all of them. Left tenant-blind, reading the default
+database only: the campaign and beneficiary endpoints without an
+``X-Organization`` header, ``/api/query/`` without it, and ``import_data``
+(move imported rows with ``move_tenant``).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import AutoField
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import ValidationError
+
+TENANT_HEADER = 'X-Organization'
+
+# Models partitioned by organization, moved along with an isolated tenant
+TENANT_MODELS = (
+    'charity_api.campaign',
+    'charity_api.beneficiary',
+    'charity_api.beneficiarymatch',
+    'charity_api.raisedamountchange',
+    'charity_api.campaignstatuschange',
+    'charity_api.archivedcampaign',
+    'charity_api.archivedbeneficiary',
+)
+
+_current_tenant = ContextVar('tenant', default=None)
+
+
+def current_tenant():
+    """Primary key of the active tenant organization, or None"""
+    return _current_tenant.get()
+
+
+@contextmanager
+def use_tenant(tenant):
+    """Route tenant models to ``tenant``'s database (if it has one) inside the block"""
+    token = _current_tenant.set(tenant)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+def tenant_database(tenant):
+    """Database alias holding an organization's rows, or None when it lives in the default one"""
+    alias = f'tenant_{tenant}'
+    return alias if alias in settings.DATABASES else None
+
+
+def is_tenant_database(alias):
+    return alias.startswith('tenant_')
+
+
+def tenant_scopes():
+    """
+    None (the default database), then every isolated tenant whose database
+    exists: run a tenant-blind query once under ``use_tenant`` of each to
+    cover every organization's rows.
+    """
+    return [None] + [
+        tenant for tenant in getattr(settings, 'TENANT_DATABASES', [])
+        if Path(settings.DATABASES[f'tenant_{tenant}']['NAME']).exists()
+    ]
+
+
+def tenant_databases(model, tenant=None):
+    """Aliases of the databases holding model's rows: tenant's rows only, or every tenant's"""
+    aliases = []
+    for scope in tenant_scopes() if tenant is None else [tenant]:
+        with use_tenant(scope):
+            aliases.append(router.db_for_read(model))
+    return list(dict.fromkeys(aliases))
+
+
+def mirror_organization(organization):
+    """Copy an organization row into its tenant database, if it has one (``move_tenant`` creates it)"""
+    alias = tenant_database(organization.pk)
+    if alias is None or not Path(connections[alias].settings_dict['NAME']).exists():
+        return
+    model = type(organization)
+    values = {
+        field.attname: getattr(organization, field.attname)
+        for field in model._meta.concrete_fields if not field.primary_key
+    }
+    # Queryset writes: no signals, and auto_now fields keep their values
+    if not model._base_manager.using(alias).filter(pk=organization.pk).update(**values):
+        model._base_manager.using(alias).bulk_create([model(pk=organization.pk, **values)])
+
+
+def _copy_rows(model, tenant, source, target, batch_size):
+    """Copy a tenant's rows of model as they are (ids and timestamps included); returns the row count"""
+    fields = model._meta.concrete_fields
+    connection = connections[target]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    rows = model._base_manager.using(source).filter(organization_id=tenant).order_by('pk')
+    copied, last_pk = 0, None
+    while True:
+        batch = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+        batch = list(batch.values_list(*(field.attname for field in fields))[:batch_size])
+        if not batch:
+            return copied
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', [
+                [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+                for row in batch
+            ])
+        copied += len(batch)
+        last_pk = batch[-1][[field.primary_key for field in fields].index(True)]
+
+
+def _reserve_ids(tenant, alias):
+    """
+    Make ids generated in a tenant file start at ``tenant << 32``, so rows
+    created there never clash with default-database or other tenants' ids
+    (in the change log, or when the tenant is moved back).
+    """
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for label in TENANT_MODELS:
+            model = apps.get_model(label)
+            if not isinstance(model._meta.pk, AutoField):
+                continue
+            table = model._meta.db_table
+            cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s', [tenant << 32, table])
+            if not cursor.rowcount:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, tenant << 32])
+
+
+def move_tenant(tenant, to_default=False, batch_size=1000):
+    """
+    Move an organization's tenant rows from the default database into its
+    own (``tenant_<id>``, which must be configured) or back; returns
+    {model name: rows moved}. Run it while no worker serves the tenant.
+    """
+    from .cache import bump_table_version
+    from .models import Organization
+
+    alias = tenant_database(tenant)
+    if alias is None:
+        raise ValueError(f"Organization {tenant} is not in TENANT_DATABASES")
+    organization = Organization.all_objects.using(DEFAULT_DB_ALIAS).get(pk=tenant)
+    source, target = (alias, DEFAULT_DB_ALIAS) if to_default else (DEFAULT_DB_ALIAS, alias)
+    if not to_default:
+        Path(connections[alias].settings_dict['NAME']).parent.mkdir(parents=True, exist_ok=True)
+        call_command('migrate', 'charity_api', database=alias, verbosity=0)
+        mirror_organization(organization)
+        _reserve_ids(tenant, alias)
+
+    models = [apps.get_model(label) for label in TENANT_MODELS]
+    moved = {}
+    with transaction.atomic(using=source), transaction.atomic(using=target):
+        for model in models:
+            moved[model._meta.model_name] = _copy_rows(model, tenant, source, target, batch_size)
+        # Dependents first; signals and cascades are not needed, every tenant row goes
+        for model in reversed(models):
+            model._base_manager.using(source).filter(organization_id=tenant)._raw_delete(source)
+    for model in models:
+        bump_table_version(model)
+    return moved
+
+
+class TenantRouter:
+    """Send tenant models of an isolated tenant to its own database"""
+
+    def _tenant_db(self, model):
+        if model._meta.label_lower in TENANT_MODELS and current_tenant() is not None:
+            return tenant_database(current_tenant())
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._tenant_db(model)
+
+    def db_for_write(self, model, **hints):
+        return self._tenant_db(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Tenant files carry copies of the organizations they reference
+        if obj1._meta.app_label == obj2._meta.app_label == 'charity_api':
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if is_tenant_database(db):
+            return app_label == 'charity_api'
+        return None
+
+
+def request_tenant(request):
+    """Tenant named by the request header; None when absent and scoping is optional"""
+    value = request.headers.get(TENANT_HEADER)
+    if not value:
+        if getattr(settings, 'TENANT_SCOPING', False):
+            raise ValidationError({'tenant': f'The {TENANT_HEADER} header is required.'})
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({'tenant': f'{TENANT_HEADER} must be an organization id.'})
+
+
+class TenantScopedMixin:
+    """
+    Scope a viewset to the request's tenant: querysets are filtered on
+    ``tenant_field`` and tenant models are routed to the tenant's database
+    for the whole request. ``tenant_write_field`` is the serializer field
+    whose value decides the tenant of a written row (an organization, or a
+    row with an ``organization_id``).
+    """
+    tenant_field = 'organization'
+    tenant_write_field = 'organization'
+    tenant = None
+
+    def initial(self, request, *args, **kwargs):
+        self.tenant = request_tenant(request)
+        self._tenant_token = _current_tenant.set(self.tenant)
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_tenant_token', None)
+        if token is not None:
+            _current_tenant.reset(token)
+            self._tenant_token = None
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, [TENANT_HEADER])
+        return response
+
+    def scope_to_tenant(self, queryset):
+        if self.tenant is None:
+            return queryset
+        return queryset.filter(**{self.tenant_field: self.tenant})
+
+    def get_queryset(self):
+        return self.scope_to_tenant(super().get_queryset())
+
+    def check_tenant(self, serializer):
+        if self.tenant is None:
+            return
+        value = serializer.validated_data.get(self.tenant_write_field)
+        if value is None:
+            return
+        tenant = value.pk if value._meta.model_name == 'organization' else value.organization_id
+        if tenant != self.tenant:
+            raise ValidationError({self.tenant_write_field: f'Must belong to the {TENANT_HEADER} organization.'})
+
+    def perform_create(self, serializer):
+        self.check_tenant(serializer)
+        super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        self.check_tenant(serializer)
+        super().perform_update(serializer)
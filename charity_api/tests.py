@@ -0,0 +1,1431 @@
+import asyncio
+import base64
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.migrations.recorder import MigrationRecorder
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework.test import APIClient
+
+from . import importer, tokens
+from .analytics import build_daily_rollups, rollup_watermark
+from .archive import archive_campaigns, soft_delete
+from .autocomplete import index as autocomplete_index
+from .cache import table_version
+from .compression import compress_response
+from .dedupe import find_duplicates, score_pair, soundex
+from .importer import import_file
+from .lifecycle import run_transitions
+from .live import STREAM_PATH, hub, progress_snapshot
+from .loadtest import find_knee, parse_mix, percentile, summarize
+from .management.commands.startup_profile import parse_importtime
+from .models import (
+    ArchivedBeneficiary, Beneficiary, BeneficiaryMatch, Campaign, CampaignStatusChange, ChangeLogEntry, Charity,
+    Organization,
+)
+from .querycache import query_cache
+from .reporting import build_report
+from .snapshot import export_snapshot, restore_snapshot
+from .tokens import password_stamp, principals
+from .web_views import HomeView
+
+
+def count_queries(queries, table):
+    """The paginator's COUNT queries on table (not the conditional-GET fingerprint or serializer counts)"""
+    return [
+        query['sql'] for query in queries
+        if query['sql'].startswith('SELECT COUNT(*)') and f'FROM "{table}"' in query['sql']
+    ]
+
+
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.since = ChangeLogEntry.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    def feed(self, **params):
+        response = self.client.get('/api/changes/', {'since': self.since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_invalid_since_and_limit(self):
+        for params in ({'since': -1}, {'since': 'abc'}, {'limit': 0}, {'limit': 'many'}):
+            self.assertEqual(self.client.get('/api/changes/', params).status_code, 400)
+
+    def test_changes_collapse_to_the_latest_per_object(self):
+        organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        for name in ('Renamed Org', 'Final Org'):
+            organization.name = name
+            organization.save()
+        charity = Charity.objects.create(name='Clinic', category='health')
+        data = self.feed()
+        self.assertEqual([(change['model'], change['id']) for change in data['changes']],
+                         [('organization', organization.pk), ('charity', charity.pk)])
+        self.assertEqual(data['changes'][0]['data']['name'], 'Final Org')
+
+    def test_deletes_are_tombstones(self):
+        organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        campaign = Campaign.objects.create(
+            organization=organization, title='Test Campaign', description='Test',
+            goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+        )
+        soft_delete(campaign)
+        changes = self.feed()['changes']
+        self.assertEqual(changes[-1], {'model': 'campaign', 'id': campaign.pk, 'action': 'delete'})
+        self.assertEqual([change['model'] for change in changes], ['organization', 'campaign'])
+
+        # Created then deleted: the tombstone replaces the upsert
+        charity = Charity.objects.create(name='Clinic', category='health')
+        charity_id = charity.pk
+        charity.delete()
+        self.assertEqual(self.feed()['changes'][-1], {'model': 'charity', 'id': charity_id, 'action': 'delete'})
+
+        # An upsert whose row is gone by the time it is read waits for its tombstone
+        self.since = ChangeLogEntry.objects.order_by('-pk').values_list('pk', flat=True).first()
+        charity = Charity.objects.create(name='Library', category='education')
+        Charity.objects.filter(pk=charity.pk)._raw_delete('default')
+        self.assertEqual(self.feed()['changes'], [])
+
+    def test_next_token_pages_through_the_log(self):
+        charities = [Charity.objects.create(name=f'Charity {number}', category='health') for number in range(3)]
+        first = self.feed(limit=2)
+        self.assertTrue(first['has_more'])
+        self.assertEqual([change['id'] for change in first['changes']], [charity.pk for charity in charities[:2]])
+
+        self.since = first['next']
+        second = self.feed(limit=2)
+        self.assertFalse(second['has_more'])
+        self.assertEqual([change['id'] for change in second['changes']], [charities[2].pk])
+
+        self.since = second['next']
+        self.assertEqual(self.feed(), {'next': second['next'], 'has_more': False, 'changes': []})
+
+
+class CountModePaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        self.campaign = Campaign.objects.create(
+            organization=self.organization, title='Test Campaign', description='Test',
+            goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+        )
+        for number in range(5):
+            Beneficiary.objects.create(
+                campaign=self.campaign, first_name=f'First{number}', last_name='Last', needs_description='Food',
+            )
+
+    def get(self, url, model=Organization):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, count_queries(queries.captured_queries, model._meta.db_table)
+
+    @override_settings(PAGINATION_COUNT_MODE='cached', SHARED_CACHE=True)
+    def test_cached_count_skips_count_query(self):
+        response, counts = self.get('/api/organizations/?search=Test')
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(response.data['count'], 1)
+        self.assertTrue(response.data['count_exact'])
+
+        response, counts = self.get('/api/organizations/?search=Test')
+        self.assertEqual(counts, [])
+        self.assertEqual(response.data['count'], 1)
+
+    @override_settings(PAGINATION_COUNT_MODE='cached', SHARED_CACHE=True)
+    def test_cached_count_invalidated_by_writes(self):
+        self.get('/api/organizations/')
+        Organization.objects.create(name='Another Org', email='another@example.com')
+
+        response, counts = self.get('/api/organizations/')
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(response.data['count'], 2)
+
+    @override_settings(PAGINATION_COUNT_MODE='cached', SHARED_CACHE=True)
+    def test_count_query_param_overrides_mode(self):
+        self.get('/api/organizations/')
+
+        response, counts = self.get('/api/organizations/?count=exact')
+        self.assertEqual(len(counts), 1)
+        self.assertTrue(response.data['count_exact'])
+
+    @override_settings(PAGINATION_COUNT_MODE='cached', SHARED_CACHE=False)
+    def test_cached_mode_counts_without_shared_cache(self):
+        self.get('/api/organizations/')
+
+        response, counts = self.get('/api/organizations/')
+        self.assertEqual(len(counts), 1)
+        self.assertTrue(response.data['count_exact'])
+
+    def test_invalid_count_mode(self):
+        response = self.client.get('/api/organizations/?count=guess')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('count', response.data)
+
+    @override_settings(PAGINATION_COUNT_CAP=3)
+    def test_capped_count(self):
+        for number in range(5, 12):
+            Beneficiary.objects.create(
+                campaign=self.campaign, first_name=f'First{number}', last_name='Last', needs_description='Food',
+            )
+
+        # BeneficiaryViewSet counts in 'capped' mode
+        response, counts = self.get('/api/beneficiaries/', Beneficiary)
+        self.assertEqual(len(counts), 1)
+        self.assertIn('LIMIT 4', counts[0].upper())
+        self.assertEqual(response.data['count'], 3)
+        self.assertFalse(response.data['count_exact'])
+        self.assertIsNotNone(response.data['next'])
+
+        # Page 2 is past the cap but still has rows
+        response, _ = self.get('/api/beneficiaries/?page=2', Beneficiary)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+        self.assertEqual(self.client.get('/api/beneficiaries/?page=3').status_code, 404)
+
+    @override_settings(PAGINATION_COUNT_CAP=10)
+    def test_capped_count_below_cap_is_exact(self):
+        response, _ = self.get('/api/beneficiaries/', Beneficiary)
+        self.assertEqual(response.data['count'], 5)
+        self.assertTrue(response.data['count_exact'])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        self.campaigns = [
+            Campaign.objects.create(
+                organization=self.organization, title=f'Campaign {number}', description='Test',
+                goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+            )
+            for number in range(4)
+        ]
+        # Last-Modified has a one second resolution
+        earlier = timezone.now() - timedelta(minutes=5)
+        Organization.objects.update(updated_at=earlier)
+        Campaign.objects.update(updated_at=earlier)
+        ChangeLogEntry.objects.all().delete()
+
+    def test_list_not_modified(self):
+        response = self.client.get('/api/campaigns/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+
+        response = self.client.get('/api/campaigns/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_precondition_failed(self):
+        response = self.client.get(f'/api/campaigns/{self.campaigns[0].pk}/', HTTP_IF_MATCH='"stale"')
+        self.assertEqual(response.status_code, 412)
+
+    def test_related_change_modifies_list(self):
+        etag = self.client.get('/api/organizations/')['ETag']
+        Beneficiary.objects.create(
+            campaign=self.campaigns[0], first_name='First', last_name='Last', needs_description='Food',
+        )
+        response = self.client.get('/api/organizations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete_modifies_list(self):
+        response = self.client.get('/api/campaigns/')
+        self.assertEqual(response.data['count'], 4)
+        last_modified = response['Last-Modified']
+
+        self.campaigns[0].delete()
+        response = self.client.get('/api/campaigns/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+
+    def test_malformed_pk_is_not_found(self):
+        for url in ('/api/campaigns/abc/', '/api/organizations/xyz/', '/api/beneficiaries/zz/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class LiveProgressTests(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        self.other = Organization.objects.create(name='Other Org', email='other@example.com')
+        self.campaign = Campaign.objects.create(
+            organization=self.organization, title='Test Campaign', description='Test',
+            goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), status='active',
+        )
+
+    def tearDown(self):
+        hub._loop = None
+        self.loop.close()
+
+    def subscribe(self, tenant=None):
+        async def subscribe():
+            return hub.subscribe(frozenset(), tenant)
+
+        subscription = self.loop.run_until_complete(subscribe())
+        self.addCleanup(hub.unsubscribe, subscription)
+        return subscription
+
+    def deliver(self):
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_published_on_commit(self):
+        subscription = self.subscribe()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.campaign.raised_amount = 250
+            self.campaign.save()
+            self.deliver()
+            self.assertEqual(subscription.pending, {})
+
+        self.deliver()
+        self.assertEqual(subscription.pending[self.campaign.pk]['progress_percentage'], 25.0)
+
+    def test_scoped_to_tenant(self):
+        own, other = self.subscribe(self.organization.pk), self.subscribe(self.other.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.campaign.save()
+        self.deliver()
+        self.assertIn(self.campaign.pk, own.pending)
+        self.assertEqual(other.pending, {})
+
+        self.assertEqual([payload['id'] for payload in progress_snapshot(None, self.organization.pk)], [self.campaign.pk])
+        self.assertEqual(progress_snapshot(None, self.other.pk), [])
+
+
+# Prints the settings and routes an API_ONLY (or full) worker ends up with
+URLCONF_SCRIPT = """
+import json, os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
+import django
+django.setup()
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+def served(path):
+    try:
+        resolve(path)
+    except Resolver404:
+        return False
+    return True
+
+print(json.dumps({
+    'apps': settings.INSTALLED_APPS,
+    'middleware': settings.MIDDLEWARE,
+    'served': {path: served(path) for path in ('/', '/admin/', '/api/')},
+}))
+"""
+
+
+class StartupProfileTests(TestCase):
+    def worker_config(self, api_only):
+        result = subprocess.run(
+            [sys.executable, '-c', URLCONF_SCRIPT], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            env={**os.environ, 'API_ONLY': str(api_only)},
+        )
+        if result.returncode:
+            raise AssertionError(result.stderr)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_parse_importtime(self):
+        stderr = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   _io",
+            "import time:       300 |        900 |     django.utils",
+            "import time:       200 |        200 |       django.utils.functional",
+            "import time:        50 |         50 | rest_framework",
+            "some other warning",
+        ])
+        self.assertEqual(dict(parse_importtime(stderr)), {'_io': [120, 1], 'django': [500, 2], 'rest_framework': [50, 1]})
+
+    def test_api_only_drops_web_middleware_and_routes(self):
+        full, api_only = self.worker_config(False), self.worker_config(True)
+        self.assertEqual(full['served'], {'/': True, '/admin/': True, '/api/': True})
+        self.assertEqual(api_only['served'], {'/': False, '/admin/': False, '/api/': True})
+        self.assertIn('charity_api.web_middleware.SessionMiddleware', full['middleware'])
+        self.assertFalse([name for name in api_only['middleware'] if name.startswith('charity_api.web_middleware')])
+        self.assertNotIn('django.contrib.admin', api_only['apps'])
+
+    def test_report_shows_the_effective_setting(self):
+        out = StringIO()
+        with mock.patch.dict(os.environ, {'API_ONLY': 'True'}):
+            call_command('startup_profile', '--json', '--path', '/admin/', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertTrue(report['api_only'])
+        self.assertEqual(report['status'], '404 Not Found')
+        self.assertTrue(report['packages'])
+
+
+class WebPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        Campaign.objects.create(
+            organization=organization, title='Test Campaign', description='Test', goal_amount=1000,
+            start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), status='active',
+        )
+
+    def embedded(self, response):
+        content = response.content.decode()
+        start = content.find('<script id="initial-data" type="application/json">')
+        if start < 0:
+            return None
+        start = content.index('>', start) + 1
+        return json.loads(content[start:content.index('</script>', start)])
+
+    def page_request(self, live=False, **headers):
+        request = RequestFactory().get('/', **headers)
+        request.user = AnonymousUser()
+        if live:
+            # What charity_project.asgi adds to the scope of the requests it passes on
+            request.scope = {'progress_stream': STREAM_PATH}
+        return request
+
+    @override_settings(WEB_EMBED_INITIAL_DATA=True)
+    def test_first_pages_are_embedded(self):
+        data = self.embedded(self.client.get('/'))
+        self.assertEqual(
+            set(data), {'/api/organizations/', '/api/organizations/active/', '/api/campaigns/active/', '/api/beneficiaries/'}
+        )
+        self.assertEqual(data['/api/campaigns/active/'], APIClient().get('/api/campaigns/active/').json())
+        with override_settings(WEB_EMBED_INITIAL_DATA=False):
+            self.assertIsNone(self.embedded(self.client.get('/')))
+
+    def test_stream_subscription_only_when_served(self):
+        view = HomeView.as_view()
+        self.assertNotContains(view(self.page_request()), STREAM_PATH)
+        self.assertContains(view(self.page_request(live=True)), STREAM_PATH)
+
+    @override_settings(WEB_PAGE_CACHE_SECONDS=60)
+    def test_pages_are_cached_compressed(self):
+        view = HomeView.as_view()
+        first = view(self.page_request(HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertIn(b'Test Org', gzip.decompress(first.content))
+
+        with CaptureQueriesContext(connection) as queries:
+            again = view(self.page_request(HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(again.content, first.content)
+        self.assertNotIn('Content-Encoding', view(self.page_request()))
+
+        # Pages rendered for the stream are cached apart
+        live = view(self.page_request(live=True, HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertIn(STREAM_PATH.encode(), gzip.decompress(live.content))
+        self.assertNotIn(STREAM_PATH.encode(), gzip.decompress(view(self.page_request(HTTP_ACCEPT_ENCODING='gzip')).content))
+
+
+class NearFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        for title, latitude, longitude in (('Berlin', 52.52, 13.405), ('Munich', 48.137, 11.575)):
+            Campaign.objects.create(
+                organization=organization, title=title, description='Test', goal_amount=1000,
+                start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), latitude=latitude, longitude=longitude,
+            )
+
+    def test_radius(self):
+        response = self.client.get('/api/campaigns/?near=52.52,13.40&radius=50')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([campaign['title'] for campaign in response.data['results']], ['Berlin'])
+
+    def test_invalid_values(self):
+        for query in (
+            'near=52.52,13.40&radius=nan', 'near=52.52,13.40&radius=inf', 'near=nan,13.40',
+            'near=52.52,-inf', 'near=52.52,13.40&radius=0', 'near=52.52,13.40&radius=100000', 'near=95,13.40',
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/campaigns/?{query}').status_code, 400)
+
+
+class FacetCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Charity.objects.create(name='School Fund', category='education')
+
+    def education_count(self):
+        facets = self.client.get('/api/charities/?facets=category').data['facets']['category']
+        return next(facet['count'] for facet in facets if facet['value'] == 'education')
+
+    def write_elsewhere(self):
+        """A write whose version bump this process never sees (another worker's, with a local cache)"""
+        Charity.objects.bulk_create([Charity(name='Library', category='education')])
+
+    @override_settings(SHARED_CACHE=False)
+    def test_not_cached_without_shared_cache(self):
+        self.assertEqual(self.education_count(), 1)
+        self.write_elsewhere()
+        self.assertEqual(self.education_count(), 2)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_cached_until_a_write_bumps_the_version(self):
+        self.assertEqual(self.education_count(), 1)
+        self.write_elsewhere()
+        self.assertEqual(self.education_count(), 1)
+        Charity.objects.create(name='Clinic', category='health')
+        self.assertEqual(self.education_count(), 2)
+
+
+# Bumps a table version from another process, with the cache given as JSON in argv[1]
+BUMP_SCRIPT = """
+import json, os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
+import django
+django.setup()
+from django.test import override_settings
+from charity_api.cache import bump_table_version
+from charity_api.models import Organization
+with override_settings(CACHES=json.loads(sys.argv[1])):
+    bump_table_version(Organization)
+"""
+
+
+class TableVersionTests(TestCase):
+    """Table versions are only as shared as the cache backend holding them"""
+
+    def bump_in_another_process(self):
+        subprocess.run(
+            [sys.executable, '-c', BUMP_SCRIPT, json.dumps(settings.CACHES)],
+            cwd=settings.BASE_DIR, check=True,
+        )
+
+    def test_local_cache_misses_other_processes(self):
+        version = table_version(Organization)
+        self.bump_in_another_process()
+        self.assertEqual(table_version(Organization), version)
+
+    def test_shared_cache_sees_other_processes(self):
+        with tempfile.TemporaryDirectory() as location:
+            shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+            with override_settings(CACHES=shared, SHARED_CACHE=True, PAGINATION_COUNT_MODE='cached'):
+                client = APIClient()
+                Organization.objects.create(name='Test Org', email='org@example.com')
+                version = table_version(Organization)
+                self.assertEqual(client.get('/api/organizations/').data['count'], 1)
+
+                # A write the other process made without bumping first, e.g. a bulk import
+                Organization.objects.bulk_create([Organization(name='Imported', email='imported@example.com')])
+                self.assertEqual(client.get('/api/organizations/').data['count'], 1)
+
+                self.bump_in_another_process()
+                self.assertNotEqual(table_version(Organization), version)
+                self.assertEqual(client.get('/api/organizations/').data['count'], 2)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.hope = Organization.objects.create(name='Hope Foundation', email='hope@example.com')
+        Organization.objects.create(name='Hopeful Hearts', email='hearts@example.com')
+        Charity.objects.create(name='Hope Relief', category='health')
+        for title in ('Wells', 'Schools'):
+            self.add_campaign(self.hope, title)
+        autocomplete_index.rebuild()
+        self.addCleanup(autocomplete_index.reset)
+
+    def add_campaign(self, organization, title):
+        return Campaign.objects.create(
+            organization=organization, title=title, description='Test', goal_amount=1000,
+            start_date=date(2020, 1, 1), end_date=date(2030, 12, 31), status='active',
+        )
+
+    def search(self, q, **params):
+        response = self.client.get('/api/autocomplete/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def names(self, q, **params):
+        return [result['name'] for result in self.search(q, **params)]
+
+    def test_prefix_matches_rank_by_popularity(self):
+        results = self.search('hope')
+        self.assertEqual(results[0]['name'], 'Hope Foundation')
+        self.assertEqual(results[0]['popularity'], 2)
+        self.assertEqual({result['name'] for result in results}, {'Hope Foundation', 'Hopeful Hearts', 'Hope Relief'})
+        self.assertTrue(all(result['score'] == 1.0 for result in results))
+        self.assertEqual(self.names('relief'), ['Hope Relief'])
+
+    def test_typo_matches_after_prefix_matches(self):
+        results = self.search('foundaton')
+        self.assertEqual(results[0]['name'], 'Hope Foundation')
+        self.assertLess(results[0]['score'], 1.0)
+        self.assertEqual(self.search('zzzz'), [])
+
+    def test_limit_and_types(self):
+        self.assertEqual(self.names('hope', limit=1), ['Hope Foundation'])
+        self.assertEqual(self.names('hope', types='charity'), ['Hope Relief'])
+        self.assertEqual(self.client.get('/api/autocomplete/', {'q': 'hope', 'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/autocomplete/', {'q': 'hope', 'types': 'donor'}).status_code, 400)
+
+    @override_settings(AUTOCOMPLETE_REBUILD_SECONDS=3600)
+    def test_signals_update_the_index(self):
+        kindness = Organization.objects.create(name='Kindness Trust', email='kind@example.com')
+        self.assertEqual(self.names('kind'), ['Kindness Trust'])
+
+        kindness.name = 'Gentle Trust'
+        kindness.save()
+        self.assertEqual(self.names('kind'), [])
+        self.assertEqual(self.names('gentle'), ['Gentle Trust'])
+
+        soft_delete(kindness)
+        self.assertEqual(self.names('gentle'), [])
+
+    @override_settings(AUTOCOMPLETE_REBUILD_SECONDS=3600)
+    def test_campaign_signals_move_popularity_without_counting(self):
+        hearts = Organization.objects.get(name='Hopeful Hearts')
+        with CaptureQueriesContext(connection) as queries:
+            campaign = self.add_campaign(hearts, 'Blankets')
+        self.assertFalse([query['sql'] for query in queries if 'COUNT(' in query['sql']])
+        self.assertEqual(self.search('hopeful')[0]['popularity'], 1)
+
+        soft_delete(campaign)
+        self.assertEqual(self.search('hopeful')[0]['popularity'], 0)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_rebuilt_on_a_ttl_without_shared_versions(self):
+        # Another worker's write: no signal here, and its version bump is not seen
+        Organization.objects.bulk_create([Organization(name='Distant Aid', email='distant@example.com')])
+        with override_settings(AUTOCOMPLETE_REBUILD_SECONDS=3600):
+            self.assertEqual(self.names('distant'), [])
+        with override_settings(AUTOCOMPLETE_REBUILD_SECONDS=0):
+            self.assertEqual(self.names('distant'), ['Distant Aid'])
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        self.campaign = Campaign.objects.create(
+            organization=self.organization, title='Test Campaign', description='Test',
+            goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+        )
+        for day in (date(2026, 1, 10), date(2026, 1, 10), date(2026, 2, 5)):
+            self.add_beneficiary(day)
+
+    def add_beneficiary(self, day):
+        beneficiary = Beneficiary.objects.create(
+            campaign=self.campaign, first_name='First', last_name=f'Last {day}', needs_description='Food',
+        )
+        created = timezone.make_aware(datetime(day.year, day.month, day.day, 12))
+        Beneficiary.objects.filter(pk=beneficiary.pk).update(created_at=created, updated_at=created)
+        return beneficiary
+
+    def series(self, **params):
+        response = self.client.get('/api/analytics/new_beneficiaries/', {
+            'interval': 'month', 'start': '2026-01-01', 'end': '2026-03-31', **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return [(point['bucket'], point['value']) for point in response.data['series']]
+
+    def test_monthly_series(self):
+        self.assertEqual(self.series(), [(date(2026, 1, 1), 2), (date(2026, 2, 1), 1)])
+        self.assertEqual(self.series(interval='day', start='2026-02-01'), [(date(2026, 2, 5), 1)])
+        self.assertEqual(self.series(organization=self.organization.pk + 1), [])
+
+    def test_invalid_parameters(self):
+        url = '/api/analytics/new_beneficiaries/'
+        self.assertEqual(self.client.get(url, {'interval': 'hour'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2026-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2026-02-01', 'end': '2026-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/analytics/donors/').status_code, 404)
+
+    def test_rollups_cover_days_without_rows(self):
+        build_daily_rollups(end_day=date(2026, 1, 31))
+        self.assertEqual(rollup_watermark('new_beneficiaries'), date(2026, 1, 31))
+        # Raw rows of rolled-up days are not read again: the rollup is what counts
+        self.add_beneficiary(date(2026, 1, 20))
+        self.assertEqual(self.series(), [(date(2026, 1, 1), 2), (date(2026, 2, 1), 1)])
+        # Later days come from raw rows, merged into the same buckets
+        self.add_beneficiary(date(2026, 2, 6))
+        self.assertEqual(self.series(), [(date(2026, 1, 1), 2), (date(2026, 2, 1), 2)])
+
+    def test_ranges_rebuilt_out_of_order_keep_the_watermark(self):
+        build_daily_rollups(start_day=date(2026, 2, 1), end_day=date(2026, 2, 28))
+        self.assertIsNone(rollup_watermark('new_beneficiaries'))
+        build_daily_rollups(end_day=date(2026, 2, 28))
+        self.assertEqual(rollup_watermark('new_beneficiaries'), date(2026, 2, 28))
+        build_daily_rollups(start_day=date(2026, 1, 1), end_day=date(2026, 1, 31))
+        self.assertEqual(rollup_watermark('new_beneficiaries'), date(2026, 2, 28))
+        self.assertEqual(self.series(), [(date(2026, 1, 1), 2), (date(2026, 2, 1), 1)])
+
+    def test_archived_beneficiaries_still_count(self):
+        Beneficiary.objects.update(is_active=False)
+        archive_campaigns(beneficiary_days=30, today=date(2026, 10, 19))
+        self.assertEqual(ArchivedBeneficiary.objects.count(), 3)
+        self.assertEqual(self.series(), [(date(2026, 1, 1), 2), (date(2026, 2, 1), 1)])
+        build_daily_rollups(end_day=date(2026, 2, 28))
+        self.assertEqual(self.series(), [(date(2026, 1, 1), 2), (date(2026, 2, 1), 1)])
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        self.first = Organization.objects.create(name='First Org', email='first@example.com')
+        self.second = Organization.objects.create(name='Second Org', email='second@example.com')
+        # Progress: 0%, 50%, 150% and 25%
+        for organization, status, goal, raised, beneficiaries in [
+            (self.first, 'planning', 1000, 0, 0),
+            (self.first, 'active', 1000, 500, 2),
+            (self.first, 'completed', 200, 300, 0),
+            (self.second, 'active', 400, 100, 1),
+        ]:
+            campaign = self.add_campaign(organization, status, goal, raised)
+            for number in range(beneficiaries):
+                Beneficiary.objects.create(
+                    campaign=campaign, first_name=f'First{number}', last_name='Last', needs_description='Food',
+                )
+
+    def add_campaign(self, organization, status, goal, raised):
+        return Campaign.objects.create(
+            organization=organization, title=f'{status} {goal}', description='Test', goal_amount=goal,
+            raised_amount=raised, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), status=status,
+        )
+
+    def test_summary_and_group_bys(self):
+        tables = build_report()['tables']
+        self.assertEqual(tables['summary'], {
+            'campaigns': [4], 'organizations': [2], 'beneficiaries': [3],
+            'goal_total': [2600.0], 'raised_total': [900.0], 'attainment_pct': [34.62],
+        })
+        by_status = {status: row for status, *row in zip(*tables['by_status'].values())}
+        self.assertEqual(by_status['active'], [2, 1400.0, 600.0, 3])
+        self.assertEqual(by_status['cancelled'], [0, 0.0, 0.0, 0])
+        organizations = tables['organizations']
+        self.assertEqual(organizations['name'], ['First Org', 'Second Org'])
+        self.assertEqual(organizations['raised_total'], [800.0, 100.0])
+        self.assertEqual(organizations['attainment_pct'], [36.36, 25.0])
+        self.assertEqual(organizations['beneficiaries'], [2, 1])
+
+    def test_attainment_buckets_and_percentiles(self):
+        tables = build_report()['tables']
+        distribution = tables['attainment_distribution']
+        self.assertEqual(dict(zip(distribution['bucket'], distribution['campaigns'])), {
+            '0-25%': 1, '25-50%': 1, '50-75%': 1, '75-100%': 0, '100%+': 1,
+        })
+        self.assertEqual(distribution['share_pct'], [25.0, 25.0, 25.0, 0.0, 25.0])
+        percentiles = dict(zip(*tables['progress_percentiles'].values()))
+        self.assertEqual((percentiles[10], percentiles[50], percentiles[90]), (7.5, 37.5, 120.0))
+
+    def test_empty_database(self):
+        Beneficiary.all_objects.all().delete()
+        Campaign.all_objects.all().delete()
+        tables = build_report()['tables']
+        self.assertEqual(tables['summary']['campaigns'], [0])
+        self.assertEqual(tables['summary']['attainment_pct'], [0.0])
+        self.assertEqual(tables['attainment_distribution']['share_pct'], [0.0] * 5)
+        self.assertEqual(set(tables['progress_percentiles']['progress_pct']), {None})
+        self.assertEqual(tables['organizations']['rank'], [])
+
+    def test_columns_agree_with_sql_aggregates(self):
+        for number in range(40):
+            organization = self.first if number % 3 else self.second
+            campaign = self.add_campaign(organization, ['planning', 'active', 'completed', 'cancelled'][number % 4],
+                                         100 + number * 37, number * 29 % 400)
+            for beneficiary in range(number % 5):
+                Beneficiary.objects.create(
+                    campaign=campaign, first_name=f'Extra{beneficiary}', last_name='Last', needs_description='Food',
+                )
+        tables = build_report()['tables']
+
+        sql_status = {
+            row['status']: [row['campaigns'], float(row['goal']), float(row['raised'])]
+            for row in Campaign.objects.order_by().values('status').annotate(
+                campaigns=Count('pk'), goal=Sum('goal_amount'), raised=Sum('raised_amount'),
+            )
+        }
+        report_status = {
+            status: [campaigns, goal, raised]
+            for status, campaigns, goal, raised, _beneficiaries in zip(*tables['by_status'].values()) if campaigns
+        }
+        self.assertEqual(report_status, sql_status)
+
+        sql_organizations = [
+            (row['organization'], row['campaigns'], float(row['raised']))
+            for row in Campaign.objects.values('organization').annotate(
+                campaigns=Count('pk'), raised=Sum('raised_amount'),
+            ).order_by('-raised')
+        ]
+        organizations = tables['organizations']
+        self.assertEqual(
+            list(zip(organizations['organization_id'], organizations['campaigns'], organizations['raised_total'])),
+            sql_organizations,
+        )
+        self.assertEqual(sum(organizations['beneficiaries']), Beneficiary.objects.count())
+
+    def test_report_endpoint_is_for_staff(self):
+        client = APIClient()
+        self.assertIn(client.get('/api/reports/').status_code, (401, 403))
+        client.force_authenticate(User.objects.create_user('staff', password='x', is_staff=True))
+        response = client.get('/api/reports/', {'table': 'summary'})
+        self.assertEqual(list(response.data['tables']), ['summary'])
+        self.assertEqual(client.get('/api/reports/', {'table': 'donors'}).status_code, 400)
+
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        self.campaigns = {
+            title: Campaign.objects.create(
+                organization=organization, title=title, description='Test', goal_amount=1000,
+                start_date=start, end_date=end, status=status,
+            )
+            for title, status, start, end in [
+                ('Starting', 'planning', date(2026, 1, 1), date(2026, 12, 31)),
+                ('Ending', 'active', date(2026, 1, 1), date(2026, 3, 31)),
+                ('Later', 'planning', date(2027, 1, 1), date(2027, 12, 31)),
+            ]
+        }
+
+    def statuses(self):
+        return dict(Campaign.objects.values_list('title', 'status'))
+
+    def test_dry_run_changes_nothing(self):
+        results = run_transitions(today=date(2026, 6, 1), dry_run=True)
+        self.assertEqual(results, [(('planning',), 'active', 1), (('planning', 'active'), 'completed', 1)])
+        self.assertEqual(self.statuses(), {'Starting': 'planning', 'Ending': 'active', 'Later': 'planning'})
+
+    def test_transitions_record_history_log_and_version(self):
+        version = table_version(Campaign)
+        since = ChangeLogEntry.objects.order_by('-pk').values_list('pk', flat=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            results = run_transitions(today=date(2026, 6, 1))
+        self.assertEqual([count for _from, _to, count in results], [1, 1])
+        self.assertEqual(self.statuses(), {'Starting': 'active', 'Ending': 'completed', 'Later': 'planning'})
+
+        starting, ending = self.campaigns['Starting'].pk, self.campaigns['Ending'].pk
+        self.assertEqual(
+            set(CampaignStatusChange.objects.exclude(from_status='').values_list('campaign', 'from_status', 'to_status')),
+            {(starting, 'planning', 'active'), (ending, 'active', 'completed')},
+        )
+        self.assertEqual(
+            sorted(ChangeLogEntry.objects.filter(pk__gt=since).values_list('model_name', 'object_id', 'action')),
+            sorted([('campaign', starting, 'upsert'), ('campaign', ending, 'upsert')]),
+        )
+        self.assertNotEqual(table_version(Campaign), version)
+
+        # A second pass finds nothing left to move
+        self.assertEqual([count for _from, _to, count in run_transitions(today=date(2026, 6, 1))], [0, 0])
+
+
+class SoftDeleteArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        self.campaign = Campaign.objects.create(
+            organization=self.organization, title='Old Campaign', description='Test', goal_amount=1000,
+            start_date=date(2020, 1, 1), end_date=date(2020, 12, 31), status='completed',
+        )
+        self.beneficiary = Beneficiary.objects.create(
+            campaign=self.campaign, first_name='First', last_name='Last', needs_description='Food',
+        )
+
+    def test_api_delete_hides_row_and_dependents(self):
+        response = self.client.delete(f'/api/campaigns/{self.campaign.pk}/')
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.client.get(f'/api/campaigns/{self.campaign.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/beneficiaries/').data['count'], 0)
+        self.assertIsNotNone(Campaign.all_objects.get(pk=self.campaign.pk).deleted_at)
+        self.assertIsNotNone(Beneficiary.all_objects.get(pk=self.beneficiary.pk).deleted_at)
+
+    def test_admin_delete_is_soft(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        response = self.client.post(f'/admin/charity_api/campaign/{self.campaign.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNotNone(Campaign.all_objects.get(pk=self.campaign.pk).deleted_at)
+        self.assertIsNotNone(Beneficiary.all_objects.get(pk=self.beneficiary.pk).deleted_at)
+
+    def test_archived_rows_leave_change_feed_tombstones(self):
+        since = self.client.get('/api/changes/').data['next']
+        self.assertEqual(archive_campaigns(days=30, today=date(2026, 1, 1)), (1, 1))
+
+        self.assertEqual(self.client.get('/api/campaigns/').data['count'], 0)
+        response = self.client.get(f'/api/campaigns/{self.campaign.pk}/?include_archived=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['archived_at'])
+        self.assertEqual(self.client.get('/api/campaigns/abc/?include_archived=1').status_code, 404)
+
+        changes = self.client.get(f'/api/changes/?since={since}').data['changes']
+        self.assertCountEqual(
+            [(change['model'], change['id'], change['action']) for change in changes],
+            [('campaign', self.campaign.pk, 'delete'), ('beneficiary', self.beneficiary.pk, 'delete')],
+        )
+
+
+# Batched reads run in worker threads with their own connections, which only see committed rows
+class AdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.first = Organization.objects.create(name='First Org', email='first@example.com')
+        self.second = Organization.objects.create(name='Second Org', email='second@example.com')
+        self.campaigns = [
+            Campaign.objects.create(
+                organization=organization, title=f'{organization.name} Campaign', description='Test',
+                goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+            )
+            for organization in (self.first, self.second)
+        ]
+        self.beneficiary = Beneficiary.objects.create(
+            campaign=self.campaigns[0], first_name='First', last_name='Last', needs_description='Food',
+        )
+
+    def test_raw_id_filter(self):
+        url = '/admin/charity_api/campaign/'
+        response = self.client.get(url, {'organization__id__exact': self.first.pk, 'status': 'planning'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list), [self.campaigns[0]])
+        self.assertNotContains(response, 'Second Org')
+        # The other parameters survive a new id typed into the filter form
+        self.assertContains(response, '<input type="hidden" name="status" value="planning">', html=True)
+
+        response = self.client.get(url, {'organization__id__exact': 999})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+        self.assertContains(response, '#999')
+
+    def test_changelist_uses_the_estimated_count(self):
+        with mock.patch('charity_api.counts.table_estimate', return_value=2500000):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/admin/charity_api/campaign/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 2500000)
+        self.assertFalse(count_queries(queries, 'charity_api_campaign'))
+
+        # Filtered changelists count, up to the cap
+        response = self.client.get('/admin/charity_api/campaign/', {'organization__id__exact': self.first.pk})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_delete_actions_soft_delete(self):
+        since = ChangeLogEntry.objects.order_by('-pk').values_list('pk', flat=True).first()
+        response = self.client.post('/admin/charity_api/campaign/', {
+            'action': 'soft_delete_selected', '_selected_action': [self.campaigns[0].pk],
+        }, follow=True)
+        self.assertContains(response, 'Deleted 1 campaigns')
+        self.assertEqual(list(Campaign.objects.all()), [self.campaigns[1]])
+        self.assertIsNotNone(Campaign.all_objects.get(pk=self.campaigns[0].pk).deleted_at)
+        self.assertFalse(Beneficiary.objects.exists())
+        self.assertEqual(
+            set(ChangeLogEntry.objects.filter(pk__gt=since).values_list('model_name', 'action')),
+            {('campaign', 'delete'), ('beneficiary', 'delete')},
+        )
+
+        # The delete page hides the row too
+        self.client.post(f'/admin/charity_api/campaign/{self.campaigns[1].pk}/delete/', {'post': 'yes'})
+        self.assertFalse(Campaign.objects.exists())
+        self.assertEqual(Campaign.all_objects.count(), 2)
+
+    def test_deactivate_and_activate_actions(self):
+        url = '/admin/charity_api/organization/'
+        since = ChangeLogEntry.objects.order_by('-pk').values_list('pk', flat=True).first()
+        self.client.post(url, {'action': 'deactivate', '_selected_action': [self.first.pk, self.second.pk]})
+        self.assertFalse(Organization.objects.filter(is_active=True).exists())
+        response = self.client.post(url, {'action': 'activate', '_selected_action': [self.first.pk]}, follow=True)
+        self.assertContains(response, '1 organizations activated.')
+        self.assertEqual(list(Organization.objects.filter(is_active=True)), [self.first])
+        self.assertEqual(
+            ChangeLogEntry.objects.filter(pk__gt=since, model_name='organization', action='upsert').count(), 3
+        )
+
+
+class BatchTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.organization = Organization.objects.create(name='Test Org', email='org@example.com')
+
+    def batch(self, *requests):
+        response = self.client.post('/api/batch/', {'requests': list(requests)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['responses']
+
+    def test_results_follow_request_order(self):
+        responses = self.batch(
+            {'path': f'/api/organizations/{self.organization.pk}/'},
+            {'path': '/api/organizations/0/'},
+            {'path': '/api/campaigns/'},
+        )
+        self.assertEqual([response['status'] for response in responses], [200, 404, 200])
+        self.assertEqual(responses[0]['body']['name'], 'Test Org')
+        self.assertIn('ETag', responses[0]['headers'])
+
+    def test_reads_see_writes_listed_before_them(self):
+        responses = self.batch(
+            {'path': '/api/organizations/?search=Second'},
+            {'method': 'POST', 'path': '/api/organizations/', 'body': {'name': 'Second Org', 'email': 'second@example.com'}},
+            {'path': '/api/organizations/?search=Second'},
+        )
+        self.assertEqual([response['status'] for response in responses], [200, 201, 200])
+        self.assertEqual(responses[0]['body']['count'], 0)
+        self.assertEqual(responses[2]['body']['count'], 1)
+
+    def test_rejects_nested_and_non_api_requests(self):
+        responses = self.batch(
+            {'method': 'POST', 'path': '/api/batch/', 'body': {'requests': [{'path': '/api/campaigns/'}]}},
+            {'path': '/admin/'},
+        )
+        self.assertEqual([response['status'] for response in responses], [400, 400])
+
+    def test_rejects_invalid_batches(self):
+        for requests in ([], [{'path': '/api/campaigns/', 'headers': {'Cookie': 'sessionid=x'}}],
+                         [{'path': '/api/campaigns/', 'method': 'TRACE'}]):
+            response = self.client.post('/api/batch/', {'requests': requests}, format='json')
+            self.assertEqual(response.status_code, 400)
+        with override_settings(BATCH_MAX_REQUESTS=2):
+            response = self.client.post('/api/batch/', {'requests': [{'path': '/api/campaigns/'}] * 3}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+
+class TokenTests(TestCase):
+    def setUp(self):
+        principals.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.charity = {'name': 'Test Charity', 'category': 'health'}
+
+    def basic(self):
+        return 'Basic ' + base64.b64encode(b'admin:password').decode()
+
+    def token(self, **body):
+        self.client.credentials(HTTP_AUTHORIZATION=self.basic())
+        response = self.client.post('/api/token/', body, format='json')
+        self.client.credentials()
+        self.assertEqual(response.status_code, 200)
+        return response.data['token']
+
+    def post_charity(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.client.post('/api/charities/', self.charity, format='json')
+
+    def test_token_authenticates_without_queries(self):
+        token = self.token()
+        self.post_charity(token)
+        principals.get(self.admin.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/charities/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries if 'auth_user' in query['sql']])
+
+    def test_read_scope_cannot_write(self):
+        self.assertEqual(self.post_charity(self.token(scopes=['read'])).status_code, 403)
+        self.assertEqual(self.post_charity(self.token(scopes=['write'])).status_code, 201)
+
+    def test_expired_and_revoked_tokens_are_rejected(self):
+        expired = signing.dumps(
+            {'u': self.admin.pk, 's': ['read', 'write'], 'e': int(time.time()) - 1, 'k': password_stamp(self.admin)},
+            salt=tokens.SALT,
+        )
+        self.assertEqual(self.post_charity(expired).status_code, 401)
+        self.assertEqual(self.post_charity(expired[:-2] + 'xx').status_code, 401)
+
+        token = self.token()
+        self.admin.set_password('changed')
+        self.admin.save()
+        self.assertEqual(self.post_charity(token).status_code, 401)
+
+    def test_batch_cannot_mint_tokens_with_a_bearer_token(self):
+        token = self.token(expires_in=60)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.post('/api/token/', {}, format='json').status_code, 401)
+
+        response = self.client.post('/api/batch/', {'requests': [
+            {'method': 'POST', 'path': '/api/token/', 'body': {'expires_in': settings.API_TOKEN_MAX_LIFETIME}},
+            {'method': 'POST', 'path': '/api/charities/', 'body': self.charity},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        first, second = response.data['responses']
+        self.assertEqual(first['status'], 401)
+        self.assertNotIn('token', first['body'])
+        self.assertEqual(second['status'], 201)
+
+    def test_batch_keeps_token_scopes(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token(scopes=['read'])}")
+        response = self.client.post('/api/batch/', {'requests': [
+            {'method': 'POST', 'path': '/api/charities/', 'body': self.charity},
+        ]}, format='json')
+        self.assertEqual(response.data['responses'][0]['status'], 403)
+
+    def test_basic_batch_can_request_a_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=self.basic())
+        response = self.client.post('/api/batch/', {'requests': [
+            {'method': 'POST', 'path': '/api/token/', 'body': {'scopes': ['read']}},
+        ]}, format='json')
+        self.assertEqual(response.data['responses'][0]['status'], 200)
+        self.assertEqual(response.data['responses'][0]['body']['scopes'], ['read'])
+
+
+class RelationshipQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        campaign = Campaign.objects.create(
+            organization=self.organization, title='Test Campaign', description='Test',
+            goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+        )
+        for number in range(12):
+            Beneficiary.objects.create(
+                campaign=campaign, first_name=f'First{number}', last_name='Last', needs_description='Food',
+            )
+
+    def query(self, **body):
+        return self.client.post('/api/query/', {'resource': 'organizations', **body}, format='json')
+
+    def test_nested_lists_default_to_the_limit(self):
+        response = self.query(expand={'campaigns': {'expand': {'beneficiaries': {'fields': ['id']}}}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results'][0]['campaigns'][0]['beneficiaries']), 10)
+
+    def test_rejects_queries_over_the_row_cap(self):
+        expand = {'campaigns': {'expand': {'beneficiaries': {'limit': 100}}}}
+        self.assertEqual(self.query(limit=1, expand=expand).status_code, 200)
+        self.assertEqual(self.query(expand=expand).status_code, 400)
+        self.assertEqual(self.query(expand={'campaigns': {'expand': {'organization': {'limit': 1}}}}).status_code, 400)
+
+
+class CompressionTests(TestCase):
+    def page(self):
+        return HttpResponse('<p>' + 'reflected input ' * 100 + '</p>', content_type='text/html')
+
+    def test_compresses_pages_without_secrets(self):
+        response = compress_response(self.page(), 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_leaves_pages_with_secrets_uncompressed(self):
+        with_cookie = self.page()
+        with_cookie.set_cookie(settings.CSRF_COOKIE_NAME, 'token')
+        per_session = self.page()
+        patch_vary_headers(per_session, ['Cookie'])
+        for response in (with_cookie, per_session):
+            self.assertFalse(compress_response(response, 'gzip').has_header('Content-Encoding'))
+
+        response = self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/organizations.csv'
+        with open(self.path, 'w') as handle:
+            handle.write('name,email\n')
+            for number in range(5):
+                handle.write(f'Org {number},org{number}@example.com\n')
+
+    def test_import_logs_created_rows(self):
+        state = import_file(self.path, 'organizations', workers=1, batch_size=2)
+        self.assertEqual((state['created'], state['rejected'], state['done']), (5, 0, True))
+        pks = set(Organization.objects.values_list('pk', flat=True))
+        self.assertEqual(len(pks), 5)
+        logged = ChangeLogEntry.objects.filter(model_name='organization', action='upsert')
+        self.assertEqual(set(logged.values_list('object_id', flat=True)), pks)
+
+    def test_resume_after_a_failed_batch_inserts_every_row_once(self):
+        calls = 0
+        original = importer.save_checkpoint
+
+        def fail_second_batch(checkpoint, state):
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                raise OSError('Interrupted')
+            original(checkpoint, state)
+
+        with mock.patch.object(importer, 'save_checkpoint', fail_second_batch):
+            with self.assertRaises(OSError):
+                import_file(self.path, 'organizations', workers=1, batch_size=2)
+        self.assertEqual(Organization.objects.count(), 2)
+
+        state = import_file(self.path, 'organizations', workers=1, batch_size=2)
+        self.assertEqual((state['rows'], state['created'], state['done']), (5, 5, True))
+        self.assertEqual(
+            sorted(Organization.objects.values_list('name', flat=True)), [f'Org {number}' for number in range(5)]
+        )
+
+    def test_keep_ids_moves_the_sequence_past_imported_ids(self):
+        with open(self.path, 'w') as handle:
+            handle.write('id,name,email\n500,Kept,kept@example.com\n')
+        state = import_file(self.path, 'organizations', workers=1, keep_ids=True)
+        self.assertEqual(state['created'], 1)
+        self.assertGreater(Organization.objects.create(name='New', email='new@example.com').pk, 500)
+
+    def test_imported_beneficiaries_are_matched_for_duplicates(self):
+        organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        campaign = Campaign.objects.create(
+            organization=organization, title='Test Campaign', description='Test',
+            goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+        )
+        existing = Beneficiary.objects.create(
+            campaign=campaign, first_name='John', last_name='Smith', email='john@example.com',
+            needs_description='Food',
+        )
+        with open(self.path, 'w') as handle:
+            handle.write('campaign,first_name,last_name,email,needs_description\n')
+            handle.write(f'{campaign.pk},Jon,Smyth,John+aid@example.com,Food\n')
+            handle.write(f'{campaign.pk},Maria,Garcia,maria@example.com,Shelter\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            state = import_file(self.path, 'beneficiaries', workers=1)
+        self.assertEqual(state['created'], 2)
+        imported = Beneficiary.objects.get(first_name='Jon')
+        self.assertEqual(
+            list(BeneficiaryMatch.objects.values_list('beneficiary_id', 'other_id')), [(existing.pk, imported.pk)]
+        )
+
+
+@override_settings(DEDUPE_ON_SAVE=False)
+class DedupeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        organization = Organization.objects.create(name='Test Org', email='org@example.com')
+        campaigns = [
+            Campaign.objects.create(
+                organization=organization, title=f'Campaign {number}', description='Test',
+                goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+            )
+            for number in range(2)
+        ]
+        self.john = Beneficiary.objects.create(
+            campaign=campaigns[0], first_name='John', last_name='Smith', email='john.smith+aid@example.com',
+            phone='+44 7700 900123', date_of_birth=date(1980, 5, 1), needs_description='Food',
+        )
+        self.jon = Beneficiary.objects.create(
+            campaign=campaigns[1], first_name='Jon', last_name='Smyth', email='John.Smith@example.com',
+            phone='07700 900123', date_of_birth=date(1980, 5, 1), needs_description='Food',
+        )
+        self.other = Beneficiary.objects.create(
+            campaign=campaigns[1], first_name='Mary', last_name='Jones', email='mary@example.com',
+            date_of_birth=date(1980, 5, 1), needs_description='Food',
+        )
+
+    def test_scores_spelling_variants_above_different_people(self):
+        self.assertEqual(soundex('Smyth'), soundex('Smith'))
+        same, reasons = score_pair(self.john, self.jon)
+        different, _ = score_pair(self.john, self.other)
+        self.assertGreaterEqual(same, settings.DEDUPE_THRESHOLD)
+        self.assertLess(different, settings.DEDUPE_THRESHOLD)
+        self.assertIn('email', reasons)
+        self.assertIn('phone', reasons)
+
+    def test_reruns_report_only_new_matches(self):
+        self.assertEqual(find_duplicates()['matches'], 1)
+        self.assertEqual(find_duplicates()['matches'], 0)
+        self.assertEqual(BeneficiaryMatch.objects.count(), 1)
+
+    def test_payment_is_refused_while_duplicates_are_pending(self):
+        find_duplicates()
+        url = f'/api/beneficiaries/{self.john.pk}/update_amount_received/'
+        response = self.client.post(url, {'amount': 100}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['possible_duplicates'], [self.jon.pk])
+        self.john.refresh_from_db()
+        self.assertEqual(self.john.amount_received, 0)
+
+        response = self.client.post(url, {'amount': 100, 'allow_duplicates': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.john.refresh_from_db()
+        self.assertEqual(self.john.amount_received, 100)
+
+        BeneficiaryMatch.objects.update(status='dismissed')
+        self.assertEqual(self.client.post(url, {'amount': 50}, format='json').status_code, 200)
+
+
+class LoadTestReportTests(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('read=60, search=40'), {'read': 60.0, 'search': 40.0})
+        self.assertEqual(parse_mix('donate'), {'donate': 1.0})
+        for text in ('browse=10', 'read=-1', 'read=0,list=0', 'read=x'):
+            with self.assertRaises(ValueError):
+                parse_mix(text)
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1.0), 100)
+        self.assertEqual(percentile([7.123], 0.95), 7.12)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_summarize_merges_generator_processes(self):
+        parts = [
+            {'latencies': {'read': [10, 30]}, 'errors': {'read': {'timeout': 1}}},
+            {'latencies': {'read': [20]}, 'errors': {'donate': {'status 500': 2}}},
+        ]
+        step = summarize(8, 2.0, parts)
+        self.assertEqual((step['concurrency'], step['requests'], step['throughput']), (8, 6, 1.5))
+        self.assertEqual(step['p50_ms'], 20)
+        self.assertEqual(step['error_rate'], 0.5)
+        self.assertEqual(step['errors'], {'timeout': 1, 'status 500': 2})
+        self.assertEqual(step['operations']['read']['requests'], 4)
+        # An operation whose every request failed is still reported
+        self.assertEqual(step['operations']['donate']['requests'], 2)
+        self.assertEqual(step['operations']['donate']['error_rate'], 1.0)
+
+    def test_find_knee(self):
+        steps = [{'concurrency': c, 'throughput': t} for c, t in [(1, 100), (2, 190), (4, 360), (8, 380), (16, 370)]]
+        self.assertEqual(find_knee(steps), 4)
+        self.assertIsNone(find_knee(steps[:3]))
+        self.assertIsNone(find_knee([]))
+
+
+# The cache is bypassed inside transactions, which TestCase wraps every test in
+class QueryCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        query_cache.clear()
+        Organization.objects.create(name='Test Org', email='org@example.com')
+
+    def test_off_without_shared_cache(self):
+        list(Organization.objects.cached())
+        with self.assertNumQueries(1):
+            self.assertEqual(len(Organization.objects.cached()), 1)
+        self.assertFalse(query_cache.stats()['enabled'])
+
+    @override_settings(SHARED_CACHE=True)
+    def test_rows_reused_until_a_write(self):
+        list(Organization.objects.cached())
+        with self.assertNumQueries(0):
+            self.assertEqual(len(Organization.objects.cached()), 1)
+
+        Organization.objects.create(name='Second Org', email='second@example.com')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(Organization.objects.cached()), 2)
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/test.snapshot'
+        self.organization = Organization.objects.create(name='Hilfe für Kinder', email='org@example.com')
+        self.campaign = Campaign.objects.create(
+            organization=self.organization, title='Winter Appeal', description='Coats\nand boots',
+            goal_amount='1234.56', raised_amount='10.05', start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+            latitude=52.52, longitude=13.405,
+        )
+        for number in range(3):
+            Beneficiary.objects.create(
+                campaign=self.campaign, first_name=f'First{number}', last_name='Last', needs_description='Food',
+                date_of_birth=date(1980, 1, number + 1) if number else None, is_active=bool(number),
+            )
+
+    def rows(self):
+        return {
+            model: list(model._base_manager.order_by('pk').values_list())
+            for model in (Organization, Campaign, Beneficiary, ChangeLogEntry)
+        }
+
+    def test_restore_brings_back_the_exported_rows(self):
+        before = self.rows()
+        counts = export_snapshot(self.path, coding='gzip', chunk_size=2)
+        self.assertEqual(counts['charity_api.beneficiary'], 3)
+
+        Beneficiary.objects.filter(first_name='First0').delete()
+        Organization.objects.filter(pk=self.organization.pk).update(name='Renamed')
+        Organization.objects.create(name='Added Org', email='added@example.com')
+
+        restored = restore_snapshot(self.path)
+        self.assertEqual(restored, counts)
+        self.assertEqual(self.rows(), before)
+        # Sequences continue after the restored ids
+        added = Organization.objects.create(name='New Org', email='new@example.com')
+        self.assertGreater(added.pk, self.organization.pk)
+
+    def test_refuses_a_database_migrated_differently(self):
+        export_snapshot(self.path, coding='gzip')
+        MigrationRecorder.Migration.objects.filter(app='charity_api').order_by('-id').first().delete()
+        with self.assertRaises(ValueError):
+            restore_snapshot(self.path)
+
+
+# Isolated tenants need database aliases configured at startup: run in a fresh process
+ISOLATED_TENANT_SETUP = """
+import json, os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
+import django
+django.setup()
+from datetime import date
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from charity_api.models import Beneficiary, Campaign, ChangeLogEntry, Organization
+from charity_api.tenancy import move_tenant, use_tenant
+call_command('migrate', verbosity=0)
+client = APIClient(HTTP_HOST='localhost')
+organization = Organization.objects.create(name='Isolated Org', email='isolated@example.com')
+campaign = Campaign.objects.create(
+    organization=organization, title='Isolated Campaign', description='Test',
+    goal_amount=1000, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+)
+beneficiary = Beneficiary.objects.create(campaign=campaign, first_name='First', last_name='Last', needs_description='Food')
+move_tenant(organization.pk)
+"""
+
+
+def run_with_isolated_tenant(script):
+    """Run script after ISOLATED_TENANT_SETUP with organization 1 isolated; returns what it prints last, as JSON"""
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ, 'DATABASE_NAME': f'{directory}/db.sqlite3',
+            'TENANT_DATABASES': '1', 'TENANT_DATABASE_DIR': f'{directory}/tenants',
+        }
+        result = subprocess.run(
+            [sys.executable, '-c', ISOLATED_TENANT_SETUP + script],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+    if result.returncode:
+        raise AssertionError(result.stderr)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+class IsolatedTenantTests(TestCase):
+    def test_change_feed_delivers_isolated_tenant_upserts(self):
+        changes = run_with_isolated_tenant("""
+since = ChangeLogEntry.objects.order_by('-pk').values_list('pk', flat=True).first()
+with use_tenant(organization.pk):
+    campaign = Campaign.objects.get()
+    campaign.title = 'Renamed'
+    campaign.save()
+print(json.dumps(client.get(f'/api/changes/?since={since}').json()['changes']))
+""")
+        self.assertEqual(len(changes), 1)
+        self.assertEqual((changes[0]['model'], changes[0]['action']), ('campaign', 'upsert'))
+        self.assertEqual(changes[0]['data']['title'], 'Renamed')
+
+    def test_purge_removes_the_rows_of_an_isolated_organization(self):
+        result = run_with_isolated_tenant("""
+from charity_api.archive import purge_deleted, soft_delete
+soft_delete(organization)
+purge_deleted()
+with use_tenant(organization.pk):
+    left = [Campaign.all_objects.count(), Beneficiary.all_objects.count()]
+left.append(Organization.all_objects.using('tenant_1').count())
+left.append(Organization.all_objects.count())
+deleted = sorted(ChangeLogEntry.objects.filter(action='delete').values_list('model_name', flat=True))
+print(json.dumps({'left': left, 'deleted': deleted}))
+""")
+        self.assertEqual(result['left'], [0, 0, 0, 0])
+        self.assertEqual(result['deleted'], ['beneficiary', 'campaign', 'organization'])
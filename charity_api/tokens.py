@@ -0,0 +1,133 @@
+"""
+Stateless bearer tokens for the API.
+
+A token is a signed payload (``django.core.signing``: HMAC-SHA256 keyed by
+``SECRET_KEY``) carrying the user id, the token's scopes, its expiry and a
+stamp of the user's password hash. Verifying one needs no database: the
+user it names comes from ``principals``, an in-process LRU of resolved users
+with their permissions loaded, so ``IsAdminUser`` and ``has_perm`` checks
+cost nothing either. A cached user is reloaded after
+``API_TOKEN_PRINCIPAL_SECONDS``, or at once when it is saved in this
+process. Changing the password invalidates the user's tokens.
+
+Scopes: ``read`` allows safe methods (and read-only POST endpoints such as
+``/api/query/``), ``write`` everything else.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils.crypto import salted_hmac
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
+from rest_framework.permissions import SAFE_METHODS
+
+SALT = 'charity_api.tokens'
+SCOPES = ('read', 'write')
+
+
+def password_stamp(user):
+    """Short digest of the user's password hash; a new password changes it"""
+    return salted_hmac(SALT, user.password, algorithm='sha256').hexdigest()[:16]
+
+
+def issue_token(user, scopes=SCOPES, lifetime=None):
+    """Signed token for user; returns (token, expiry timestamp)"""
+    lifetime = lifetime or getattr(settings, 'API_TOKEN_LIFETIME', 3600)
+    expires = int(time.time()) + lifetime
+    payload = {'u': user.pk, 's': list(scopes), 'e': expires, 'k': password_stamp(user)}
+    return signing.dumps(payload, salt=SALT), expires
+
+
+def read_token(token):
+    """Claims of a valid, unexpired token ({'user', 'scopes', 'expires', 'stamp'}), or raise AuthenticationFailed"""
+    try:
+        payload = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        raise AuthenticationFailed('Invalid token.')
+    if payload['e'] <= time.time():
+        raise AuthenticationFailed('Token has expired.')
+    return {'user': payload['u'], 'scopes': payload['s'], 'expires': payload['e'], 'stamp': payload['k']}
+
+
+def required_scope(method, view=None):
+    return getattr(view, 'token_scope', None) or ('read' if method in SAFE_METHODS else 'write')
+
+
+def check_scope(claims, method, view=None):
+    """Raise PermissionDenied when a token's scopes do not cover a request"""
+    scope = required_scope(method, view)
+    if isinstance(claims, dict) and 'scopes' in claims and scope not in claims['scopes']:
+        raise PermissionDenied(f"This token lacks the '{scope}' scope.")
+
+
+class PrincipalCache:
+    """
+    Users by id, loaded with their permissions, least recently used first
+    out. Holds at most ``API_TOKEN_PRINCIPAL_CACHE_SIZE`` users (and
+    misses, as None) for ``API_TOKEN_PRINCIPAL_SECONDS`` each.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+
+        user = get_user_model()._default_manager.filter(pk=user_id, is_active=True).first()
+        if user is not None:
+            # Fills the auth backend's permission caches on the instance
+            user.get_all_permissions()
+
+        lifetime = getattr(settings, 'API_TOKEN_PRINCIPAL_SECONDS', 60)
+        with self._lock:
+            self._entries[user_id] = (user, now + lifetime)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > getattr(settings, 'API_TOKEN_PRINCIPAL_CACHE_SIZE', 10000):
+                self._entries.popitem(last=False)
+        return user
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principals = PrincipalCache()
+
+
+class BearerTokenAuthentication(BaseAuthentication):
+    """``Authorization: Bearer <token>``; ``request.auth`` is the token's claims"""
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise AuthenticationFailed('Invalid bearer token header.')
+        try:
+            claims = read_token(header[1].decode('ascii'))
+        except UnicodeDecodeError:
+            raise AuthenticationFailed('Invalid token.')
+
+        user = principals.get(claims['user'])
+        if user is None or password_stamp(user) != claims['stamp']:
+            raise AuthenticationFailed('Token is no longer valid.')
+        check_scope(claims, request.method, request.parser_context.get('view'))
+        return user, claims
+
+    def authenticate_header(self, request):
+        return f'{self.keyword} realm="api"'
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrganizationViewSet, CampaignViewSet, BeneficiaryViewSet, CharityListCreateView
+from .views import OrganizationViewSet, CampaignViewSet, BeneficiaryViewSet, BeneficiaryMatchViewSet, CharityListCreateView, ChangeFeedView, AutocompleteView, AnalyticsView, ReportView, QueryCacheView, BatchView, QueryView, TokenView
 from .api_root import api_root
 
 # Create a router and register our viewsets
@@ -8,10 +8,20 @@ router = DefaultRouter()
 router.register(r'organizations', OrganizationViewSet, basename='organization')
 router.register(r'campaigns', CampaignViewSet, basename='campaign')
 router.register(r'beneficiaries', BeneficiaryViewSet, basename='beneficiary')
+router.register(r'duplicates', BeneficiaryMatchViewSet, basename='duplicate')
 
 # The API URLs are determined automatically by the router
 urlpatterns = [
     path('', api_root, name='api-root'),
     path('charities/', CharityListCreateView.as_view(), name='charity-list'),
+    path('changes/', ChangeFeedView.as_view(), name='change-feed'),
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('analytics/<str:metric>/', AnalyticsView.as_view(), name='analytics-metric'),
+    path('reports/', ReportView.as_view(), name='reports'),
+    path('query-cache/', QueryCacheView.as_view(), name='query-cache'),
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('query/', QueryView.as_view(), name='query'),
+    path('token/', TokenView.as_view(), name='token'),
     path('', include(router.urls)),
 ]
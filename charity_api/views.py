@@ -1,22 +1,51 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics
-from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from .models import Organization, Campaign, Beneficiary, Charity
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
+from .analytics import INTERVALS, METRICS, time_series
+from .archive import IncludeArchivedMixin, SoftDeleteMixin
+from .autocomplete import index as autocomplete_index
+from .batch import parse_requests, run_batch
+from .conditional import ConditionalGetMixin
+from .dedupe import possible_duplicates
+from .expand import parse_query, run_query
+from .facets import FacetMixin
+from .filters import NearFilter
+from .models import (
+    Organization, Campaign, Beneficiary, BeneficiaryMatch, Charity, ChangeLogEntry, ArchivedCampaign,
+    ArchivedBeneficiary,
+)
+from .querycache import CachedQueryMixin, query_cache
+from .reporting import build_report
+from .tenancy import TenantScopedMixin, request_tenant, tenant_databases, use_tenant
+from .tokens import SCOPES, issue_token
 from .serializers import (
     OrganizationSerializer,
     OrganizationDetailSerializer,
     CampaignSerializer,
     CampaignDetailSerializer,
     BeneficiarySerializer,
+    BeneficiaryMatchSerializer,
     CharitySerializer,
+    ArchivedCampaignSerializer,
+    ArchivedBeneficiarySerializer,
 )
 
 
-class OrganizationViewSet(viewsets.ModelViewSet):
+class OrganizationViewSet(CachedQueryMixin, SoftDeleteMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     🏢 **Organization Management**
     
@@ -61,6 +90,9 @@ class OrganizationViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at', 'established_date']
     ordering = ['-created_at']
 
+    # Relations whose changes show up in list/detail payloads (for ETags)
+    conditional_related = ('campaigns', 'campaigns__beneficiaries')
+
     def get_serializer_class(self):
         """Use detailed serializer for retrieve action"""
         if self.action == 'retrieve':
@@ -84,7 +116,7 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         Get all active organizations
         /api/organizations/active/
         """
-        active_orgs = self.queryset.filter(is_active=True)
+        active_orgs = self.get_queryset().filter(is_active=True)
         page = self.paginate_queryset(active_orgs)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -93,7 +125,7 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class CampaignViewSet(viewsets.ModelViewSet):
+class CampaignViewSet(CachedQueryMixin, TenantScopedMixin, IncludeArchivedMixin, SoftDeleteMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     🎯 **Campaign Management**
     
@@ -119,7 +151,10 @@ class CampaignViewSet(viewsets.ModelViewSet):
     - **Filter by Status**: `?status=active` (planning, active, completed, cancelled)
     - **Filter by Organization**: `?organization=1`
     - **Filter by Date**: `?start_date=2024-01-01`
+    - **Near a Point**: `?near=52.52,13.40&radius=50` (radius in km)
     - **Order By**: `?ordering=-start_date`
+    - **Archived Campaigns**: `?include_archived=1` (listed after live ones)
+    - **One Organization**: header `X-Organization: 1` scopes every request to it
     
     ### 🔗 Special Endpoints:
     - Active Campaigns: `/api/campaigns/active/`
@@ -128,7 +163,7 @@ class CampaignViewSet(viewsets.ModelViewSet):
     """
     queryset = Campaign.objects.select_related('organization').all()
     serializer_class = CampaignSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter, NearFilter]
     
     # Search fields
     search_fields = ['title', 'description', 'location', 'organization__name']
@@ -140,6 +175,14 @@ class CampaignViewSet(viewsets.ModelViewSet):
     ordering_fields = ['title', 'created_at', 'start_date', 'end_date', 'goal_amount', 'raised_amount']
     ordering = ['-created_at']
 
+    # Relations whose changes show up in list/detail payloads (for ETags)
+    conditional_related = ('organization', 'beneficiaries')
+    archive_model = ArchivedCampaign
+    archive_serializer_class = ArchivedCampaignSerializer
+
+    def get_archive_queryset(self):
+        return self.scope_to_tenant(ArchivedCampaign.objects.select_related('organization'))
+
     def get_serializer_class(self):
         """Use detailed serializer for retrieve action"""
         if self.action == 'retrieve':
@@ -163,7 +206,7 @@ class CampaignViewSet(viewsets.ModelViewSet):
         Get all active campaigns
         /api/campaigns/active/
         """
-        active_campaigns = self.queryset.filter(status='active')
+        active_campaigns = self.get_queryset().filter(status='active')
         page = self.paginate_queryset(active_campaigns)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -188,7 +231,7 @@ class CampaignViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            amount = float(amount)
+            amount = Decimal(str(amount))
             if amount < 0:
                 raise ValueError("Amount must be positive")
             
@@ -196,14 +239,14 @@ class CampaignViewSet(viewsets.ModelViewSet):
             campaign.save()
             serializer = self.get_serializer(campaign)
             return Response(serializer.data)
-        except (ValueError, TypeError) as e:
+        except (ValueError, TypeError, InvalidOperation) as e:
             return Response(
                 {'error': f'Invalid amount: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
 
-class BeneficiaryViewSet(viewsets.ModelViewSet):
+class BeneficiaryViewSet(TenantScopedMixin, IncludeArchivedMixin, SoftDeleteMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     👥 **Beneficiary Management**
     
@@ -229,10 +272,13 @@ class BeneficiaryViewSet(viewsets.ModelViewSet):
     - **Filter by Campaign**: `?campaign=1`
     - **Filter Active**: `?is_active=true`
     - **Order By**: `?ordering=last_name`
+    - **Archived Beneficiaries**: `?include_archived=1` (listed after live ones)
+    - **One Organization**: header `X-Organization: 1` scopes every request to it
     
     ### 🔗 Special Endpoints:
     - Active Beneficiaries: `/api/beneficiaries/active/`
     - Update Amount Received: `POST /api/beneficiaries/{id}/update_amount_received/`
+      (the response lists `possible_duplicates`: check them before paying again)
     """
     queryset = Beneficiary.objects.select_related('campaign', 'campaign__organization').all()
     serializer_class = BeneficiarySerializer
@@ -248,13 +294,25 @@ class BeneficiaryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['first_name', 'last_name', 'created_at', 'amount_received']
     ordering = ['-created_at']
 
+    # Relations whose changes show up in list/detail payloads (for ETags)
+    conditional_related = ('campaign',)
+    # Searches join campaigns; counting all matches can cost more than the page
+    count_mode = 'capped'
+    # A beneficiary's tenant is its campaign's organization
+    tenant_write_field = 'campaign'
+    archive_model = ArchivedBeneficiary
+    archive_serializer_class = ArchivedBeneficiarySerializer
+
+    def get_archive_queryset(self):
+        return self.scope_to_tenant(ArchivedBeneficiary.objects.all())
+
     @action(detail=False, methods=['get'])
     def active(self, request):
         """
         Get all active beneficiaries
         /api/beneficiaries/active/
         """
-        active_beneficiaries = self.queryset.filter(is_active=True)
+        active_beneficiaries = self.get_queryset().filter(is_active=True)
         page = self.paginate_queryset(active_beneficiaries)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -268,6 +326,8 @@ class BeneficiaryViewSet(viewsets.ModelViewSet):
         Update the amount received by a beneficiary
         POST /api/beneficiaries/{id}/update_amount_received/
         Body: {"amount": 500.00}
+        Refused (409) while the beneficiary has unreviewed or confirmed
+        duplicates, unless the body also has "allow_duplicates": true
         """
         beneficiary = self.get_object()
         amount = request.data.get('amount')
@@ -279,22 +339,85 @@ class BeneficiaryViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            amount = float(amount)
+            amount = Decimal(str(amount))
             if amount < 0:
                 raise ValueError("Amount must be positive")
-            
+
+            # Before paying: the same person may already be paid under another campaign
+            duplicates = possible_duplicates(beneficiary)
+            if duplicates and request.data.get('allow_duplicates') is not True:
+                return Response(
+                    {'error': 'This beneficiary has possible duplicates; review them or send "allow_duplicates": true',
+                     'possible_duplicates': duplicates},
+                    status=status.HTTP_409_CONFLICT
+                )
             beneficiary.amount_received += amount
-            beneficiary.save()
+            # Payments do not change the fields duplicates are matched on
+            beneficiary.save(update_fields=['amount_received', 'updated_at'])
             serializer = self.get_serializer(beneficiary)
-            return Response(serializer.data)
-        except (ValueError, TypeError) as e:
+            return Response({**serializer.data, 'possible_duplicates': duplicates})
+        except (ValueError, TypeError, InvalidOperation) as e:
             return Response(
                 {'error': f'Invalid amount: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
 
-class CharityListCreateView(generics.ListCreateAPIView):
+class BeneficiaryMatchViewSet(TenantScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    👯 Possible Duplicate Beneficiaries (admin only)
+
+    - GET /api/duplicates/ — Pairs of beneficiaries that look like the same
+      person, highest score first; `?status=pending` (default), `confirmed`
+      or `dismissed`; `?beneficiary=<id>` for the pairs of one beneficiary
+    - POST /api/duplicates/{id}/review/ — Body: `{"status": "confirmed"}`
+      (same person) or `{"status": "dismissed"}` (different people)
+    """
+    queryset = BeneficiaryMatch.objects.select_related('beneficiary__campaign', 'other__campaign').filter(
+        beneficiary__deleted_at__isnull=True, other__deleted_at__isnull=True,
+    )
+    serializer_class = BeneficiaryMatchSerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['score', 'created_at']
+    ordering = ['-score']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        match_status = self.request.query_params.get('status', 'pending')
+        if match_status not in dict(BeneficiaryMatch.STATUS_CHOICES):
+            raise ValidationError({'status': f"Must be one of: {', '.join(dict(BeneficiaryMatch.STATUS_CHOICES))}"})
+        queryset = queryset.filter(status=match_status)
+        beneficiary = self.request.query_params.get('beneficiary')
+        if beneficiary:
+            if not beneficiary.isdigit():
+                raise ValidationError({'beneficiary': 'Must be a beneficiary id.'})
+            queryset = queryset.filter(Q(beneficiary=beneficiary) | Q(other=beneficiary))
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def review(self, request, pk=None):
+        """
+        Record the outcome of a review
+        POST /api/duplicates/{id}/review/
+        Body: {"status": "confirmed"}
+        """
+        match = self.get_object()
+        new_status = request.data.get('status')
+        if new_status not in dict(BeneficiaryMatch.STATUS_CHOICES):
+            return Response(
+                {'error': f"status must be one of: {', '.join(dict(BeneficiaryMatch.STATUS_CHOICES))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        match.status = new_status
+        match.reviewed_at = None if new_status == 'pending' else timezone.now()
+        match.save(update_fields=['status', 'reviewed_at'])
+        return Response(self.get_serializer(match).data)
+
+
+class CharityListCreateView(CachedQueryMixin, FacetMixin, generics.ListCreateAPIView):
     """
     🌍 Charity Directory
 
@@ -303,12 +426,15 @@ class CharityListCreateView(generics.ListCreateAPIView):
 
     Search: ?search=term (name, category, location)
     Filter: ?category=education&location=City
+    Near: ?near=lat,lon&radius=km
+    Facets: ?facets=category,location (counts per value for the current filters)
     """
     queryset = Charity.objects.all()
     serializer_class = CharitySerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter, NearFilter]
     search_fields = ['name', 'category', 'location']
     filterset_fields = ['category', 'location']
+    facet_fields = ['category', 'location']
     ordering_fields = ['created_at', 'name', 'category']
     ordering = ['-created_at']
     parser_classes = [MultiPartParser, FormParser, JSONParser]
@@ -318,3 +444,323 @@ class CharityListCreateView(generics.ListCreateAPIView):
         if self.request.method == 'POST':
             return [IsAdminUser()]
         return [AllowAny()]
+
+
+class ChangeFeedView(APIView):
+    """
+    🔄 Change Feed
+
+    - GET /api/changes/?since=<token> — Changes after a previously returned token
+
+    Each batch holds at most `limit` log entries (default 500, max 1000),
+    collapsed to the latest change per object. Upserts carry the current
+    representation; deletes are tombstones with only the model and id.
+    Keep calling with the returned `next` token while `has_more` is true.
+
+    Bulk `QuerySet.update()` / `delete()` calls bypass model signals and are
+    not recorded; write through the models (or the logging helpers in
+    `bulk.py`) when clients rely on the feed.
+    """
+    default_limit = 500
+    max_limit = 1000
+    serializer_classes = {
+        'organization': OrganizationSerializer,
+        'campaign': CampaignSerializer,
+        'beneficiary': BeneficiarySerializer,
+        'charity': CharitySerializer,
+    }
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+            if since < 0 or limit < 1:
+                raise ValueError("Values must be positive")
+        except (ValueError, TypeError, InvalidOperation) as e:
+            return Response(
+                {'error': f'Invalid since/limit: {str(e)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        entries = list(
+            ChangeLogEntry.objects.filter(pk__gt=since)
+            .order_by('pk')
+            .values_list('pk', 'model_name', 'object_id', 'action')[:limit + 1]
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        # Keep only the newest entry per object, in log order
+        latest = {}
+        for _token, model_name, object_id, change in entries:
+            latest.pop((model_name, object_id), None)
+            latest[(model_name, object_id)] = change
+
+        # One query per model and database for all upserted objects in the batch
+        # (isolated tenants' rows live in their own database, see tenancy.py)
+        objects = {}
+        for model_name, serializer_class in self.serializer_classes.items():
+            ids = [pk for (name, pk), change in latest.items() if name == model_name and change == 'upsert']
+            model = serializer_class.Meta.model
+            found = objects[model_name] = {}
+            for alias in tenant_databases(model) if ids else []:
+                missing = [pk for pk in ids if pk not in found]
+                if not missing:
+                    break
+                found.update(model._base_manager.using(alias).in_bulk(missing))
+
+        changes = []
+        for (model_name, object_id), change in latest.items():
+            if change == 'delete':
+                changes.append({'model': model_name, 'id': object_id, 'action': 'delete'})
+                continue
+            instance = objects.get(model_name, {}).get(object_id)
+            if instance is None:
+                # Deleted after this batch; the tombstone comes in a later one
+                continue
+            serializer = self.serializer_classes[model_name](instance, context={'request': request})
+            changes.append({'model': model_name, 'id': object_id, 'action': 'upsert', 'data': serializer.data})
+
+        return Response({
+            'next': entries[-1][0] if entries else since,
+            'has_more': has_more,
+            'changes': changes,
+        })
+
+
+class AutocompleteView(APIView):
+    """
+    🔤 Name Autocomplete
+
+    - GET /api/autocomplete/?q=hope — Organizations and charities whose names
+      start with (or closely resemble) the query, most popular first
+
+    Optional: `limit` (default 10, max 50), `types=organization,charity`.
+    Served from an in-memory index, not a table scan.
+    """
+    default_limit = 10
+    max_limit = 50
+    types = ('organization', 'charity')
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+            if limit < 1:
+                raise ValueError("Limit must be positive")
+        except (ValueError, TypeError, InvalidOperation) as e:
+            return Response(
+                {'error': f'Invalid limit: {str(e)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        kinds = None
+        if request.query_params.get('types'):
+            kinds = {kind.strip() for kind in request.query_params['types'].split(',')}
+            unknown = kinds - set(self.types)
+            if unknown:
+                return Response(
+                    {'error': f"Unknown types: {', '.join(sorted(unknown))}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        results = autocomplete_index.search(query, limit=limit, kinds=kinds) if query else []
+        return Response({'query': query, 'results': results})
+
+
+class AnalyticsView(APIView):
+    """
+    📈 Analytics
+
+    - GET /api/analytics/ — Available metrics
+    - GET /api/analytics/{metric}/ — Bucketed time series for a metric
+
+    Metrics: `raised` (amount added to campaigns), `new_beneficiaries`,
+    `status_transitions` (one series per target status).
+
+    Options: `interval=day|week|month`, `start=YYYY-MM-DD`, `end=YYYY-MM-DD`
+    (default: the last 365 days), `organization=1`, `campaign=1`,
+    `group_by=organization`.
+    """
+
+    def get(self, request, metric=None):
+        if metric is None:
+            return Response({
+                'metrics': {
+                    name: reverse('analytics-metric', kwargs={'metric': name}, request=request)
+                    for name in METRICS
+                },
+                'intervals': INTERVALS,
+            })
+        if metric not in METRICS:
+            return Response(
+                {'error': f"Unknown metric '{metric}'. Available: {', '.join(METRICS)}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        params = request.query_params
+        interval = params.get('interval', 'day')
+        if interval not in INTERVALS:
+            return Response(
+                {'error': f"Invalid interval. Use one of: {', '.join(INTERVALS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = date.fromisoformat(params['start']) if params.get('start') else None
+            end = date.fromisoformat(params['end']) if params.get('end') else None
+            organization = int(params['organization']) if params.get('organization') else None
+            campaign = int(params['campaign']) if params.get('campaign') else None
+        except ValueError as e:
+            return Response(
+                {'error': f'Invalid parameter: {str(e)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start and end and end < start:
+            return Response(
+                {'error': 'End date must be after start date.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        series = time_series(
+            metric,
+            interval=interval,
+            start_day=start,
+            end_day=end,
+            organization=organization,
+            campaign=campaign,
+            group_by_organization=params.get('group_by') == 'organization',
+        )
+        return Response({'metric': metric, 'interval': interval, 'series': series})
+
+
+class ReportView(APIView):
+    """
+    📊 Summary Report (admin only)
+
+    - GET /api/reports/ — Totals by status, goal attainment distribution,
+      progress percentiles and organization ranking
+    - GET /api/reports/?table=organizations — A single table
+
+    Tables are columnar: each is an object of equal-length column arrays.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        report = build_report()
+        table = request.query_params.get('table')
+        if table:
+            if table not in report['tables']:
+                return Response(
+                    {'error': f"Unknown table '{table}'. Available: {', '.join(report['tables'])}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            report['tables'] = {table: report['tables'][table]}
+        return Response(report)
+
+
+class QueryCacheView(APIView):
+    """
+    🗄️ Query Cache Statistics (admin only)
+
+    - GET /api/query-cache/ — Hits, misses, hit ratio, entries and bytes of
+      the query result cache of the worker process answering
+    - DELETE /api/query-cache/ — Empty that worker's cache and reset its counters
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(query_cache.stats())
+
+    def delete(self, request):
+        query_cache.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BatchView(APIView):
+    """
+    📦 Batch Requests
+
+    - POST /api/batch/ — Run several API calls in one round trip
+
+    Body: `{"requests": [{"method": "GET", "path": "/api/campaigns/active/"}, ...]}`;
+    each request may also carry `body` (JSON) and `headers`. Returns
+    `{"responses": [{"status": 200, "headers": {...}, "body": ...}, ...]}` in
+    the same order. Reads run concurrently; a write runs after everything
+    listed before it.
+    """
+    # Sub-requests are checked against the token's scopes one by one
+    token_scope = 'read'
+
+    def post(self, request):
+        try:
+            specs = parse_requests(request.data)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'responses': run_batch(request, specs)})
+
+
+class QueryView(APIView):
+    """
+    🌳 Relationship Query
+
+    - POST /api/query/ — Organizations, campaigns or beneficiaries with the
+      fields and nested relations you choose
+
+    Body: `{"resource": "organizations", "ids": [1], "fields": ["id", "name"],
+    "expand": {"campaigns": {"fields": ["id", "title", "beneficiary_count"],
+    "limit": 5, "expand": {"beneficiaries": {"fields": ["id", "full_name"]}}}}}`
+
+    Relations: organization → `campaigns`, `beneficiaries`; campaign →
+    `organization`, `beneficiaries`; beneficiary → `campaign`. Each level
+    costs one query per relation, whatever the number of rows.
+    """
+    token_scope = 'read'
+
+    def post(self, request):
+        try:
+            type_name, query = parse_query(request.data)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        tenant = request_tenant(request)
+        with use_tenant(tenant):
+            results, queries = run_query(type_name, query, tenant, self.get_serializer_context())
+        return Response({'resource': request.data['resource'], 'queries': queries, 'results': results})
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self}
+
+
+class TokenView(APIView):
+    """
+    🔑 API Tokens
+
+    - POST /api/token/ — Issue a bearer token for the user signing in with HTTP Basic
+
+    Body (optional): `{"scopes": ["read"], "expires_in": 3600}`. Send the token
+    as `Authorization: Bearer <token>`; it is checked without a database query.
+    """
+    authentication_classes = [BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        scopes = request.data.get('scopes', list(SCOPES))
+        if not isinstance(scopes, list) or not scopes or not set(scopes) <= set(SCOPES):
+            return Response(
+                {'error': f"'scopes' must be a non-empty list of: {', '.join(SCOPES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_lifetime = settings.API_TOKEN_MAX_LIFETIME
+        expires_in = request.data.get('expires_in', settings.API_TOKEN_LIFETIME)
+        if not isinstance(expires_in, int) or isinstance(expires_in, bool) or not 0 < expires_in <= max_lifetime:
+            return Response(
+                {'error': f"'expires_in' must be between 1 and {max_lifetime} seconds"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        token, expires = issue_token(request.user, scopes, expires_in)
+        return Response({'token': token, 'token_type': 'Bearer', 'scopes': scopes, 'expires': expires})
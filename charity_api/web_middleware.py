@@ -0,0 +1,51 @@
+"""
+Session, CSRF, authentication and messages middleware for the web pages
+and the admin only.
+
+API requests authenticate per request (bearer tokens or HTTP Basic, see
+``charity_api.tokens``), so under ``/api/`` these middleware are skipped
+entirely: no session lookup, no CSRF cookie, no lazy ``request.user``.
+"""
+from functools import lru_cache
+
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.middleware import csrf
+from django.urls import reverse
+
+
+@lru_cache(maxsize=1)
+def api_prefix():
+    return reverse('api-root')
+
+
+def is_api_request(request):
+    return request.path_info.startswith(api_prefix())
+
+
+class WebOnlyMixin:
+    def __call__(self, request):
+        if is_api_request(request):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(WebOnlyMixin, sessions_middleware.SessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(WebOnlyMixin, csrf.CsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        # Registered with the handler on its own, so __call__ does not cover it
+        if is_api_request(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class AuthenticationMiddleware(WebOnlyMixin, auth_middleware.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(WebOnlyMixin, messages_middleware.MessageMiddleware):
+    pass
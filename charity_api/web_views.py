@@ -1,32 +1,135 @@
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpRequest
 from django.shortcuts import render
+from django.urls import resolve
 from django.views import View
+from django.views.decorators.cache import cache_page
+from rest_framework.renderers import JSONRenderer
 
+from .compression import precompressed
+from .live import stream_path
+
+
+def first_page(request, api_path):
+    """
+    Page 1 of an API list, answered by the API view itself (its queryset,
+    filters and paginator, count mode included) exactly as a browser GET of
+    api_path would be; None unless that is a 200.
+    """
+    match = resolve(api_path)
+    api_request = HttpRequest()
+    api_request.method = 'GET'
+    api_request.path = api_request.path_info = api_path
+    # Anonymous, like the page's own API calls (the page may be cached for everyone);
+    # conditional headers were meant for the page, not the API response
+    api_request.META = {
+        key: value for key, value in request.META.items()
+        if key != 'HTTP_AUTHORIZATION' and not key.startswith('HTTP_IF_')
+    }
+    api_request.META.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': api_path,
+        'QUERY_STRING': '',
+        'HTTP_ACCEPT': 'application/json',
+    })
+    api_request.resolver_match = match
+    response = match.func(api_request, *match.args, **match.kwargs)
+    if response.status_code != 200:
+        return None
+    # Through the API's JSON encoder, so decimals come out as in the response
+    return json.loads(JSONRenderer().render(response.data))
+
+
+def first_pages(request, api_paths):
+    """{api_path: page 1} for those of api_paths the API answers"""
+    pages = {api_path: first_page(request, api_path) for api_path in api_paths}
+    return {api_path: page for api_path, page in pages.items() if page is not None}
+
+
+class ShellPageView(View):
+    """
+    Base for the server-rendered pages.
+
+    Whole pages are cached for ``WEB_PAGE_CACHE_SECONDS``, already compressed.
+    When ``WEB_EMBED_INITIAL_DATA`` is on, the first page of each API list the
+    page needs is embedded in the HTML so the browser skips that round trip.
+    Pages get the live progress stream's URL only when it is served (ASGI),
+    and are cached apart from those rendered without it.
+    """
+    template_name = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        if not settings.WEB_PAGE_CACHE_SECONDS:
+            return view
+        prefix = settings.CACHE_MIDDLEWARE_KEY_PREFIX
+        cached = {
+            live: cache_page(settings.WEB_PAGE_CACHE_SECONDS, key_prefix=f'{prefix}live' if live else prefix)(
+                precompressed(view)
+            )
+            for live in (False, True)
+        }
+
+        @wraps(view)
+        def cached_view(request, *args, **kwargs):
+            return cached[stream_path(request) is not None](request, *args, **kwargs)
+        return cached_view
+
+    def get_initial_data(self, request):
+        """Return {api_path: payload} for the lists the page loads on start"""
+        return {}
 
-class HomeView(View):
-    """Homepage view displaying charity statistics and featured content"""
     def get(self, request):
-        return render(request, 'charity/home.html')
+        context = {'progress_stream': stream_path(request)}
+        if settings.WEB_EMBED_INITIAL_DATA:
+            context['initial_data'] = self.get_initial_data(request)
+        return render(request, self.template_name, context)
 
 
-class OrganizationsView(View):
+class HomeView(ShellPageView):
+    """Homepage view displaying charity statistics and featured content"""
+    template_name = 'charity/home.html'
+
+    def get_initial_data(self, request):
+        return first_pages(request, [
+            '/api/organizations/',
+            '/api/organizations/active/',
+            '/api/campaigns/active/',
+            '/api/beneficiaries/',
+        ])
+
+
+class OrganizationsView(ShellPageView):
     """View displaying all organizations"""
-    def get(self, request):
-        return render(request, 'charity/organizations.html')
+    template_name = 'charity/organizations.html'
+
+    def get_initial_data(self, request):
+        return first_pages(request, ['/api/organizations/'])
 
 
-class CampaignsView(View):
+class CampaignsView(ShellPageView):
     """View displaying all campaigns"""
-    def get(self, request):
-        return render(request, 'charity/campaigns.html')
+    template_name = 'charity/campaigns.html'
+
+    def get_initial_data(self, request):
+        return first_pages(request, ['/api/campaigns/'])
 
 
-class BeneficiariesView(View):
+class BeneficiariesView(ShellPageView):
     """View displaying all beneficiaries"""
-    def get(self, request):
-        return render(request, 'charity/beneficiaries.html')
+    template_name = 'charity/beneficiaries.html'
 
+    def get_initial_data(self, request):
+        return first_pages(request, ['/api/beneficiaries/'])
 
-class CharitiesView(View):
+
+class CharitiesView(ShellPageView):
     """Single screen that lists charities from the API"""
-    def get(self, request):
-        return render(request, 'charity/charity_list.html')
+    template_name = 'charity/charity_list.html'
+
+    def get_initial_data(self, request):
+        return first_pages(request, ['/api/charities/'])
@@ -13,4 +13,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up; the SSE stream bypasses the Django stack
+from charity_api.autocomplete import warm_up  # noqa: E402
+from charity_api.live import STREAM_PATH, progress_stream  # noqa: E402
+
+# Build the in-memory autocomplete index before serving requests
+warm_up()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        if scope['path'] == STREAM_PATH:
+            return await progress_stream(scope, receive, send)
+        # Pages served here may subscribe to the stream (charity_api.live.stream_path)
+        scope = {**scope, 'progress_stream': STREAM_PATH}
+    return await django_application(scope, receive, send)
@@ -28,6 +28,10 @@ DEBUG = config('DEBUG', default=True, cast=bool)
 
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1').split(',')
 
+# API-only workers serve /api/ JSON traffic without the admin, sessions,
+# messages, web pages and browsable API (see charity_project/urls.py)
+API_ONLY = config('API_ONLY', default=False, cast=bool)
+
 
 # Application definition
 
@@ -43,16 +47,33 @@ INSTALLED_APPS = [
     'charity_api',
 ]
 
+# Sessions, CSRF, auth and messages serve the web pages and admin; they are
+# skipped under /api/ (see charity_api.web_middleware)
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'charity_api.compression.CompressionMiddleware',
+    'charity_api.web_middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'charity_api.web_middleware.CsrfViewMiddleware',
+    'charity_api.web_middleware.AuthenticationMiddleware',
+    'charity_api.web_middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if API_ONLY:
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django_filters',
+    )]
+    MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in (
+        'charity_api.web_middleware.SessionMiddleware',
+        'charity_api.web_middleware.CsrfViewMiddleware',
+        'charity_api.web_middleware.AuthenticationMiddleware',
+        'charity_api.web_middleware.MessageMiddleware',
+    )]
+
 ROOT_URLCONF = 'charity_project.urls'
 
 TEMPLATES = [
@@ -71,6 +92,22 @@ TEMPLATES = [
     },
 ]
 
+if API_ONLY:
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        'django.template.context_processors.debug',
+        'django.template.context_processors.request',
+    ]
+
+if not DEBUG:
+    # Compile each template once per process instead of on every render
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'charity_project.wsgi.application'
 
 
@@ -80,10 +117,24 @@ WSGI_APPLICATION = 'charity_project.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # Another file, e.g. the seeded database of manage.py load_test
+        'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
     }
 }
 
+# Organization-scoped tenancy (see charity_api.tenancy)
+# Require the X-Organization header on campaign and beneficiary endpoints
+TENANT_SCOPING = config('TENANT_SCOPING', default=False, cast=bool)
+# Organization ids whose rows live in their own SQLite file (comma separated)
+TENANT_DATABASES = [int(pk) for pk in config('TENANT_DATABASES', default='').split(',') if pk.strip()]
+TENANT_DATABASE_DIR = Path(config('TENANT_DATABASE_DIR', default=str(BASE_DIR / 'tenants')))
+for tenant in TENANT_DATABASES:
+    DATABASES[f'tenant_{tenant}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': TENANT_DATABASE_DIR / f'tenant_{tenant}.sqlite3',
+    }
+DATABASE_ROUTERS = ['charity_api.tenancy.TenantRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -120,16 +171,104 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [
     BASE_DIR / 'charity_api' / 'static',
 ]
 
+if not DEBUG:
+    # Hashed file names (run collectstatic) so browsers can cache assets forever
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+        },
+    }
+
 # Media (uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
-STATICFILES_DIRS = [
-    BASE_DIR / 'charity_api' / 'static',
-]
+
+# Cache: per process, or a Redis server shared by every process when
+# REDIS_URL is set (needs the redis package)
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Every process that writes (web workers, management commands) uses the same
+# cache: turns on the caches invalidated through table versions (facet and
+# list counts, query results). Only set it without REDIS_URL for a single
+# process deployment
+SHARED_CACHE = config('SHARED_CACHE', default=bool(REDIS_URL), cast=bool)
+
+# Facet counts on the charity directory (?facets=...), invalidated on writes;
+# cached only with SHARED_CACHE
+FACET_CACHE_SECONDS = config('FACET_CACHE_SECONDS', default=300, cast=int)
+
+# Upper bound on names held by the in-memory autocomplete index (most popular kept)
+AUTOCOMPLETE_MAX_ENTRIES = config('AUTOCOMPLETE_MAX_ENTRIES', default=200000, cast=int)
+
+# Without SHARED_CACHE, other processes' name changes reach the autocomplete
+# index when it is rebuilt, this many seconds after the last build
+AUTOCOMPLETE_REBUILD_SECONDS = config('AUTOCOMPLETE_REBUILD_SECONDS', default=60, cast=int)
+
+# How list responses get their total count: exact, cached (with SHARED_CACHE),
+# estimate or capped (see charity_api.pagination); views and ?count= can
+# override it
+PAGINATION_COUNT_MODE = config('PAGINATION_COUNT_MODE', default='exact')
+# Largest count computed in capped mode
+PAGINATION_COUNT_CAP = config('PAGINATION_COUNT_CAP', default=10000, cast=int)
+# Lifetime of cached counts; writes invalidate them immediately
+COUNT_CACHE_SECONDS = config('COUNT_CACHE_SECONDS', default=300, cast=int)
+
+# POST /api/batch/: most sub-requests per batch, and threads running reads concurrently
+BATCH_MAX_REQUESTS = config('BATCH_MAX_REQUESTS', default=20, cast=int)
+BATCH_MAX_WORKERS = config('BATCH_MAX_WORKERS', default=4, cast=int)
+
+# Stateless API tokens (charity_api.tokens): lifetime of a new token by
+# default and at most, in seconds
+API_TOKEN_LIFETIME = config('API_TOKEN_LIFETIME', default=3600, cast=int)
+API_TOKEN_MAX_LIFETIME = config('API_TOKEN_MAX_LIFETIME', default=30 * 24 * 3600, cast=int)
+# Users resolved from tokens are reused for this long, up to this many per process
+API_TOKEN_PRINCIPAL_SECONDS = config('API_TOKEN_PRINCIPAL_SECONDS', default=60, cast=int)
+API_TOKEN_PRINCIPAL_CACHE_SIZE = config('API_TOKEN_PRINCIPAL_CACHE_SIZE', default=10000, cast=int)
+
+# Query result cache (charity_api.querycache, only with SHARED_CACHE):
+# lifetime of an entry in seconds (0 turns it off) and memory budget per
+# process
+QUERY_CACHE_SECONDS = config('QUERY_CACHE_SECONDS', default=300, cast=int)
+QUERY_CACHE_MAX_BYTES = config('QUERY_CACHE_MAX_BYTES', default=32 * 1024 * 1024, cast=int)
+
+# Response compression (charity_api.compression): codings in order of
+# preference (zstd and br need the zstandard / brotli packages), and the
+# smallest body worth compressing
+COMPRESSION_ENCODINGS = config('COMPRESSION_ENCODINGS', default='zstd,br,gzip').split(',')
+COMPRESSION_MIN_BYTES = config('COMPRESSION_MIN_BYTES', default=512, cast=int)
+
+# Duplicate beneficiary detection (charity_api.dedupe): match beneficiaries
+# as they are saved, the score a pair needs to be recorded, and the largest
+# block of rows sharing a key that is still compared pair by pair
+DEDUPE_ON_SAVE = config('DEDUPE_ON_SAVE', default=True, cast=bool)
+DEDUPE_THRESHOLD = config('DEDUPE_THRESHOLD', default=0.8, cast=float)
+DEDUPE_MAX_BLOCK_SIZE = config('DEDUPE_MAX_BLOCK_SIZE', default=200, cast=int)
+
+# Server-rendered pages (charity_api.web_views)
+# Full-page cache lifetime in seconds; 0 disables it (the default with DEBUG on)
+WEB_PAGE_CACHE_SECONDS = config('WEB_PAGE_CACHE_SECONDS', default=0 if DEBUG else 60, cast=int)
+# Embed the first page of API data in the HTML to save the initial API call
+WEB_EMBED_INITIAL_DATA = config('WEB_EMBED_INITIAL_DATA', default=True, cast=bool)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -139,8 +278,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework Settings
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'charity_api.pagination.CountModePagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'charity_api.tokens.BearerTokenAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
@@ -160,6 +303,17 @@ REST_FRAMEWORK = {
     'HTML_SELECT_CUTOFF_TEXT': "More than {count} items...",
 }
 
+if API_ONLY:
+    # JSON only, no per-view schema introspection
+    REST_FRAMEWORK.update({
+        'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+        'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.inspectors.ViewInspector',
+    })
+
+# Live campaign progress (SSE, served by charity_project.asgi)
+# Minimum seconds between two events for the same subscriber
+LIVE_PROGRESS_INTERVAL = config('LIVE_PROGRESS_INTERVAL', default=1.0, cast=float)
+
 # API Page Title
 API_TITLE = "Charity REST API"
 API_DESCRIPTION = "A comprehensive REST API for managing charity organizations, campaigns, and beneficiaries."
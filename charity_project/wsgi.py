@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'charity_project.settings')
 
 application = get_wsgi_application()
+
+# Build the in-memory autocomplete index before serving requests
+from charity_api.autocomplete import warm_up  # noqa: E402
+
+warm_up()